@@ -9,7 +9,7 @@ sampling overlapping polygons at inventory points to calculate combined likeliho
 #==========================================================================
 # logger setup-----------------------
 #==========================================================================
-import logging, configparser, datetime, itertools
+import logging, configparser, datetime
 
 
 
@@ -30,7 +30,8 @@ from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsProj
 #==============================================================================
 from hlpr.exceptions import QError as Error
 
-from hlpr.Q import view, Qcoms, vlay_get_fdf, vlay_get_fdata, vlay_new_df
+from hlpr.Q import view, Qcoms, vlay_get_fdf, vlay_get_fdata, vlay_new_df, vlay_get_geohash
+from hlpr.cache import get_cache, file_sig
 from hlpr.plot import Plotr
 #==============================================================================
 # classes-------------
@@ -43,7 +44,7 @@ class LikeSampler(Plotr, Qcoms):
     
     where polygons overlap (asset exposed to multiple failures):    
         attribute join of all, then
-        union_probabilities()  calculates of multiple events using the exclusion principle
+        resolve_samps()  calculates the union probability of multiple events
     where an asset has a unique polygon:
         simple attribute join
     
@@ -55,11 +56,17 @@ class LikeSampler(Plotr, Qcoms):
     impactfmt_str = '.2f' #formatting impact values on plots
     
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, 
+                 use_cache=False, #re-use samples of unchanged lpols (see hlpr.cache.SampCache)
+                 cache_dir=None, #directory for cached samples (defaults to out_dir/canflood_cache)
+                 *args, **kwargs):
         super().__init__(*args, 
                         
                          **kwargs)
         
+        self.use_cache=use_cache
+        self.cache_dir=cache_dir
+        
 
         
     def load_layers(self, #load data to project (for standalone runs)
@@ -226,35 +233,43 @@ class LikeSampler(Plotr, Qcoms):
                 raise Error('%s.%s got %i (of %i) values out of range: \n%s'%(
                     ename,lfield, boolidx.sum(), len(boolidx), chk_ser[boolidx]))
             
-        #check finv
-        assert isinstance(finv, QgsVectorLayer), 'bad type on finv'
-        assert finv.isValid(), 'invalid finv'
-        assert cid in  [field.name() for field in finv.fields()], 'missing cid \'%s\''%cid
-        assert finv.crs() == self.crs, 'crs mismatch on %s'%finv.name()
-            
 
         #======================================================================
         # build finv
         #======================================================================
-        #clean out finv
-        fc_vlay = self.deletecolumn(finv, [cid], invert=True, layname='fclean')
-        self.createspatialindex(fc_vlay, logger=log)
-        
-        self.fc_vlay = fc_vlay #set this for vectorize()
-        #get cid list
-        fdf = vlay_get_fdf(fc_vlay, logger=log)
-        cid_l = fdf[cid].tolist()
+        fc_vlay, cid_l = self._prep_finv(finv, cid=cid, logger=log)
+ 
+        #=======================================================================
+        # cached samples
+        #=======================================================================
+        cache = self._get_cache()
+        key_d = dict() #{event name: cache key}
+        if not cache is None:
+            geohash = vlay_get_geohash(fc_vlay, fieldn_l=[cid])
+            for ename, lp_vlay in lpol_d.items():
+                lsig = file_sig(lp_vlay.source())
+                if lsig is None: continue #memory layers
+                
+                key_d[ename] = cache.get_key(lpol=lsig, ename=ename, finv=geohash, cid=cid, 
+                                             lfield=lfield, event_rels=event_rels)
  
         #======================================================================
         # sample values------
         #======================================================================
         log.info('sampling %i lpols w/ %i finvs and event_rels=\'%s\''%(
             len(lpol_d), len(cid_l), event_rels))
-        en_c_sval_d = dict() #container for samples {event name: sample data}
+        res_d = dict() #container for resolved samples {event name: likelihood series}
         for ename, lp_vlay in lpol_d.items():
             log = self.logger.getChild('run.%s'%ename)
             log.debug('sampling %s from %s to %s w/ %i atts'%(
-                lfield, lp_vlay.name(), fc_vlay.name(), len(fdf)))
+                lfield, lp_vlay.name(), fc_vlay.name(), len(cid_l)))
+            
+            if ename in key_d:
+                ser = cache.get(key_d[ename])
+                if not ser is None:
+                    log.info('got \'%s\' from the cache'%ename)
+                    res_d[ename] = ser
+                    continue
             
             """
             todo: remove any features w/ zero value
@@ -273,7 +288,8 @@ class LikeSampler(Plotr, Qcoms):
             if jcnt == 0:
                 log.warning('no assets intersect failure polygons!')
                 #set a dummy entri
-                en_c_sval_d[ename] = {k:[] for k in cid_l}
+                res_d[ename] = pd.Series(np.nan, index=cid_l, name=ename, dtype=float)
+                if ename in key_d: cache.put(key_d[ename], res_d[ename])
                 continue
 
             #extract raw sampling data
@@ -299,97 +315,234 @@ class LikeSampler(Plotr, Qcoms):
             #drop misses
             sdf = sdf_raw.dropna(subset=[lfield], axis=0, how='any')
 
-            #==================================================================
-            # pivot to {cid:[sample values]}
-            #==================================================================
-
-            #drop down to cid groups (pvali values)
-            d = {k:csdf[lfield].to_list() for k,csdf in sdf.groupby(cid)}
+            #===================================================================
+            # resolve multiple samples on each asset
+            #===================================================================
+            res_ser = self.resolve_samps(sdf, cid=cid, lfield=lfield, event_rels=event_rels,
+                                         logger=log)
             
-            #add dummy empty list for any missing cids
-            """not very elegent... doing this to fit in with previous methods
-            would be better to just use open joins"""
-            cid_samp_d = {**d, **{k:[] for k in cid_l if not k in d}}
+            #add nulls for any missing cids
+            res_d[ename] = res_ser.reindex(cid_l).rename(ename)
+            log.debug('resolved sample values on %i (of %i) assets'%(len(res_ser), len(cid_l)))
+            
+            #===================================================================
+            # check
+            #===================================================================
+            bx = res_ser>1.0
+            if bx.any():
+                log.debug(res_ser[bx])
+                raise Error('%s got %i (of %i) resolved P > 1.0.. check logger'%(
+                    ename, bx.sum(), (len(bx))))
                 
-            #wrap event loop
-            en_c_sval_d[ename] = cid_samp_d #add to reuslts
-            log.debug('collected sample values on %i assets'%len(cid_samp_d))
+            if ename in key_d: cache.put(key_d[ename], res_d[ename])
+            
+        if not cache is None:
+            cache.evict() #once per run
+        
+        #======================================================================
+        # assemble events------
+        #======================================================================
+        return self._wrap_res(res_d, cid_l, list(lpol_d.keys()), cid=cid, event_rels=event_rels)
+    
+    """
+    view(res_df)
+    """
+    
+    def run_long(self, #sample shared influence polygons and join long-format likelihoods
+            finv, #inventory layer
+            ifz_vlay, #polygon layer shared by all events (one feature per ifidN)
+            pfl_df, #long likelihoods. 1 row per (polygon, event) {ifidN, etagN, lfield}
+            cid = None, #index field name on finv
+            lfield = 'p_fail', #field with likelihhood value
+            ifidN = 'ifzID', #polygon id field (on ifz_vlay and pfl_df)
+            etagN = 'eTag', #event name field on pfl_df
+            event_rels=None, #ev calculation method (see run())
+            ):
+        """
+        consumes the 'long' output of misc.dikes.rjoin.DikeJoiner (see load_long())
+            where the polygons are the same for every event and only the likelihood changes
+            
+        polygons are sampled once (asset:ifidN) then joined to the likelihoods of each event
+            equivalent to run() on per-event layers w/ one (duplicated) polygon per pfl_df row
+            
+        pfl_df may have many rows per (ifidN, etagN) (e.g., many dike segments per polygon)
+            these are resolved on each asset like overlapping polygons
+        """
+        #=======================================================================
+        # defults
+        #=======================================================================
+        log = self.logger.getChild('run_long')
+
+        if cid is  None: cid=self.cid
+        if event_rels is None: event_rels=self.event_rels
+        self.event_rels=event_rels #reset for plotting
         
+        #======================================================================
+        # check the data
+        #======================================================================
+        #polygons
+        if not isinstance(ifz_vlay, QgsVectorLayer):
+            raise Error('bad type on ifz_vlay: %s'%type(ifz_vlay))
+        assert 'Polygon' in QgsWkbTypes().displayString(ifz_vlay.wkbType()), \
+            'unexpected geometry: %s'%QgsWkbTypes().displayString(ifz_vlay.wkbType())
+        assert ifidN in [field.name() for field in ifz_vlay.fields()], \
+            'specified ifidN \'%s\' not on layer'%ifidN
+        assert ifz_vlay.isValid()
+        assert ifz_vlay.crs() == self.qproj.crs(), 'crs mismatch on %s'%ifz_vlay.name()
+        
+        #likelihoods
+        assert isinstance(pfl_df, pd.DataFrame)
+        miss_l = set([ifidN, etagN, lfield]).difference(pfl_df.columns)
+        assert len(miss_l)==0, 'pfl_df missing some columns: %s'%miss_l
+        
+        pfl_df = pfl_df.loc[:, [ifidN, etagN, lfield]]
+        assert not pfl_df.isna().any().any(), 'got nulls on pfl_df'
+        
+        boolidx = np.logical_or(pfl_df[lfield] <0, pfl_df[lfield] >1)
+        if boolidx.any():
+            raise Error('%s got %i (of %i) values out of range: \n%s'%(
+                lfield, boolidx.sum(), len(boolidx), pfl_df.loc[boolidx, lfield]))
+            
+        ename_l = pfl_df[etagN].unique().tolist()
+
+        #======================================================================
+        # build finv
+        #======================================================================
+        fc_vlay, cid_l = self._prep_finv(finv, cid=cid, logger=log)
         
+        #======================================================================
+        # sample polygons------
+        #======================================================================
+        log.info('sampling \'%s\' w/ %i finvs for %i events and event_rels=\'%s\''%(
+            ifz_vlay.name(), len(cid_l), len(ename_l), event_rels))
+        
+        svlay, new_fns, jcnt = self.joinattributesbylocation(fc_vlay, ifz_vlay, [ifidN],
+                                              method=0, #one-to-many
+                                              logger=log,
+                                              expect_j_overlap=True,
+                                              allow_none=True,
+                                              )
+        
+        if jcnt == 0:
+            log.warning('no assets intersect failure polygons!')
+            sdf = pd.DataFrame(columns=[cid, ifidN])
+        else:
+            sdf_raw = vlay_get_fdf(svlay, logger=log) #df w/ columns = [cid, ifidN]
+            
+            miss_l = set(sdf_raw.columns).symmetric_difference([ifidN, cid])
+            assert len(miss_l) == 0, 'bad columns on the reuslts'
+            
+            sdf = sdf_raw.dropna(subset=[ifidN], axis=0, how='any')
+            log.debug('got %i (of %i) asset:polygon intersects'%(len(sdf), len(sdf_raw)))
         
         #======================================================================
-        # resolve multiple events------
+        # join likelihoods------
         #======================================================================
-        log = self.logger.getChild('run')
-        log.info('collected sample values for %i events and %i assets'%(
-            len(en_c_sval_d), len(cid_l)))
+        """many-to-many: asset:polygon and polygon:(event, likelihood)"""
+        jdf = sdf.merge(pfl_df, on=ifidN, how='inner')
         
-        res_df = None #build results contqainer
-
-        #loop and resolve
-
-        log.debug('resolving %i events'%len(en_c_sval_d))
-        for ename, cid_samp_d in en_c_sval_d.items():
-            log.info('resolving \"%s\''%ename)
+        res_d = dict()
+        for ename in ename_l:
+            log = self.logger.getChild('run_long.%s'%ename)
+            edf = jdf.loc[jdf[etagN]==ename, [cid, lfield]]
+            
+            if len(edf)==0:
+                log.warning('no assets intersect failure polygons!')
+                res_d[ename] = pd.Series(np.nan, index=cid_l, name=ename, dtype=float)
+                continue
+            
+            res_ser = self.resolve_samps(edf, cid=cid, lfield=lfield, event_rels=event_rels,
+                                         logger=log)
+            
+            res_d[ename] = res_ser.reindex(cid_l).rename(ename)
+            log.debug('resolved sample values on %i (of %i) assets'%(len(res_ser), len(cid_l)))
             
-            #===================================================================
-            # #loop through each asset and resolve sample values
-            #===================================================================
-            """
-            TODO: Parallel process this
-            """
-            cid_res_d = dict() #harmonized likelihood results
-            for cval, pvals in cid_samp_d.items():
-
-                #simple unitaries
-                if len(pvals) == 1:
-                    cid_res_d[cval] = pvals[0]
-                    
-                elif len(pvals) == 0:
-                    cid_res_d[cval] = np.nan
-                    
-                #multi value
-                else:
-                    
-                    #calc union probability for multi predictions
-                    if event_rels ==  'indep':
-                        cid_res_d[cval] = self.union_probabilities(pvals, logger=log)
-                    elif event_rels == 'mutEx':
-                        cid_res_d[cval] = sum(pvals)
-                    else:
-                        raise Error('bad event_rels: \'%s\''%event_rels)
-                               
-                
-            #===================================================================
-            # #update results
-            #===================================================================
-            res_ser = pd.Series(cid_res_d, name=ename).sort_index()
-            if res_df is None:
-                res_df = res_ser.to_frame()
-                res_df.index.name = cid
-            else:
-                """
-                if not np.array_equal(res_df.index, res_ser.index):
-                    raise Error('index mmismatch')"""
-                res_df = res_df.join(res_ser, how='left')
-                
-            #===================================================================
-            # check
-            #===================================================================
-            """
-            res_ser.max()
-            """
             bx = res_ser>1.0
             if bx.any():
                 log.debug(res_ser[bx])
                 raise Error('%s got %i (of %i) resolved P > 1.0.. check logger'%(
                     ename, bx.sum(), (len(bx))))
-            
+        
         #======================================================================
-        # wrap-------
+        # assemble events------
         #======================================================================
+        return self._wrap_res(res_d, cid_l, ename_l, cid=cid, event_rels=event_rels)
+    
+    def load_long(self, #load the 'long' output of DikeJoiner
+                  fp, #GeoPackage filepath
+                  ifz_layn = 'ifz', #polygon table name
+                  pfl_layn = 'pfail', #long likelihood table name
+                  ):
+        """
+        see misc.dikes.rjoin.DikeJoiner.output_long()
+        
+        returns the arguments for run_long() (ifz_vlay, pfl_df)
+        """
+        log = self.logger.getChild('load_long')
+        assert os.path.exists(fp), 'passed filepath does not exist\n    %s'%fp
+        
+        ifz_vlay = QgsVectorLayer('%s|layername=%s'%(fp, ifz_layn), ifz_layn, 'ogr')
+        assert ifz_vlay.isValid(), 'failed to load \'%s\' from \n    %s'%(ifz_layn, fp)
+        
+        pfl_vlay = QgsVectorLayer('%s|layername=%s'%(fp, pfl_layn), pfl_layn, 'ogr')
+        assert pfl_vlay.isValid(), 'failed to load \'%s\' from \n    %s'%(pfl_layn, fp)
+        
+        pfl_df = vlay_get_fdf(pfl_vlay, logger=log)
+        
+        log.info('loaded \'%s\' w/ %i polygons and \'%s\' %s'%(
+            ifz_layn, ifz_vlay.dataProvider().featureCount(), pfl_layn, str(pfl_df.shape)))
+        
+        return ifz_vlay, pfl_df
+    
+    def _prep_finv(self, #check and clean the finv for sampling
+                   finv,
+                   cid=None,
+                   logger=None,
+                   ):
+        if logger is None: logger=self.logger
+        log = logger.getChild('_prep_finv')
+        if cid is  None: cid=self.cid
+        
+        #check finv
+        assert isinstance(finv, QgsVectorLayer), 'bad type on finv'
+        assert finv.isValid(), 'invalid finv'
+        assert cid in  [field.name() for field in finv.fields()], 'missing cid \'%s\''%cid
+        assert finv.crs() == self.crs, 'crs mismatch on %s'%finv.name()
+        
+        #clean out finv
+        fc_vlay = self.deletecolumn(finv, [cid], invert=True, layname='fclean')
+        self.createspatialindex(fc_vlay, logger=log)
+        
+        self.fc_vlay = fc_vlay #set this for vectorize()
+        #get cid list
+        fdf = vlay_get_fdf(fc_vlay, logger=log)
+        
+        return fc_vlay, fdf[cid].tolist()
+    
+    def _wrap_res(self, #assemble and check the resolved samples of each event
+                  res_d, #{event name: likelihood series}
+                  cid_l, #all the assets
+                  ename_l, #expected events
+                  cid=None,
+                  event_rels=None,
+                  ):
+        
         log = self.logger.getChild('run')
+        if cid is  None: cid=self.cid
+        if event_rels is None: event_rels=self.event_rels
         
+        #======================================================================
+        # assemble events------
+        #======================================================================
+        log.info('resolved sample values for %i events and %i assets'%(
+            len(res_d), len(cid_l)))
+        
+        res_df = pd.concat(res_d, axis=1).sort_index()
+        res_df.index.name = cid
+        
+        #======================================================================
+        # wrap-------
+        #======================================================================
         #=======================================================================
         # nulls
         #=======================================================================
@@ -405,7 +558,7 @@ class LikeSampler(Plotr, Qcoms):
         #======================================================================
         # post checks
         #======================================================================
-        miss_l = set(lpol_d.keys()).symmetric_difference(res_df.columns)
+        miss_l = set(ename_l).symmetric_difference(res_df.columns)
         assert len(miss_l) == 0, 'failed to match columns to events'
         
         #bounds
@@ -444,29 +597,74 @@ class LikeSampler(Plotr, Qcoms):
 
         return self.res_df #will have NaNs where there is no intersect
     
-    """
-    view(res_df)
-    """
+    def _get_cache(self): #build the sample cache (or None)
+        return get_cache(use_cache=self.use_cache, cache_dir=self.cache_dir, default_dir=self.out_dir,
+                         logger=self.logger)
+    
+    def resolve_samps(self, #resolve the likelihood samples on each asset
+                      sdf, #sample data. 1 row per asset-polygon intersect {cid, lfield}
+                      cid=None,
+                      lfield='p_fail',
+                      event_rels=None,
+                      logger=None,
+                      ):
+        """
+        grouped equivalent of union_probabilities() (indep) and sum() (mutEx) on each asset
+            assets w/ a single sample take the value as is
+            
+        returns a series indexed by cid (only those assets w/ samples)
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('resolve_samps')
+        if cid is None: cid=self.cid
+        if event_rels is None: event_rels=self.event_rels
+        
+        assert sdf[lfield].notna().all(), 'drop misses first'
+        
+        #=======================================================================
+        # resolve
+        #=======================================================================
+        gser = sdf.groupby(cid)[lfield]
+        
+        if event_rels == 'indep':
+            """complement of the probability that none of the events occur"""
+            res_ser = 1 - (1 - sdf[lfield]).groupby(sdf[cid]).prod()
+        elif event_rels == 'mutEx':
+            res_ser = gser.sum()
+        else:
+            raise Error('bad event_rels: \'%s\''%event_rels)
+        
+        #simple unitaries
+        cnt_ser = gser.count()
+        res_ser = res_ser.where(cnt_ser>1, other=gser.first())
+        
+        log.debug('resolved %i (of %i) assets w/ multiple samples'%(
+            (cnt_ser>1).sum(), len(cnt_ser)))
+        
+        return res_ser
     
     def union_probabilities(self,
                             probs,
                             logger = None,
                             ):
         """
-        calculating the union probability of multiple independent events using the exclusion principle
+        calculating the union probability of multiple independent events
         
         probability that ANY of the passed independent events will occur
-            
-        
-        https://en.wikipedia.org/wiki/Inclusion%E2%80%93exclusion_principle#In_probability
+            = 1 - probability that NONE of the events occur
         
-        from Walter
+        this gives the same result as the inclusion-exclusion principle in linear time
+            https://en.wikipedia.org/wiki/Inclusion%E2%80%93exclusion_principle#In_probability
+            
+        see resolve_samps() for the grouped version used by run()
     
         Parameters
         ----------
         probs_list : Python 1d list
-            A list of probabilities between 0 and 1 with len() less than 23
-            After 23, the memory consumption gets huge. 23 items uses ~1.2gb of ram. 
+            A list of probabilities between 0 and 1
     
         Returns
         -------
@@ -492,30 +690,20 @@ class LikeSampler(Plotr, Qcoms):
         #clean out zeros
         if 0.0 in probs:
             probs = [x for x in probs if not x==0]
+            
+        if len(probs)==0:
+            return 0.0
         
         
         #===========================================================================
         # do some checks
         #===========================================================================
-        
-        assert (len(probs) < 20), "list too long"
         assert (all(map(lambda x: x < 1 and x > 0, probs))), 'probabilities out of range'
         
         #===========================================================================
-        # loop and add (or subtract) joint probabliities
+        # complement product
         #===========================================================================
-        #log.debug('calc total_prob for %i probs: %s'%(len(probs), probs))
-        total_prob = 0
-        for r in range(1, len(probs) + 1): #enumerate through each entry in the probs list
- 
-            combs = itertools.combinations(probs, r) #assemble all the possible combinations
-            """
-            list(combs)
-            """
-            #multiply all the probability combinations together and add for this layer
-            total_prob += ((-1) ** (r + 1)) * sum([np.prod(items) for items in combs])
-            
-
+        total_prob = 1 - np.prod(1 - np.array(probs))
         
         assert total_prob <1 and total_prob > 0, 'bad result'
     
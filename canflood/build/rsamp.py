@@ -23,7 +23,9 @@ import pandas as pd
 
 #Qgis imports
 from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsProject, \
-    QgsWkbTypes, QgsProcessingFeedback, QgsCoordinateTransform, QgsCoordinateTransformContext
+    QgsWkbTypes, QgsProcessingFeedback, QgsCoordinateTransform, QgsCoordinateTransformContext, \
+    QgsField, QgsGeometry, QgsRectangle
+from PyQt5.QtCore import QVariant
     
 from qgis.analysis import QgsRasterCalculatorEntry, QgsRasterCalculator
 import processing
@@ -35,12 +37,99 @@ from hlpr.exceptions import QError as Error
     
 
 
-from hlpr.Q import Qcoms,vlay_get_fdf, vlay_get_fdata, view
+from hlpr.Q import Qcoms,vlay_get_fdf, vlay_get_fdata, vlay_get_geohash, view, \
+    rlay_get_xyvals
+from hlpr.cache import get_cache, file_sig
+from hlpr.basic import get_valid_filename
 from hlpr.plot import Plotr
 
 #==============================================================================
 # functions-------------------
 #==============================================================================
+def warp_prep( #reproject, clip, and scale a raster in one pass (w/o qgis api)
+        src, #gdal source of the raw raster
+        ofp, #filepath for the result
+        warp_kw={}, #gdal.WarpOptions (dstSRS, xRes, dstNodata, etc.)
+        cutline=None, #GeoJSON text of the clipping polygon
+        scaleFactor=1.0,
+        opts=['COMPRESS=LZW'], #creation options for the result
+        ):
+    """
+    the warp is kept in memory (VRT) when scaling, so the result is the only write
+    
+    for worker threads: only gdal objects are touched here
+    
+    see Rsamp.runPrep()
+    """
+    from osgeo import gdal
+    
+    warp_kw = warp_kw.copy()
+    
+    #===========================================================================
+    # cutline
+    #===========================================================================
+    if not cutline is None:
+        cut_fp = '/vsimem/%s_cutline.geojson'%os.path.basename(ofp)
+        gdal.FileFromMemBuffer(cut_fp, cutline)
+        warp_kw.update({'cutlineDSName':cut_fp, 'cropToCutline':True})
+    
+    try:
+        #=======================================================================
+        # warp only
+        #=======================================================================
+        if float(scaleFactor)==1.0:
+            ds = gdal.Warp(ofp, src, format='GTiff', creationOptions=opts, 
+                           multithread=True, **warp_kw)
+            if ds is None:
+                raise IOError('gdal.Warp failed on %s'%src)
+            ds = None #flush
+            
+            return ofp
+        
+        #=======================================================================
+        # warp (in memory) and scale
+        #=======================================================================
+        vds = gdal.Warp('', src, format='VRT', multithread=True, **warp_kw)
+        if vds is None:
+            raise IOError('gdal.Warp failed on %s'%src)
+        
+        xsize, ysize = vds.RasterXSize, vds.RasterYSize
+        
+        ds = gdal.GetDriverByName('GTiff').Create(ofp, xsize, ysize, vds.RasterCount, 
+                                                  gdal.GDT_Float32, options=opts)
+        if ds is None:
+            raise IOError('failed to create %s'%ofp)
+        
+        ds.SetGeoTransform(vds.GetGeoTransform())
+        ds.SetProjection(vds.GetProjection())
+        
+        for i in range(1, vds.RasterCount+1):
+            vband, band = vds.GetRasterBand(i), ds.GetRasterBand(i)
+            nodata = vband.GetNoDataValue()
+            if not nodata is None:
+                band.SetNoDataValue(nodata)
+            
+            #write in strips of blocks
+            strip_h = max(vband.GetBlockSize()[1], int(1e6//max(xsize, 1)))
+            for yoff in range(0, ysize, strip_h):
+                ar = vband.ReadAsArray(0, yoff, xsize, min(strip_h, ysize-yoff)).astype(np.float32)
+                
+                if nodata is None:
+                    ar = ar*scaleFactor
+                else:
+                    ar = np.where(ar==np.float32(nodata), ar, ar*scaleFactor)
+                    
+                band.WriteArray(ar, 0, yoff)
+                
+        ds = None #flush
+        vds = None
+        
+    finally:
+        if not cutline is None:
+            gdal.Unlink(cut_fp)
+        
+    return ofp
+        
 class Rsamp(Plotr, Qcoms):
     """ sampling hazard rasters from the inventory
     
@@ -76,8 +165,17 @@ class Rsamp(Plotr, Qcoms):
     
     impactfmt_str = '.2f' #formatting impact values on plots
     
+    pts_win_max = int(5e7) #max raster cells to read in one window (otherwise read by block)
+    
+    prep_opts = ['COMPRESS=LZW', 'TILED=YES', 'BIGTIFF=IF_SAFER'] #creation options for prepped rasters (prep_engine='gdal')
+    
     def __init__(self,
                  fname='expos', #prefix for file name
+                 pts_engine='array', #engine for sampling points. see samp_vals_pts()
+                 zonal_engine='array', #engine for sampling polygons. see _samp_zonal_ar()
+                 prep_engine='gdal', #engine for preparing rasters. see runPrep()
+                 use_cache=False, #re-use samples of unchanged rasters (see hlpr.cache.SampCache)
+                 cache_dir=None, #directory for cached samples (defaults to out_dir/canflood_cache)
                   *args, **kwargs):
         """
         Plugin: called by each button push
@@ -86,6 +184,11 @@ class Rsamp(Plotr, Qcoms):
         super().__init__(*args, **kwargs)
         
         self.fname=fname
+        self.pts_engine=pts_engine
+        self.zonal_engine=zonal_engine
+        self.prep_engine=prep_engine
+        self.use_cache=use_cache
+        self.cache_dir=cache_dir
         #flip the codes
         self.psmp_codes = dict(zip(self.psmp_codes.values(), self.psmp_codes.keys()))
         
@@ -298,11 +401,50 @@ class Rsamp(Plotr, Qcoms):
   
         #get the results name
         res_name = '%s_%s_%i_%i'%(fname, self.tag, len(rlayRaw_l),finv.dataProvider().featureCount())
+        
+        #=======================================================================
+        # cached samples
+        #=======================================================================
+        cache = self._get_cache()
+        key_d, hit_d = dict(), dict() #{raster name: cache key}, {raster name: cached samples}
+        
+        if not cache is None:
+            geohash = vlay_get_geohash(finv, fieldn_l=keep_fnl)
+            dtm_sig = None if dtm_rlay is None else file_sig(dtm_rlay.source())
+            
+            for rlay in rlayRaw_l:
+                rsig = file_sig(rlay.source())
+                if rsig is None: continue #memory layers
+                if as_inun and dtm_sig is None: continue
+                
+                key_d[rlay.name()] = cache.get_key(rlay=rsig, name=rlay.name(), finv=geohash, cid=cid, 
+                        gtype=self.gtype, psmp_stat=psmp_stat, psmp_fieldName=psmp_fieldName, 
+                        as_inun=as_inun, dtm=dtm_sig, dthresh=dthresh, prec=self.prec)
+                
+                ser = cache.get(key_d[rlay.name()])
+                if not ser is None:
+                    hit_d[rlay.name()] = ser
+            
+            log.info('got %i (of %i) rasters from the cache'%(len(hit_d), len(rlayRaw_l)))
+                    
+        rlay_l = [rlay for rlay in rlayRaw_l if not rlay.name() in hit_d] #rasters to sample
+        if len(rlay_l)==0:
+            """everything cached... start from the finv"""
+            res_vlay = finv.materialize(QgsFeatureRequest())
+            if not psmp_fieldName is None:
+                res_vlay.dataProvider().deleteAttributes([res_vlay.fields().indexOf(psmp_fieldName)])
+                res_vlay.updateFields()
+                
+            if as_inun:
+                res_name = res_name + 'd%.2f'%(dthresh)
+            elif not 'Point' in self.gtype:
+                res_name = res_name + ('_%s'%psmp_stat.lower() if psmp_fieldName is None else '_passet')
+                
         #=======================================================================
         # simple geometries (Points)-----
         #=======================================================================
-        if 'Point' in self.gtype:
-            res_vlay = self.samp_vals_pts(finv, rlayRaw_l)
+        elif 'Point' in self.gtype:
+            res_vlay = self.samp_vals_pts(finv, rlay_l)
             assert not as_inun
             
         #=======================================================================
@@ -339,9 +481,9 @@ class Rsamp(Plotr, Qcoms):
                 # sample by goetype
                 #===================================================================
                 if 'Polygon' in self.gtype:
-                    res_vlay = self.samp_inun(finv,rlayRaw_l, dtm_rlay1, dthresh)
+                    res_vlay = self.samp_inun(finv,rlay_l, dtm_rlay1, dthresh)
                 elif 'Line' in self.gtype:
-                    res_vlay = self.samp_inun_line(finv, rlayRaw_l, dtm_rlay1, dthresh)
+                    res_vlay = self.samp_inun_line(finv, rlay_l, dtm_rlay1, dthresh)
                 else:
                     raise Error('\'%s\' got unexpected gtype: %s'%(finv.name(), self.gtype))
                 
@@ -357,7 +499,7 @@ class Rsamp(Plotr, Qcoms):
                 if not psmp_stat is None:
                     assert psmp_fieldName is None
 
-                    res_vlay = self.samp_vals_cplx(finv,rlayRaw_l, psmp_stat=psmp_stat)
+                    res_vlay = self.samp_vals_cplx(finv,rlay_l, psmp_stat=psmp_stat)
                     
                     res_name = res_name + '_%s'%psmp_stat.lower()
                     
@@ -365,9 +507,29 @@ class Rsamp(Plotr, Qcoms):
                 # per-asset stat
                 #===============================================================
                 else:
-                    res_vlay = self.samp_passet(finv,rlayRaw_l, psmp_fieldName=psmp_fieldName)
+                    res_vlay = self.samp_passet(finv,rlay_l, psmp_fieldName=psmp_fieldName)
                     res_name = res_name + '_passet'
             
+        #=======================================================================
+        # add cached samples
+        #=======================================================================
+        if len(hit_d)>0:
+            res_vlay = self._add_cached(res_vlay, hit_d, cid=cid, as_inun=as_inun, logger=log)
+            
+        #store new samples
+        new_l = [k for k in key_d.keys() if not k in hit_d]
+        if len(new_l)>0:
+            df = vlay_get_fdf(res_vlay, logger=log).set_index(cid, drop=True)
+            for rname in new_l:
+                coln = self._get_coln(rname, as_inun=as_inun)
+                if not coln in df.columns:
+                    log.warning('no \'%s\' on the results... not caching'%coln)
+                    continue
+                cache.put(key_d[rname], df[coln].rename(rname))
+                
+            log.info('stored %i samples in the cache'%len(new_l))
+            cache.evict() #once per run
+        
         res_vlay.setName(res_name)
         
         #=======================================================================
@@ -410,20 +572,34 @@ class Rsamp(Plotr, Qcoms):
 
     def runPrep(self, #apply raster preparation handels to a set of rasters
                 rlayRaw_l,
+                engine=None, #'gdal': one warp per raster on a thread pool. 'processing': step-wise (see prep())
+                max_workers=4, #threads for engine='gdal'
                 **kwargs
                 ):
+        """
+        engine='gdal' expresses reprojection, clipping, and scaling as one gdal.Warp
+            (see warp_prep()) so each raster is only written once
+            rasters needing a download (non-gdal providers) fall back to prep()
+        """
+        if engine is None: engine=self.prep_engine
         
         #=======================================================================
         # do the prep
         #=======================================================================
         self.feedback.setProgress(20)
-        res_l = []
-        for rlayRaw in rlayRaw_l:
-            rlay = self.prep(rlayRaw, **kwargs)
-            res_l.append(rlay)
-            
-            self.feedback.upd_prog(70/len(rlayRaw_l), method='append')
-            self.logger.debug('finished on %s'%rlay.name())
+        
+        if engine=='gdal':
+            res_l = self._runPrep_gdal(rlayRaw_l, max_workers=max_workers, **kwargs)
+        elif engine=='processing':
+            res_l = []
+            for rlayRaw in rlayRaw_l:
+                rlay = self.prep(rlayRaw, **kwargs)
+                res_l.append(rlay)
+                
+                self.feedback.upd_prog(70/len(rlayRaw_l), method='append')
+                self.logger.debug('finished on %s'%rlay.name())
+        else:
+            raise Error('unrecognized engine: %s'%engine)
 
             
         self.feedback.setProgress(90)
@@ -610,8 +786,218 @@ class Rsamp(Plotr, Qcoms):
         return resLay
     
 
+    def _runPrep_gdal(self, #prepare a set of rasters w/ warp_prep() on a thread pool
+                      rlayRaw_l,
+                      max_workers=4,
+                      logger=None,
+                      **kwargs #see _get_prep_job()
+                      ):
+        """
+        jobs are built (and results loaded) here... workers only see gdal
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('runPrep')
+        
+        #=======================================================================
+        # build the jobs
+        #=======================================================================
+        job_d = {i:self._get_prep_job(rlayRaw, logger=log, **kwargs) for i, rlayRaw in enumerate(rlayRaw_l)}
+        
+        run_d = {i:job for i, job in job_d.items() if not job is None and len(job['res_d'])>0}
+        
+        log.info('warping %i (of %i) rasters w/ %i workers'%(
+            len(run_d), len(rlayRaw_l), min(max_workers, max(len(run_d), 1))))
+        
+        #=======================================================================
+        # execute
+        #=======================================================================
+        if len(run_d)>0:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                fut_d = {executor.submit(warp_prep, job['src'], job['ofp'], warp_kw=job['warp_kw'],
+                                         cutline=job['cutline'], scaleFactor=job['scaleFactor'],
+                                         opts=self.prep_opts):i
+                         for i, job in run_d.items()}
+                
+                for fut in as_completed(fut_d):
+                    job = run_d[fut_d[fut]]
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        raise Error('failed to prep \'%s\' w/ \n    %s'%(job['name'], e))
+                    
+                    log.debug('finished on %s'%job['name'])
+                    self.feedback.upd_prog(70/len(rlayRaw_l), method='append')
+        
+        #=======================================================================
+        # collect
+        #=======================================================================
+        res_l = []
+        for i, rlayRaw in enumerate(rlayRaw_l):
+            job = job_d[i]
+            if job is None: #needs a download
+                rlay = self.prep(rlayRaw, logger=log, **kwargs)
+                self.feedback.upd_prog(70/len(rlayRaw_l), method='append')
+                
+            elif len(job['res_d'])==0:
+                log.warning('layer \'%s\' not written to file!'%rlayRaw.name())
+                rlay = rlayRaw
+                
+            else:
+                rlay = self.load_rlay(job['ofp'], logger=log)
+                rlay.setName(job['layname'])
+                
+                log.info('finished w/ %i prep operations on \'%s\' \n    %s'%(
+                    len(job['res_d']), rlay.name(), job['res_d']))
+                
+            res_l.append(rlay)
+            
+        return res_l
+    
+    def _get_prep_job(self, #collect the warp parameters for a raster. see warp_prep()
+                      rlayRaw, 
+                      allow_download=False,
+                      aoi_vlay=None,
+                      allow_rproj=False,
+                      clip_rlays=False,
+                      scaleFactor=1.00,
+                      logger=None,
+                      ):
+        """
+        same checks and options as prep()
+        
+        returns None for non-gdal providers (prep() handles the download)
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('prep')
+        
+        res_d = dict() #reporting container
+        
+        newLayerName='%s_prepd' % rlayRaw.name()
+        
+        #=======================================================================
+        # precheck
+        #=======================================================================
+        if clip_rlays: assert isinstance(aoi_vlay, QgsVectorLayer)
+        if not aoi_vlay is None:
+            self.check_aoi(aoi_vlay)
+            
+        if not rlayRaw.providerType() == 'gdal':
+            log.debug('\'%s\' has providerType \'%s\'... using step-wise prep'%(
+                rlayRaw.name(), rlayRaw.providerType()))
+            return None
+        
+        dp = rlayRaw.dataProvider()
+        warp_kw = dict()
+        
+        #=======================================================================
+        # re-projection
+        #=======================================================================
+        if not rlayRaw.crs() == self.qproj.crs():
+            msg = 'raster \'%s\' crs = \'%s\' and allow_rproj=%s' % (
+                rlayRaw.name(), rlayRaw.crs(), allow_rproj)
+            if not allow_rproj:
+                raise Error(msg)
+            log.info(msg)
+            
+            warp_kw['dstSRS'] = self.qproj.crs().toWkt()
+            
+            res_d['rproj'] = 'from %s to %s'%(rlayRaw.crs().authid(), self.qproj.crs().authid())
+            
+        #=======================================================================
+        # aoi slice
+        #=======================================================================
+        cutline = None
+        if clip_rlays:
+            geo = QgsGeometry.unaryUnion([f.geometry() for f in aoi_vlay.getFeatures()])
+            
+            cutline = '{"type":"FeatureCollection","features":[{"type":"Feature","properties":{},"geometry":%s}]}'%(
+                geo.asJson())
+            
+            warp_kw['cutlineSRS'] = aoi_vlay.crs().toWkt() #GeoJSON defaults to WGS84
+            
+            #masked pixels need a nodata value
+            if dp.sourceHasNoDataValue(1):
+                warp_kw['dstNodata'] = dp.sourceNoDataValue(1)
+            else:
+                warp_kw['dstNodata'] = -9999
+            
+            res_d['clip'] = 'with \'%s\''%aoi_vlay.name()
+            
+        #keep the resolution (unless re-projecting)
+        if not 'dstSRS' in warp_kw and len(res_d)>0:
+            warp_kw.update({'xRes':rlayRaw.rasterUnitsPerPixelX(), 'yRes':rlayRaw.rasterUnitsPerPixelY()})
+            
+        #=======================================================================
+        # scale
+        #=======================================================================
+        if not float(scaleFactor) ==float(1.00):
+            assert scaleFactor >= 0.01, 'scaleFactor = %.2f is too low'%scaleFactor
+            res_d['scale'] = 'by %.4f'%scaleFactor
+            
+        #=======================================================================
+        # output
+        #=======================================================================
+        ofp = os.path.join(self.out_dir, get_valid_filename('%s.tif'%newLayerName))
+        
+        if len(res_d)>0 and os.path.exists(ofp):
+            msg = 'requested file already exists! and overwrite=%s \n    %s'%(
+                self.overwrite, ofp)
+            if self.overwrite:
+                log.warning(msg)
+                os.remove(ofp)
+            else:
+                raise Error(msg)
+            
+        return {'name':rlayRaw.name(), 'layname':newLayerName, 'src':rlayRaw.source(), 'ofp':ofp,
+                'warp_kw':warp_kw, 'cutline':cutline, 'scaleFactor':float(scaleFactor), 'res_d':res_d}
+    
+
+    def _get_cache(self): #build the sample cache (or None)
+        return get_cache(use_cache=self.use_cache, cache_dir=self.cache_dir, default_dir=self.out_dir,
+                         logger=self.logger)
+        
+    def _get_coln(self, #field name of a raster's samples on the results layer
+                  rname, as_inun=False):
+        """see samp_inun() (polygons report '<rname>_a_pct'). all others use the raster name"""
+        if as_inun and 'Polygon' in self.gtype:
+            return '%s_a_pct'%rname
+        return rname
+        
+    def _add_cached(self, #add cached samples to the results layer (as new fields)
+                    res_vlay, #memory layer
+                    hit_d, #{raster name: samples (indexed by cid)}
+                    cid=None,
+                    as_inun=False,
+                    logger=None,
+                    ):
+        if cid is None: cid=self.cid
+        if logger is None: logger=self.logger
+        log = logger.getChild('_add_cached')
+        
+        #match the samples to the features
+        cid_ser = vlay_get_fdata(res_vlay, fieldn=cid, logger=log, fmt='ser')
+        res_ar = pd.DataFrame(hit_d).reindex(cid_ser.values).values.astype(float)
+        
+        #field names
+        fn_l = [self._get_coln(rname, as_inun=as_inun) for rname in hit_d.keys()]
+        self.names_d.update({fn:rname for fn, rname in zip(fn_l, hit_d.keys()) if not fn==rname})
+            
+        log.debug('adding %i cached columns'%len(fn_l))
+        return self._vlay_add_ar(res_vlay, cid_ser.index.tolist(), res_ar, fn_l)
+        
     def samp_vals_pts(self, #sample a set of rasters with a points vectorlayer
                   finv, raster_l,
+                  engine=None, #sampling engine
+                    #array: read the coordinates once and index each raster band (see _samp_vals_pts_ar())
+                    #processing: one 'qgis:rastersampling' call per raster
                   ):
         """"
         2021-10-18:split out function from polygons/line sammpler
@@ -623,6 +1009,21 @@ class Rsamp(Plotr, Qcoms):
         
         log = self.logger.getChild('samp_vals_pts')
         algo_nm = 'qgis:rastersampling'
+        if engine is None: engine=self.pts_engine
+        
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if engine=='array':
+            bad_l = [rlay.name() for rlay in raster_l if not rlay.providerType()=='gdal']
+            if len(bad_l)==0:
+                return self._samp_vals_pts_ar(finv, raster_l, logger=log)
+            
+            log.warning('%i rasters w/o \'gdal\' provider... using processing engine \n    %s'%(
+                len(bad_l), bad_l))
+            
+        else:
+            assert engine=='processing', 'unrecognized engine: \'%s\''%engine
             
 
         #=======================================================================
@@ -664,6 +1065,652 @@ class Rsamp(Plotr, Qcoms):
     view(finv)
     """
     
+    def _samp_vals_pts_ar(self, #sample rasters by indexing the band arrays with the point coordinates
+                          finv, raster_l,
+                          logger=None,
+                          ):
+        """
+        mimics 'qgis:rastersampling' (value of the pixel containing the point)
+            points outside the raster or on nodata get nulls
+            
+        coordinates are read once, then for each raster the window around the points
+            (or each block containing points, for large windows) is read w/ GDAL
+            
+        the result layer (copy of the finv w/ one field per raster) is built once
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('ar')
+        
+        self.names_d = dict()
+        
+        #=======================================================================
+        # get coordinates
+        #=======================================================================
+        """working on the copy (memory layers get new fids)"""
+        res_vlay = finv.materialize(QgsFeatureRequest())
+        
+        fid_l, xy_l = list(), list()
+        for feat in res_vlay.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            fid_l.append(feat.id())
+            
+            geo = feat.geometry()
+            if geo.isNull() or geo.isEmpty():
+                xy_l.append((np.nan, np.nan))
+            else:
+                pt = geo.vertexAt(0) #first point on multi-points
+                xy_l.append((pt.x(), pt.y()))
+                
+        xy_ar = np.array(xy_l, dtype=float).reshape(-1, 2)
+        
+        log.info('sampling %i rasters on %i points'%(len(raster_l), len(fid_l)))
+        
+        #=======================================================================
+        # sample each raster
+        #=======================================================================
+        res_ar = np.full((len(fid_l), len(raster_l)), np.nan)
+        
+        for j, rlay in enumerate(raster_l):
+            res_ar[:, j] = self._get_xy_vals(rlay, xy_ar)
+            
+            log.info('%i/%i sampled %i (of %i) points on \'%s\''%(
+                j+1, len(raster_l), (~np.isnan(res_ar[:, j])).sum(), len(fid_l), rlay.name()))
+            
+        #=======================================================================
+        # build the result layer
+        #=======================================================================
+        res_vlay.setName('%s_%i'%(self.finv_name, len(raster_l)-1))
+        self._vlay_add_ar(res_vlay, fid_l, res_ar, [rlay.name() for rlay in raster_l])
+        
+        #=======================================================================
+        # check
+        #=======================================================================
+        assert len(res_vlay.fields())==self.finv_fcnt+len(raster_l), 'bad field length'
+        
+        log.debug('finished w/ %s'%str(res_ar.shape))
+        
+        return res_vlay
+    
+    def _get_xy_vals(self, #sample a raster at a set of coordinates. see hlpr.Q.rlay_get_xyvals()
+                     rlay,
+                     xy_ar, #(n, 2) array of coordinates (nulls are skipped)
+                     ):
+        
+        return rlay_get_xyvals(rlay, xy_ar, win_max=self.pts_win_max, logger=self.logger)
+    
+    def _vlay_add_ar(self, #add a (features x fields) array as new double fields (in place)
+                     vlay, #memory layer
+                     fid_l, #feature ids (for the rows)
+                     res_ar,
+                     fn_l, #new field names (for the columns)
+                     ):
+        
+        dp = vlay.dataProvider()
+        assert res_ar.shape==(len(fid_l), len(fn_l))
+        
+        fcnt = len(vlay.fields())
+        if not dp.addAttributes([QgsField(fn, QVariant.Double) for fn in fn_l]):
+            raise Error('failed to add fields')
+        vlay.updateFields()
+        
+        #set all the values at once
+        fidx_l = list(range(fcnt, fcnt+len(fn_l)))
+        
+        attmap_d = dict()
+        for fid, row in zip(fid_l, res_ar.tolist()):
+            attmap_d[fid] = {i:v for i,v in zip(fidx_l, row) if not np.isnan(v)} #skip nulls
+            
+        if not dp.changeAttributeValues(attmap_d):
+            raise Error('failed to set the sampled values')
+        
+        self.mstore.addMapLayer(vlay)
+        
+        return vlay
+    
+    def _gdal_ok(self, #check the rasters can be read w/ gdal
+                 rlay_l,
+                 log,
+                 ):
+        
+        bad_l = [rlay.name() for rlay in rlay_l if not rlay.providerType()=='gdal']
+        if len(bad_l)>0:
+            log.warning('%i rasters w/o \'gdal\' provider... using processing engine \n    %s'%(
+                len(bad_l), bad_l))
+            return False
+        
+        return True
+    
+    def _zonal_ok(self, #check the rasters can be sampled w/ the array zonal engine
+                  rlay_l,
+                  log,
+                  ):
+        """all rasters need to be gdal and on the same grid"""
+        from osgeo import gdal
+        
+        if not self._gdal_ok(rlay_l, log):
+            return False
+        
+        grid_d = dict()
+        for rlay in rlay_l:
+            ds = gdal.Open(rlay.source(), gdal.GA_ReadOnly)
+            if ds is None:
+                raise Error('failed to open \'%s\' w/ gdal'%rlay.name())
+            
+            grid_d[rlay.name()] = (ds.GetGeoTransform(), ds.RasterXSize, ds.RasterYSize)
+            ds = None
+        
+        if not len(set(grid_d.values()))==1:
+            log.warning('rasters are on different grids... using processing engine')
+            return False
+        
+        gt = next(iter(grid_d.values()))[0]
+        if not (gt[2]==0 and gt[4]==0):
+            log.warning('rasters are rotated... using processing engine')
+            return False
+        
+        return True
+        
+    def _samp_zonal_ar(self, #per-polygon raster statistics from a label grid
+                       finv, #polygon layer (memory)
+                       raster_l,
+                       stats_l = ['Max'], #statistics to calc (see psmp_codes)
+                       dtm_rlay=None, #for inundation counts
+                       dthresh=None,
+                       logger=None,
+                       ):
+        """
+        rasterizes the polygons once to a label grid aligned with the hazard rasters
+            then reads each raster on the same windows (strips of pts_win_max cells)
+            no intermediate layers or rasters
+        
+        mimics 'native:zonalstatisticsfb'
+            pixels w/ centers in the polygon (gdal.RasterizeLayer default)
+            nodata excluded. empty polygons get Count=0, Sum=0, and nulls
+            polygons w/ 1 or fewer pixel centers are re-sampled by exact overlap (see _get_exact_vals())
+            
+        w/ dtm_rlay, also returns 'Inun': count of pixels w/ (wsl-dtm)>dthresh
+            mimics the threshold raster (nodata=0) of samp_inun()
+            (fractional for the exact overlap polygons)
+            
+        overlapping polygons cant share a label grid... returns None (caller should fall back)
+        
+        returns fid_l, {stat: (features x rasters) array}
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        from osgeo import gdal, ogr
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('zonal')
+        
+        miss_l = set(stats_l).difference(['Count', 'Sum', 'Mean', 'Median', 'Min', 'Max'])
+        assert len(miss_l)==0, 'unsupported stats: %s'%miss_l
+        
+        rlay_l = raster_l.copy()
+        if not dtm_rlay is None:
+            assert isinstance(dthresh, float)
+            rlay_l.append(dtm_rlay)
+        
+        #=======================================================================
+        # build the label layer
+        #=======================================================================
+        """labels are the feature position +1 (0=no polygon)"""
+        odrvr = ogr.GetDriverByName('Memory')
+        ods = odrvr.CreateDataSource('labels')
+        olyr = ods.CreateLayer('labels', geom_type=ogr.wkbUnknown)
+        olyr.CreateField(ogr.FieldDefn('lbl', ogr.OFTInteger))
+        
+        fid_l = list()
+        geo_d = dict() #{position: QgsGeometry} for the exact overlap
+        for i, feat in enumerate(finv.getFeatures(QgsFeatureRequest().setNoAttributes())):
+            fid_l.append(feat.id())
+            
+            geo = feat.geometry()
+            if geo.isNull() or geo.isEmpty(): continue
+            geo_d[i] = QgsGeometry(geo)
+            
+            ofeat = ogr.Feature(olyr.GetLayerDefn())
+            ofeat.SetField('lbl', i+1)
+            ofeat.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geo.asWkb())))
+            olyr.CreateFeature(ofeat)
+            ofeat = None
+            
+        fcnt = len(fid_l)
+        
+        #=======================================================================
+        # get the window
+        #=======================================================================
+        ds_d = {rlay.name():gdal.Open(rlay.source(), gdal.GA_ReadOnly) for rlay in rlay_l}
+        ds = next(iter(ds_d.values()))
+        x0, dx, _, y0, _, dy = ds.GetGeoTransform()
+        
+        ext = finv.extent()
+        xoff = int(max(np.floor((ext.xMinimum()-x0)/dx), 0))
+        xend = int(min(np.ceil((ext.xMaximum()-x0)/dx), ds.RasterXSize))
+        yoff = int(max(np.floor((ext.yMaximum()-y0)/dy), 0))
+        yend = int(min(np.ceil((ext.yMinimum()-y0)/dy), ds.RasterYSize))
+        
+        xsize = xend - xoff
+        strip_h = max(int(self.pts_win_max//max(xsize, 1)), 1)
+        
+        log.info('on %i polygons and %i rasters w/ window %i x %i (%i rows per strip)'%(
+            fcnt, len(rlay_l), xsize, yend-yoff, strip_h))
+        
+        #=======================================================================
+        # read strips
+        #=======================================================================
+        vals_d = {rlay.name():list() for rlay in raster_l} #{rname: [(lbl, vals)]}
+        inun_ar = np.zeros((fcnt, len(raster_l)))
+        mem_drvr = gdal.GetDriverByName('MEM')
+        
+        for syoff in range(yoff, yend, strip_h):
+            if xsize<=0: break
+            sh = min(strip_h, yend-syoff)
+            
+            #===================================================================
+            # rasterize the labels
+            #===================================================================
+            lbl_ar, ovlp_ar = [], []
+            for ar_l, opts in ((lbl_ar, dict(options=['ATTRIBUTE=lbl'])),
+                               (ovlp_ar, dict(burn_values=[1], options=['MERGE_ALG=ADD']))):
+                lds = mem_drvr.Create('', xsize, sh, 1, gdal.GDT_Int32)
+                lds.SetGeoTransform((x0+xoff*dx, dx, 0, y0+syoff*dy, 0, dy))
+                gdal.RasterizeLayer(lds, [1], olyr, **opts)
+                ar_l.append(lds.GetRasterBand(1).ReadAsArray())
+                lds = None
+                
+            lbl_ar, ovlp_ar = lbl_ar[0], ovlp_ar[0]
+            
+            if (ovlp_ar>1).any():
+                log.warning('got overlapping polygons... cant use a label grid')
+                return None
+            
+            bx = lbl_ar>0
+            if not bx.any(): continue
+            lbl_v = lbl_ar[bx] - 1
+            
+            #===================================================================
+            # read the rasters
+            #===================================================================
+            sv_d = dict()
+            for rname, rds in ds_d.items():
+                band = rds.GetRasterBand(1)
+                raw_ar = band.ReadAsArray(xoff, syoff, xsize, sh)[bx]
+                v = raw_ar.astype(float)
+                
+                nodata = band.GetNoDataValue()
+                if not nodata is None:
+                    v[raw_ar==nodata] = np.nan
+                    
+                sv_d[rname] = v
+            
+            for j, rlay in enumerate(raster_l):
+                if len(stats_l)>0:
+                    vals_d[rlay.name()].append((lbl_v, sv_d[rlay.name()]))
+                
+                #inundation counts
+                if not dtm_rlay is None:
+                    with np.errstate(invalid='ignore'):
+                        dep = sv_d[rlay.name()] - sv_d[dtm_rlay.name()]
+                        ibx = np.logical_and(dep>dthresh, dep!=0) #nulls are False
+                    
+                    inun_ar[:, j] += np.bincount(lbl_v[ibx], minlength=fcnt)
+            
+        ods = None
+            
+        #=======================================================================
+        # calc stats
+        #=======================================================================
+        res_d = {stat:np.full((fcnt, len(raster_l)), np.nan) for stat in stats_l}
+        cnt_ar = np.zeros((fcnt, len(raster_l))) #valid pixel centers
+        
+        for j, rlay in enumerate(raster_l):
+            l = vals_d[rlay.name()]
+            if len(l)==0:
+                lbl_v, v = np.array([], dtype=int), np.array([], dtype=float)
+            else:
+                lbl_v, v = np.concatenate([e[0] for e in l]), np.concatenate([e[1] for e in l])
+            
+            for stat, ar in self._get_zonal_stats(lbl_v, v, fcnt, stats_l).items():
+                res_d[stat][:, j] = ar
+                
+            cnt_ar[:, j] = np.bincount(lbl_v[~np.isnan(v)], minlength=fcnt)
+        
+        #=======================================================================
+        # exact overlap on small polygons
+        #=======================================================================
+        """
+        native:zonalstatisticsfb re-samples polygons w/ 1 or fewer (valid) pixel centers
+            using the fraction of each pixel covered by the polygon
+        """
+        sml_d = dict() #{position: [raster index]}
+        for i in geo_d.keys():
+            j_l = list()
+            if len(stats_l)>0:
+                j_l = np.where(cnt_ar[i]<=1)[0].tolist()
+            if not dtm_rlay is None:
+                j_l = sorted(set(j_l).union(np.where(inun_ar[i]<=1)[0]))
+                
+            if len(j_l)>0:
+                sml_d[i] = j_l
+        
+        if len(sml_d)>0:
+            log.info('exact overlap on %i (of %i) small polygons'%(len(sml_d), fcnt))
+            
+        for i, j_l in sml_d.items():
+            w, v_d = self._get_exact_vals(geo_d[i], ds_d)
+            
+            for j in j_l:
+                rname = raster_l[j].name()
+                if len(stats_l)>0 and cnt_ar[i, j]<=1:
+                    for stat, val in self._get_exact_stats(w, v_d[rname], stats_l).items():
+                        res_d[stat][i, j] = val
+                        
+                if not dtm_rlay is None and inun_ar[i, j]<=1:
+                    with np.errstate(invalid='ignore'):
+                        dep = v_d[rname] - v_d[dtm_rlay.name()]
+                        ibx = np.logical_and(dep>dthresh, dep!=0)
+                        
+                    inun_ar[i, j] = np.minimum(w[ibx], 1.0).sum()
+                    
+        ds_d = None
+        
+        if not dtm_rlay is None:
+            res_d['Inun'] = inun_ar
+            
+        log.debug('finished w/ %s'%list(res_d.keys()))
+        
+        return fid_l, res_d
+    
+    @staticmethod
+    def _get_exact_vals( #pixel values and overlap weights under one polygon
+            geo, #QgsGeometry
+            ds_d, #{name: gdal.Dataset} all on the same grid
+            ):
+        """
+        mimics the precise intersection of QgsZonalStatistics
+            weight = overlap area / pixel area (pixels w/o overlap are dropped)
+        
+        returns weight array, {name: value array} (nodata as nan)
+        """
+        ds = next(iter(ds_d.values()))
+        x0, dx, _, y0, _, dy = ds.GetGeoTransform()
+        
+        #pixel window of the bounding box
+        bbox = geo.boundingBox()
+        c0 = int(max(np.floor((bbox.xMinimum()-x0)/dx), 0))
+        c1 = int(min(np.ceil((bbox.xMaximum()-x0)/dx), ds.RasterXSize))
+        r0 = int(max(np.floor((bbox.yMaximum()-y0)/dy), 0))
+        r1 = int(min(np.ceil((bbox.yMinimum()-y0)/dy), ds.RasterYSize))
+        
+        if c1<=c0 or r1<=r0:
+            return np.array([]), {k:np.array([]) for k in ds_d.keys()}
+        
+        #overlap fractions
+        parea = abs(dx*dy)
+        w_ar = np.zeros((r1-r0, c1-c0))
+        for r in range(r0, r1):
+            for c in range(c0, c1):
+                xa, ya = x0+c*dx, y0+r*dy
+                pgeo = QgsGeometry.fromRect(QgsRectangle(xa, ya+dy, xa+dx, ya))
+                if not pgeo.intersects(geo): continue
+                
+                w_ar[r-r0, c-c0] = pgeo.intersection(geo).area()/parea
+                
+        bx = w_ar>0
+        
+        #values
+        v_d = dict()
+        for k, rds in ds_d.items():
+            band = rds.GetRasterBand(1)
+            raw_ar = band.ReadAsArray(c0, r0, c1-c0, r1-r0)[bx]
+            v = raw_ar.astype(float)
+            
+            nodata = band.GetNoDataValue()
+            if not nodata is None:
+                v[raw_ar==nodata] = np.nan
+                
+            v_d[k] = v
+            
+        return w_ar[bx], v_d
+    
+    @staticmethod
+    def _get_exact_stats( #stats on overlap weighted pixels
+            w, #overlap fraction per pixel. see _get_exact_vals()
+            v, #value per pixel (nulls are excluded)
+            stats_l,
+            ):
+        """
+        like QgsZonalStatistics, partial pixels add their fraction to Count and Sum
+            Min, Max, and Median are unweighted
+        """
+        bx = ~np.isnan(v)
+        w, v = np.minimum(w[bx], 1.0), v[bx]
+        
+        d = {'Count':w.sum(), 'Sum':(v*w).sum()}
+        if len(v)>0:
+            d.update({'Mean':d['Sum']/d['Count'], 'Min':v.min(), 'Max':v.max(), 'Median':np.median(v)})
+        else:
+            d.update({k:np.nan for k in ['Mean', 'Min', 'Max', 'Median']})
+            
+        return {k:d[k] for k in stats_l}
+    
+    @staticmethod
+    def _get_zonal_stats( #group stats on labelled pixel values
+            lbl_v, #label (feature position) per pixel
+            v, #value per pixel (nulls are excluded)
+            fcnt, #number of labels
+            stats_l,
+            ):
+        
+        bx = ~np.isnan(v)
+        lbl_v, v = lbl_v[bx], v[bx]
+        
+        cnt_ar = np.bincount(lbl_v, minlength=fcnt)
+        hbx = cnt_ar>0 #labels w/ some pixels
+        
+        d = dict()
+        if 'Count' in stats_l:
+            d['Count'] = cnt_ar.astype(float)
+            
+        if ('Sum' in stats_l) or ('Mean' in stats_l):
+            sum_ar = np.bincount(lbl_v, weights=v, minlength=fcnt)
+            d['Sum'] = sum_ar
+            
+            mean_ar = np.full(fcnt, np.nan)
+            mean_ar[hbx] = sum_ar[hbx]/cnt_ar[hbx]
+            d['Mean'] = mean_ar
+            
+        if len(set(stats_l).intersection(['Min', 'Max', 'Median']))>0:
+            #sort by label then value
+            vs = v[np.lexsort((v, lbl_v))]
+            start_ar = np.concatenate([[0], np.cumsum(cnt_ar)[:-1]])
+            
+            for stat, f in {
+                'Min':lambda s,c:vs[s],
+                'Max':lambda s,c:vs[s+c-1],
+                'Median':lambda s,c:(vs[s+(c-1)//2] + vs[s+c//2])/2,
+                }.items():
+                
+                ar = np.full(fcnt, np.nan)
+                ar[hbx] = f(start_ar[hbx], cnt_ar[hbx])
+                d[stat] = ar
+                
+        return {k:d[k] for k in stats_l}
+        
+    def _samp_line_ar(self, #per-line raster statistics from points along the lines
+                      finv, #line layer
+                      raster_l,
+                      stats_l = ['Max'], #statistics to calc (see psmp_codes)
+                      dtm_rlay=None, #for inundated fractions
+                      dthresh=None,
+                      logger=None,
+                      ):
+        """
+        mimics the 'native:pointsalonglines' > 'qgis:rastersampling' > 'qgis:statisticsbycategories' chain
+            of line_sample_stats() w/o intermediate layers
+            
+        the lines are densified at each raster's pixel spacing
+            (once per spacing... rasters on the same grid share the points)
+            then all the rasters are sampled into one (points x rasters) array
+            
+        w/ dtm_rlay, also returns 'Inun': fraction of points w/ (wsl-dtm)>dthresh
+            mimics samp_inun_line()
+        
+        returns fid_l, {stat: (features x rasters) array}
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('line')
+        
+        if not dtm_rlay is None:
+            assert isinstance(dthresh, float)
+        
+        #=======================================================================
+        # get the segments
+        #=======================================================================
+        fid_l, seg_t = self._get_line_segs(finv)
+        fcnt = len(fid_l)
+        
+        #=======================================================================
+        # sample the points
+        #=======================================================================
+        res_d = {stat:np.full((fcnt, len(raster_l)), np.nan) for stat in stats_l}
+        if not dtm_rlay is None:
+            res_d['Inun'] = np.full((fcnt, len(raster_l)), np.nan)
+        
+        pts_d = dict() #{spacing: (lbl_ar, xy_ar)}
+        for j, rlay in enumerate(raster_l):
+            dist = rlay.rasterUnitsPerPixelX()
+            if not dist in pts_d:
+                pts_d[dist] = self._densify_lines(seg_t, dist, fcnt)
+                
+                log.info('densified %i lines to %i points at %.4f'%(fcnt, len(pts_d[dist][0]), dist))
+                
+            lbl_v, xy_ar = pts_d[dist]
+            
+            v = self._get_xy_vals(rlay, xy_ar)
+            
+            #===================================================================
+            # calc stats
+            #===================================================================
+            for stat, ar in self._get_zonal_stats(lbl_v, v, fcnt, stats_l).items():
+                res_d[stat][:, j] = ar
+                
+            #inundated fraction
+            if not dtm_rlay is None:
+                with np.errstate(invalid='ignore'):
+                    dep = v - self._get_xy_vals(dtm_rlay, xy_ar)
+                    ibx = dep>dthresh #nulls are False
+                
+                cnt_ar = np.bincount(lbl_v, minlength=fcnt)
+                hbx = cnt_ar>0
+                
+                res_d['Inun'][hbx, j] = np.bincount(lbl_v[ibx], minlength=fcnt)[hbx]/cnt_ar[hbx]
+                
+            log.debug('%i/%i sampled \'%s\''%(j+1, len(raster_l), rlay.name()))
+            
+        log.debug('finished w/ %s'%list(res_d.keys()))
+        
+        return fid_l, res_d
+    
+    @staticmethod
+    def _get_line_segs( #collect the segments of each line
+            vlay,
+            ):
+        """
+        multi-part lines are walked in order (gaps between parts are not counted)
+        
+        returns fid_l, (label per segment, start points, end points)
+        """
+        fid_l, lbl_l, xy_l = list(), list(), list()
+        for i, feat in enumerate(vlay.getFeatures(QgsFeatureRequest().setNoAttributes())):
+            fid_l.append(feat.id())
+            
+            geo = feat.geometry()
+            if geo.isNull() or geo.isEmpty(): continue
+            
+            if geo.isMultipart():
+                part_l = geo.asMultiPolyline()
+            else:
+                part_l = [geo.asPolyline()]
+                
+            for part in part_l:
+                if len(part)<2: continue
+                ar = np.array([(pt.x(), pt.y()) for pt in part], dtype=float)
+                
+                xy_l.append(np.hstack((ar[:-1], ar[1:])))
+                lbl_l.append(np.full(len(ar)-1, i))
+                
+        if len(xy_l)==0:
+            return fid_l, (np.array([], dtype=int), np.empty((0, 2)), np.empty((0, 2)))
+        
+        seg_ar = np.vstack(xy_l)
+        
+        return fid_l, (np.concatenate(lbl_l), seg_ar[:, :2], seg_ar[:, 2:])
+    
+    @staticmethod
+    def _densify_lines( #get points at a regular spacing along each line
+            seg_t, #segments. see _get_line_segs()
+            dist, #spacing
+            fcnt, #number of lines
+            ):
+        """
+        mimics 'native:pointsalonglines' (no offsets)
+            points at 0, dist, 2*dist... up to the length of each line
+            
+        returns label per point, (n, 2) array of coordinates
+        """
+        lbl_s, p0_ar, p1_ar = seg_t
+        assert dist>0
+        
+        if len(lbl_s)==0:
+            return np.array([], dtype=int), np.empty((0, 2))
+        
+        #=======================================================================
+        # position of each segment on one axis
+        #=======================================================================
+        slen_ar = np.hypot(*(p1_ar - p0_ar).T)
+        sstart_ar = np.cumsum(slen_ar) - slen_ar
+        
+        flen_ar = np.bincount(lbl_s, weights=slen_ar, minlength=fcnt)
+        fseg0_ar = np.searchsorted(lbl_s, np.arange(fcnt), side='left') #first segment of each line
+        fseg1_ar = np.searchsorted(lbl_s, np.arange(fcnt), side='right') - 1 #last
+        
+        #=======================================================================
+        # point positions
+        #=======================================================================
+        hbx = fseg1_ar>=fseg0_ar #lines w/ segments
+        
+        pcnt_ar = np.zeros(fcnt, dtype=int)
+        pcnt_ar[hbx] = np.floor(flen_ar[hbx]/dist + 1e-9).astype(int) + 1
+        
+        lbl_p = np.repeat(np.arange(fcnt), pcnt_ar)
+        pstart_ar = np.cumsum(pcnt_ar) - pcnt_ar
+        
+        d_ar = (np.arange(len(lbl_p)) - pstart_ar[lbl_p])*dist #distance along the line
+        pos_ar = sstart_ar[fseg0_ar[lbl_p]] + d_ar
+        
+        #=======================================================================
+        # interpolate on the segments
+        #=======================================================================
+        sidx = np.searchsorted(sstart_ar, pos_ar, side='right') - 1
+        sidx = np.clip(sidx, fseg0_ar[lbl_p], fseg1_ar[lbl_p]) #stay on this line
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t_ar = np.where(slen_ar[sidx]>0, (pos_ar - sstart_ar[sidx])/slen_ar[sidx], 0.0)
+            
+        t_ar = np.clip(t_ar, 0.0, 1.0)
+        
+        xy_ar = p0_ar[sidx] + t_ar[:, None]*(p1_ar[sidx] - p0_ar[sidx])
+        
+        return lbl_p, xy_ar
+        
     def samp_vals_cplx(self, #sample a set of rasters with a complex vectorlayer (global stat)
                   finv, 
                   raster_l,
@@ -689,6 +1736,37 @@ class Rsamp(Plotr, Qcoms):
         # check parameter logic
         #=======================================================================
         assert psmp_stat in self.psmp_codes, 'unrecognized psmp_stat'
+        
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if self.zonal_engine=='array' and 'Polygon' in gtype:
+            if self._zonal_ok(raster_l, log):
+                if selected:
+                    res_vlay = finv.materialize(QgsFeatureRequest().setFilterFids(finv.selectedFeatureIds()))
+                else:
+                    res_vlay = finv.materialize(QgsFeatureRequest())
+                    
+                res = self._samp_zonal_ar(res_vlay, raster_l, stats_l=[psmp_stat], logger=log)
+                
+                if not res is None:
+                    fid_l, res_d = res
+                    res_vlay.setName('%s_%i'%(self.finv_name, len(raster_l)-1))
+                    return self._vlay_add_ar(res_vlay, fid_l, res_d[psmp_stat],
+                                             [rlay.name() for rlay in raster_l])
+                    
+        if self.zonal_engine=='array' and 'Line' in gtype:
+            if self._gdal_ok(raster_l, log):
+                if selected:
+                    res_vlay = finv.materialize(QgsFeatureRequest().setFilterFids(finv.selectedFeatureIds()))
+                else:
+                    res_vlay = finv.materialize(QgsFeatureRequest())
+                    
+                fid_l, res_d = self._samp_line_ar(res_vlay, raster_l, stats_l=[psmp_stat], logger=log)
+                
+                res_vlay.setName('%s_%i'%(self.finv_name, len(raster_l)-1))
+                return self._vlay_add_ar(res_vlay, fid_l, res_d[psmp_stat],
+                                         [rlay.name() for rlay in raster_l])
  
         #=======================================================================
         # sample loop
@@ -758,6 +1836,36 @@ class Rsamp(Plotr, Qcoms):
         assert len(miss_l)==0, 'got %i unrecognized sampling statistc keys on \'%s\': \n    %s'%(
             len(miss_l), psmp_fieldName, miss_l)
         
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        """all the stats from one pass. each feature takes its own"""
+        if self.zonal_engine=='array' and 'Polygon' in gtype:
+            if self._zonal_ok(raster_l, log):
+                res_vlay = finv_raw.materialize(QgsFeatureRequest())
+                
+                res = self._samp_zonal_ar(res_vlay, raster_l, stats_l=smp_stats_l, logger=log)
+                
+                if not res is None:
+                    fid_l, res_d = res
+                    
+                    #pick each features stat
+                    stat_ar = vlay_get_fdata(res_vlay, fieldn=psmp_fieldName, logger=log, fmt='ser'
+                                             ).loc[fid_l].values
+                    res_ar = np.full((len(fid_l), len(raster_l)), np.nan)
+                    for stat, ar in res_d.items():
+                        bx = stat_ar==stat
+                        res_ar[bx, :] = ar[bx, :]
+                    
+                    #drop the sampling field
+                    if not res_vlay.dataProvider().deleteAttributes(
+                            [res_vlay.fields().indexOf(psmp_fieldName)]):
+                        raise Error('failed to drop \'%s\''%psmp_fieldName)
+                    res_vlay.updateFields()
+                    
+                    res_vlay.setName('%s_passet'%self.finv_name)
+                    return self._vlay_add_ar(res_vlay, fid_l, res_ar, [rlay.name() for rlay in raster_l])
+        
         #=======================================================================
         # helpers
         #=======================================================================
@@ -894,6 +2002,16 @@ class Rsamp(Plotr, Qcoms):
         assert isinstance(dthresh, float)
         assert 'Memory' in dp.storageType() #zonal stats makes direct edits
         assert 'Polygon' in gtype
+        
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if self.zonal_engine=='array':
+            if self._zonal_ok(raster_l+[dtm_rlay], log):
+                res_vlay = self._samp_inun_ar(finv, raster_l, dtm_rlay, dthresh, logger=log)
+                
+                if not res_vlay is None:
+                    return res_vlay
 
         #=======================================================================
         # sample loop---------
@@ -1056,6 +2174,77 @@ class Rsamp(Plotr, Qcoms):
 
 
 
+    def _samp_inun_ar(self, #inundation percent for polygons (w/o intermediate rasters)
+                      finv, raster_l, dtm_rlay, dthresh,
+                      logger=None,
+                      ):
+        """
+        same results as samp_inun() but from _samp_zonal_ar() pixel counts
+        returns None if the label grid cant be used
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('ar')
+        
+        wvlay = finv.materialize(QgsFeatureRequest())
+        
+        #=======================================================================
+        # pixel counts
+        #=======================================================================
+        res = self._samp_zonal_ar(wvlay, raster_l, stats_l=[], dtm_rlay=dtm_rlay, dthresh=dthresh,
+                                  logger=log)
+        
+        if res is None: 
+            return None
+        
+        fid_l, res_d = res
+        
+        #=======================================================================
+        # area calc
+        #=======================================================================
+        rname_l = [rlay.name() for rlay in raster_l]
+        parea_ser = pd.Series({rlay.name():rlay.rasterUnitsPerPixelX()*rlay.rasterUnitsPerPixelY() 
+                               for rlay in raster_l})
+        
+        fdf = pd.DataFrame.from_dict({feat.id():{self.cid:feat[self.cid], 'area':feat.geometry().area()}
+                for feat in wvlay.getFeatures()}, orient='index').loc[fid_l, :]
+        
+        #inundated area
+        res_df = pd.DataFrame(res_d['Inun'], index=fid_l, columns=rname_l
+                              ).multiply(parea_ser).round(self.prec)
+        
+        #divide by area of each polygon
+        frac_df = res_df.div(fdf['area'], axis=0).round(self.prec)
+        
+        #adjust for excessive fractions
+        booldf = frac_df>1
+        if booldf.any().any():
+            log.warning('got %i (of %i) pct values >1.00. setting to 1.0 (bad pixel/polygon ratio?)'%(
+                booldf.sum().sum(), booldf.size))
+            
+            frac_df = frac_df.where(~booldf, 1.0)
+            
+        d1 = {ename:'%s_a_pct'%ename for ename in rname_l}
+        res_df = fdf.loc[:, [self.cid]].join(frac_df.rename(columns=d1))
+        
+        #set the reuslts converter
+        self.names_d = {coln:ename for ename, coln in d1.items()}
+        
+        log.info('data assembed w/ %s: \n    %s'%(str(res_df.shape), res_df.columns.tolist()))
+        
+        #=======================================================================
+        # bundle back into vectorlayer
+        #=======================================================================
+        geo_d = vlay_get_fdata(wvlay, geo_obj=True, logger=log)
+        res_vlay = self.vlay_new_df2(res_df, crs=finv.crs(), geo_d=geo_d, logger=log,
+                               layname='%s_%s_inun'%(self.tag, finv.name()))
+        
+        log.info('finisished w/ %s'%res_vlay.name())
+        
+        return res_vlay
+
     def samp_inun_line(self, #inundation percent for Line
 
                   finv, raster_l, dtm_rlay, dthresh,
@@ -1103,6 +2292,21 @@ class Rsamp(Plotr, Qcoms):
         assert isinstance(dthresh, float), 'expected float for dthresh. got %s'%type(dthresh)
         assert 'Memory' in dp.storageType() #zonal stats makes direct edits
         assert 'Line' in gtype
+        
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if self.zonal_engine=='array':
+            if self._gdal_ok(raster_l+[dtm_rlay], log):
+                res_vlay = finv.materialize(QgsFeatureRequest())
+                
+                fid_l, res_d = self._samp_line_ar(res_vlay, raster_l, stats_l=[], 
+                                                  dtm_rlay=dtm_rlay, dthresh=dthresh, logger=log)
+                
+                self.names_d = dict() #names should be fine
+                res_vlay.setName(finv.name())
+                return self._vlay_add_ar(res_vlay, fid_l, res_d['Inun'].round(self.prec),
+                                         [rlay.name() for rlay in raster_l])
 
         #=======================================================================
         # sample loop---------
@@ -1568,6 +2772,8 @@ class Rsamp(Plotr, Qcoms):
             Densify by Interval
             Drape
             Extract Z
+            
+        see _samp_line_ar() for the array engine (zonal_engine='array')
         """
         if logger is None: logger=self.logger
         log=logger.getChild('line_sample_stats')
@@ -10,7 +10,7 @@ helper functions w/ Qgis api
 # imports------------
 #==============================================================================
 #python
-import os, configparser, logging, inspect, copy, datetime, re, warnings
+import os, configparser, logging, inspect, copy, datetime, re, warnings, itertools
 import pandas as pd
 import numpy as np
 #qgis
@@ -941,48 +941,19 @@ class Qcoms(basic.ComWrkr): #baseclass for working w/ pyqgis outside the native
         #=======================================================================
         # assemble the features
         #=======================================================================
-        #convert form of data
+        #convert form of data (column-wise)
+        attvs_l = _df_to_attvs(df, qfields)
         
-        feats_d = dict()
-        for fid, row in df.iterrows():
-    
-            feat = QgsFeature(qfields, fid) 
-            
-            #loop and add data
-            for fieldn, value in row.items():
-    
-                #skip null values
-                if pd.isnull(value): continue
-                
-                #get the index for this field
-                findx = feat.fieldNameIndex(fieldn) 
-                
-                #get the qfield
-                qfield = feat.fields().at(findx)
-                
-                #make the type match
-                ndata = qtype_to_pytype(value, qfield.type(), logger=log)
-                
-                #set the attribute
-                if not feat.setAttribute(findx, ndata):
-                    raise Error('failed to setAttribute')
-                
-            #setgeometry
-            if not geo_d is None:
-                if gkey is None:
-                    gobj = geo_d[fid]
-                else:
-                    gobj = geo_d[row[gkey]]
-                
-                feat.setGeometry(gobj)
+        #geometry for each feature
+        if not geo_d is None:
+            if gkey is None:
+                geo_l = [geo_d[fid] for fid in df.index]
+            else:
+                geo_l = [geo_d[k] for k in df_raw[gkey]]
+        else:
+            geo_l = None
             
-            #stor eit
-            feats_d[fid]=feat
-        
-        log.debug('built %i \'%s\'  features'%(
-            len(feats_d),
-            QgsWkbTypes.geometryDisplayString(feat.geometry().type()),
-            ))
+        log.debug('converted %i features w/ %i fields'%(len(attvs_l), len(qfields)))
         
         
         #=======================================================================
@@ -1000,7 +971,7 @@ class Qcoms(basic.ComWrkr): #baseclass for working w/ pyqgis outside the native
                              crs, 
                              layname,
                              qfields,
-                             list(feats_d.values()),
+                             feats_iter(qfields, df.index, attvs_l, geo_l=geo_l), #added in chunks
                              logger=log,
                              )
         self.createspatialindex(vlay, logger=log)
@@ -3066,11 +3037,15 @@ def vlay_get_fdf( #pull all the feature data and place into a df
                     expect_all_real = False, #whether to expect all real results
                     allow_none = False,
                     
+                    use_ogr=True, #read file-backed layers directly w/ OGR (see _ogr_get_fdf())
+                    
                     db_f = False,
                     logger=mod_logger,
                     feedback=MyFeedBackQ()):
     """
     performance improvement
+        only the requested fields are fetched
+        file-backed layers (w/o a custom request) are read directly by OGR into arrays
     
     Warning: requests with getFeatures arent working as expected for memory layers
     
@@ -3127,6 +3102,8 @@ def vlay_get_fdf( #pull all the feature data and place into a df
     # build the request
     #===========================================================================
     feedback.setProgress(2)
+    use_ogr = use_ogr and (request is None) #custom requests go through the provider
+    
     if request is None:
         """WARNING: this doesnt seem to be slicing the fields.
         see Alg().deletecolumns()
@@ -3140,19 +3117,44 @@ def vlay_get_fdf( #pull all the feature data and place into a df
                
 
     log.debug('extracting data from \'%s\' on fields: %s'%(vlay.name(), fieldn_l))
+    
+    #===========================================================================
+    # direct read
+    #===========================================================================
+    if use_ogr and fmt=='df':
+        df = _ogr_get_fdf(vlay, fieldn_l, logger=log)
+        
+        if not df is None:
+            feedback.setProgress(95)
+            return _fdf_reindex(df, reindex, log)
+        
     #===========================================================================
     # loop through each feature and extract the data
     #===========================================================================
-    
     fid_attvs = dict() #{fid : {fieldn:value}}
     fcnt = vlay.dataProvider().featureCount()
+    
+    if fmt=='df':
+        """the requester still returns all the attributes (un-requested are null)
+        so we slice these ourselves"""
+        request = request.setSubsetOfAttributes(fieldn_l, vlay.fields())
+        fi_l = [all_fnl.index(fieldn) for fieldn in fieldn_l]
+        
+        def get_attvs(feat):
+            attvs = feat.attributes()
+            return [attvs[i] for i in fi_l]
+    else:
+        get_attvs = lambda feat: feat.attributes()
+        
+    prog_step = max(fcnt//100, 1) #report progress on every 1%
 
     for indxr, feat in enumerate(vlay.getFeatures(request)):
         
         #zip values
-        fid_attvs[feat.id()] = feat.attributes()
+        fid_attvs[feat.id()] = get_attvs(feat)
         
-        feedback.setProgress((indxr/fcnt)*90)
+        if indxr%prog_step==0:
+            feedback.setProgress((indxr/fcnt)*90)
 
 
     #===========================================================================
@@ -3194,37 +3196,137 @@ def vlay_get_fdf( #pull all the feature data and place into a df
         return fid_attvs
     elif fmt=='df':
         
-        #build the dict
-        
-        df_raw = pd.DataFrame.from_dict(fid_attvs, orient='index', columns=all_fnl)
+        #build the dict (already sliced to the requested fields)
+        df_raw = pd.DataFrame.from_dict(fid_attvs, orient='index', columns=fieldn_l)
         
-        
-        #handle column slicing and Qnulls
-        """if the requester worked... we probably  wouldnt have to do this"""
-        df = df_raw.loc[:, tuple(fieldn_l)].replace([NULL], np.nan)
+        #handle Qnulls
+        df = df_raw.replace([NULL], np.nan)
         
         feedback.setProgress(95)
         
-        if isinstance(reindex, str):
-            """
-            reindex='zid'
-            view(df)
-            """
-            #try and add the index (fids) as a data column
-            try:
-                df = df.join(pd.Series(df.index,index=df.index, name='fid'))
-            except:
-                log.debug('failed to preserve the fids.. column already there?')
-            
-            #re-index by the passed key... should copy the fids over to 'index
-            df = df.set_index(reindex, drop=True)
-            
-            log.debug('reindexed data by \'%s\''%reindex)
-            
-        return df
+        return _fdf_reindex(df, reindex, log)
     
     else:
         raise Error('unrecognized fmt kwarg')
+    
+def _fdf_reindex(df, reindex, log): #vlay_get_fdf() re-indexing
+    if isinstance(reindex, str):
+        """
+        reindex='zid'
+        view(df)
+        """
+        #try and add the index (fids) as a data column
+        try:
+            df = df.join(pd.Series(df.index,index=df.index, name='fid'))
+        except:
+            log.debug('failed to preserve the fids.. column already there?')
+        
+        #re-index by the passed key... should copy the fids over to 'index
+        df = df.set_index(reindex, drop=True)
+        
+        log.debug('reindexed data by \'%s\''%reindex)
+        
+    return df
+
+def _ogr_get_fdf( #read the attributes of a file-backed layer directly (or None)
+        vlay,
+        fieldn_l,
+        logger=mod_logger,
+        ):
+    """
+    reads the requested columns with OGR's arrow stream (GDAL>=3.6 and pyarrow)
+        into typed arrays w/o building any QgsFeatures
+        
+    returns None (use the feature loop) whenever the result might differ from vlay_get_fdf()
+        non-ogr providers, filters/subsets, pending edits, non-numeric/string fields
+    """
+    log = logger.getChild('_ogr_get_fdf')
+    
+    #===========================================================================
+    # check the layer
+    #===========================================================================
+    if not vlay.providerType()=='ogr':
+        return None
+    
+    if vlay.isEditable() or vlay.isModified() or (not vlay.subsetString()==''):
+        return None
+    
+    #only simple types (others come back as QDate etc. from the feature loop)
+    fields = vlay.fields()
+    type_d = {fieldn:fields.field(fieldn).type() for fieldn in fieldn_l}
+    if not set(type_d.values()).issubset([QVariant.Int, QVariant.UInt, QVariant.LongLong, 
+                                          QVariant.ULongLong, QVariant.Double, QVariant.String]):
+        return None
+    
+    #parse the source
+    fp, *opt_l = vlay.source().split('|')
+    opt_d = dict([e.split('=', 1) for e in opt_l if '=' in e])
+    if not os.path.exists(fp) or not set(opt_d.keys()).issubset(['layername', 'layerid']):
+        return None
+    
+    try:
+        from osgeo import ogr
+        import pyarrow #noqa. needed by GetArrowStreamAsPyArrow
+    except ImportError:
+        return None
+    
+    #===========================================================================
+    # read
+    #===========================================================================
+    ds = ogr.Open(fp, 0)
+    if ds is None: return None
+    
+    if 'layername' in opt_d:
+        lyr = ds.GetLayerByName(opt_d['layername'])
+    else:
+        lyr = ds.GetLayer(int(opt_d.get('layerid', 0)))
+        
+    if lyr is None or (not hasattr(lyr, 'GetArrowStreamAsPyArrow')):
+        return None
+    
+    fid_coln = lyr.GetFIDColumn()
+    if fid_coln=='': fid_coln='OGC_FID'
+    
+    #skip everything we dont need
+    ldefn = lyr.GetLayerDefn()
+    lyr.SetIgnoredFields([ldefn.GetFieldDefn(i).GetName() for i in range(ldefn.GetFieldCount())
+                          if not ldefn.GetFieldDefn(i).GetName() in fieldn_l]+['OGR_GEOMETRY'])
+    
+    try:
+        stream = lyr.GetArrowStreamAsPyArrow(['INCLUDE_FID=YES'])
+        tbl = pyarrow.Table.from_batches(list(stream), schema=stream.schema)
+    except Exception as e:
+        log.debug('failed to read \'%s\' w/ \n    %s'%(fp, e))
+        return None
+    
+    if not tbl.num_rows==vlay.dataProvider().featureCount():
+        return None
+    
+    if not set(fieldn_l+[fid_coln]).issubset(tbl.column_names):
+        return None
+    
+    #===========================================================================
+    # convert
+    #===========================================================================
+    """matching the feature loop: int64 and float64 w/ nulls as np.nan"""
+    fid_ar = tbl.column(fid_coln).to_numpy().astype(np.int64)
+    
+    d = dict()
+    for fieldn in fieldn_l:
+        ser = tbl.column(fieldn).to_pandas()
+        
+        if type_d[fieldn]==QVariant.String:
+            ser = ser.astype(object).where(ser.notna(), np.nan)
+        elif type_d[fieldn]==QVariant.Double:
+            ser = ser.astype(float)
+        elif ser.notna().all():
+            ser = ser.astype(np.int64)
+        
+        d[fieldn] = ser.values
+    
+    log.debug('read %i fields on %i features from \'%s\''%(len(fieldn_l), len(fid_ar), fp))
+        
+    return pd.DataFrame(d, index=fid_ar, columns=fieldn_l)
 
     
     
@@ -3244,6 +3346,8 @@ def vlay_get_fdata( #get data for a single field from all the features
             dropna = False, #whether to drop nulls from the results
             allow_none = False,
             
+            use_ogr=True, #read file-backed layers directly w/ OGR (see _ogr_get_fdf())
+            
             logger = mod_logger, db_f=False):
     
     """
@@ -3255,6 +3359,9 @@ def vlay_get_fdata( #get data for a single field from all the features
     
     log = logger.getChild('vlay_get_fdata')
     
+    #only for plain field requests
+    use_ogr = use_ogr and (request is None) and (not selected) and (geopropn is None) and (not geo_obj)
+    
     if request is None:
         request = QgsFeatureRequest()
     
@@ -3313,7 +3420,23 @@ def vlay_get_fdata( #get data for a single field from all the features
     #===========================================================================
     #if db_f: req_log(request, logger=log)
     d = dict() #empty container for results
-    for feat in vlay.getFeatures(request):
+    
+    feats = None
+    if use_ogr:
+        df = _ogr_get_fdf(vlay, [fieldn], logger=log)
+        if not df is None:
+            ser = df[fieldn]
+            if ser.dtype==float and not vlay.fields().field(fieldn).type()==QVariant.Double:
+                """integer fields w/ nulls come back as float... match the feature loop (int or np.nan)"""
+                d = {k:(np.nan if pd.isnull(v) else int(v)) for k,v in ser.items()}
+            else:
+                d = ser.to_dict() #nulls are already np.nan
+            feats = []
+            
+    if feats is None:
+        feats = vlay.getFeatures(request)
+        
+    for feat in feats:
         
         #=======================================================================
         # get geometry
@@ -3415,12 +3538,112 @@ def vlay_get_fdata( #get data for a single field from all the features
     else: 
         raise IOError
     
+def vlay_get_geohash( #hash the geometry and some attributes of all the features
+        vlay,
+        fieldn_l = [], #field names to include
+        ):
+    """
+    for identifying inputs (e.g., hlpr.cache.SampCache)
+        feature order matters
+    """
+    import hashlib
+    
+    h = hashlib.sha1()
+    
+    request = QgsFeatureRequest().setSubsetOfAttributes(fieldn_l, vlay.fields())
+    for feat in vlay.getFeatures(request):
+        for fieldn in fieldn_l:
+            h.update(str(feat[fieldn]).encode('utf-8'))
+        
+        h.update(bytes(feat.geometry().asWkb()))
+        
+    return h.hexdigest()
+    
+def rlay_get_xyvals( #sample a raster at a set of coordinates
+        rlay, #gdal provider
+        xy_ar, #(n, 2) array of coordinates (nulls are skipped)
+        win_max=int(5e7), #max raster cells to read in one window (otherwise read by block)
+        logger=mod_logger,
+        ):
+    """
+    value of the pixel containing each point
+        points outside the raster or on nodata get nulls
+        
+    reads the window around the points (or each block containing points, for large windows)
+    """
+    from osgeo import gdal
+    
+    vals_f = np.full(len(xy_ar), np.nan)
+    
+    ds = gdal.Open(rlay.source(), gdal.GA_ReadOnly)
+    if ds is None:
+        raise Error('failed to open \'%s\' w/ gdal'%rlay.name())
+    
+    x0, dx, rx, y0, ry, dy = ds.GetGeoTransform()
+    if not (rx==0 and ry==0):
+        raise Error('\'%s\' is rotated... use the processing engine'%rlay.name())
+    
+    band = ds.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    
+    #===========================================================================
+    # get pixel indexes
+    #===========================================================================
+    with np.errstate(invalid='ignore'):
+        col_ar = np.floor((xy_ar[:, 0] - x0)/dx)
+        row_ar = np.floor((xy_ar[:, 1] - y0)/dy)
+        
+        bx = np.logical_and.reduce((col_ar>=0, col_ar<ds.RasterXSize,
+                                    row_ar>=0, row_ar<ds.RasterYSize))
+    
+    if not bx.any():
+        logger.warning('\'%s\' contains none of the points'%rlay.name())
+        return vals_f
+    
+    cols, rows = col_ar[bx].astype(int), row_ar[bx].astype(int)
+    
+    #===========================================================================
+    # read values
+    #===========================================================================
+    xoff, yoff = cols.min(), rows.min()
+    xsize, ysize = cols.max()-xoff+1, rows.max()-yoff+1
+    
+    #one window around all the points
+    if xsize*ysize <= win_max:
+        win_ar = band.ReadAsArray(int(xoff), int(yoff), int(xsize), int(ysize))
+        vals = win_ar[rows-yoff, cols-xoff]
+        
+    #each block w/ points
+    else:
+        bxs, bys = band.GetBlockSize()
+        blk_ser = pd.Series(np.arange(len(cols))).groupby([rows//bys, cols//bxs]).indices
+        
+        vals = None
+        for (bri, bci), locs in blk_ser.items():
+            bxoff, byoff = bci*bxs, bri*bys
+            blk_ar = band.ReadAsArray(int(bxoff), int(byoff), 
+                                      int(min(bxs, ds.RasterXSize-bxoff)),
+                                      int(min(bys, ds.RasterYSize-byoff)))
+            if vals is None:
+                vals = np.empty(len(cols), dtype=blk_ar.dtype)
+            vals[locs] = blk_ar[rows[locs]-byoff, cols[locs]-bxoff]
+            
+    #nodata to nulls
+    v = vals.astype(float)
+    if not nodata is None:
+        v[vals==nodata] = np.nan
+    
+    vals_f[bx] = v
+    ds = None #close
+    
+    return vals_f
+    
 def vlay_new_mlay(#create a new mlay
                       gtype, #"Point", "LineString", "Polygon", "MultiPoint", "MultiLineString", or "MultiPolygon".
                       crs,
                       layname,
                       qfields,
-                      feats_l,
+                      feats_l, #list of features (or an iterator of lists. see feats_iter())
 
                       logger=mod_logger,
                       ):
@@ -3453,8 +3676,12 @@ def vlay_new_mlay(#create a new mlay
         vlaym.updateFields()
         
         #add feats
-        if not vlaym.dataProvider().addFeatures(feats_l):
-            raise Error('failed to addFeatures')
+        if isinstance(feats_l, list):
+            feats_l = [feats_l]
+            
+        for chunk_l in feats_l:
+            if not vlaym.dataProvider().addFeatures(chunk_l):
+                raise Error('failed to addFeatures')
         
         vlaym.updateExtents()
         
@@ -3655,9 +3882,6 @@ def feats_build( #build a set of features from teh passed data
         #infer types
         if infer_dtypes:
             data = data.infer_objects()
-            
-        #convert the data
-        qvlayd = df_to_qvlayd(data)
         
         #=======================================================================
         # build fields container from data
@@ -3706,9 +3930,27 @@ def feats_build( #build a set of features from teh passed data
         new_qfield = QgsField(fname, qtype, typeName=QMetaType.typeName(QgsField(fname, qtype).type()))
         
         """
+        #=======================================================================
+        # build the features (column-wise)
+        #=======================================================================
+        if geo_d is None:
+            if db_f:
+                if data.loc[:, list(geo_fn_tup)].isna().any().any():
+                    raise Error('got some nulls on the geometry fields: %s'%str(geo_fn_tup))
+                
+            geo_d = {fid:QgsGeometry.fromPointXY(QgsPointXY(xval,yval)) for fid, xval, yval in zip(
+                fid_ar, data[geo_fn_tup[0]].values, data[geo_fn_tup[1]].values)}
+            
+        attvs_l = _df_to_attvs(data.loc[:, list(fields_d.keys())], qfields)
+        
+        feats_d = {feat.id():feat for feat in itertools.chain(*feats_iter(qfields, fid_ar, attvs_l,
+                                                    geo_l=[geo_d[fid] for fid in fid_ar]))}
+        
+        qvlayd = dict() #nothing left to convert
         
     else:
         fid_ar = np.array(list(data.keys()))
+        feats_d = dict()
         #set the data
         qvlayd = data
         
@@ -3778,7 +4020,6 @@ def feats_build( #build a set of features from teh passed data
     #===========================================================================
     # loop through adn build features
     #===========================================================================
-    feats_d = dict()
     for fid, sub_d in qvlayd.items():
         #=======================================================================
         # #log.debug('assembling feature %i'%fid)
@@ -3872,12 +4113,55 @@ def feats_build( #build a set of features from teh passed data
             
         
         
-    log.debug('built %i \'%s\'  features'%(
-        len(feats_d),
-        QgsWkbTypes.geometryDisplayString(feat.geometry().type()),
-        ))
+    log.debug('built %i features'%len(feats_d))
     
     return feats_d
+
+def _df_to_attvs( #convert frame columns into attribute lists (one per feature)
+        df,
+        qfields, #fields matching the columns (in order)
+        ):
+    """
+    column-wise version of the qtype_to_pytype() conversion done on each feature value
+        nulls are left as None (NULL on the feature)
+    """
+    assert len(df.columns)==len(qfields)
+    
+    col_l = list()
+    for (coln, ser), qfield in zip(df.items(), qfields):
+        qtype = qfield.type()
+        py_type = type_qvar_py_d[qtype]
+        
+        #native python values
+        vals_l = ser.values.tolist()
+        null_l = ser.isna().values.tolist()
+        
+        col_l.append([None if isnull else (v if type(v) is py_type else qtype_to_pytype(v, qtype))
+                      for v, isnull in zip(vals_l, null_l)])
+        
+    return [list(attvs) for attvs in zip(*col_l)]
+
+def feats_iter( #build features in chunks from converted data
+        qfields,
+        fid_l, 
+        attvs_l, #attribute list for each feature (see _df_to_attvs())
+        geo_l=None, #geometry for each feature
+        chunk_size=int(5e4),
+        ):
+    """yields lists of features (so large layers never hold all the features at once)"""
+    
+    for i in range(0, len(attvs_l), chunk_size):
+        feats_l = list()
+        for j in range(i, min(i+chunk_size, len(attvs_l))):
+            feat = QgsFeature(qfields, int(fid_l[j]))
+            feat.setAttributes(attvs_l[j])
+            
+            if not geo_l is None:
+                feat.setGeometry(geo_l[j])
+                
+            feats_l.append(feat)
+            
+        yield feats_l
   
   
 def fields_build_new( #build qfields from different data containers
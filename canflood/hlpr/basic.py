@@ -373,6 +373,7 @@ class ComWrkr(object): #common methods for all classes
             if not overwrite:
                 raise Error('file already exists')
             
+            unlink_shared(out_fp)
 
         #======================================================================
         # writ eit
@@ -544,6 +545,22 @@ def view(df):
     webbrowser.open(f.name)
     
     
+def unlink_shared( #remove a linked file before writing to its path
+        fp,
+        ):
+    """
+    remove (rather than write through) so linked inputs are never modified
+        hardlinks and symlinks (os.stat follows these) to the shared store
+        see sensi.sbuild.CandidateModel._link_datafile()
+        
+    returns True if the file was removed
+    """
+    if os.path.islink(fp) or (os.path.exists(fp) and os.stat(fp).st_nlink>1):
+        os.remove(fp)
+        return True
+    
+    return False
+    
 def is_null(obj): #check if the object is none
 
     if obj is None:
@@ -0,0 +1,226 @@
+'''
+content-addressed cache of sampled columns (w/o qgis api)
+    see build.rsamp.Rsamp and build.lisamp.LikeSampler
+'''
+
+
+#==============================================================================
+# imports------------
+#==============================================================================
+import os, logging, hashlib
+import numpy as np
+import pandas as pd
+
+mod_logger = logging.getLogger('cache')
+
+from hlpr.exceptions import QError as Error
+
+#==============================================================================
+# functions-------------
+#==============================================================================
+def file_sig( #get a signature for a file-based layer source
+        source, #layer source (e.g., QgsMapLayer.source())
+        ):
+    """
+    returns None for sources w/o a file (e.g., memory layers)... these cant be cached
+
+    content is identified by size and modification time (hashing rasters is too slow)
+    """
+    fp = source.split('|')[0] #drop ogr layer options
+
+    if not os.path.isfile(fp):
+        return None
+
+    st = os.stat(fp)
+    return (os.path.normcase(os.path.abspath(fp)), source, st.st_size, st.st_mtime_ns)
+
+
+_hash_d = dict() #{file signature: content hash}
+
+def file_hash( #hash the contents of a file
+        fp,
+        ):
+    """
+    for small inputs (e.g., control file csvs) where a copy should match the original
+    
+    memoized on the file's inode (so unchanged or hardlinked files are only read once per session)
+    """
+    fp = os.path.realpath(fp) #resolve symlinks
+    if not os.path.isfile(fp):
+        return None
+    
+    st = os.stat(fp)
+    if st.st_ino == 0: #no inodes on this file system
+        sig = file_sig(fp)
+    else:
+        sig = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    
+    if not sig in _hash_d:
+        h = hashlib.sha1()
+        with open(fp, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                h.update(block)
+                
+        _hash_d[sig] = h.hexdigest()
+        
+    return _hash_d[sig]
+    
+
+def _nm2str(name): #series and index names (None as '')
+    return '' if name is None else str(name)
+
+def _str2nm(ar):
+    return None if str(ar)=='' else str(ar)
+
+def get_cache( #build the cache worker (or None if disabled)
+        use_cache=False, #opt-in
+        cache_dir=None, #directory for the entries
+        default_dir=None, #cache_dir to use if none was passed (e.g., the out_dir)
+        logger=mod_logger,
+        ):
+    
+    if not use_cache:
+        return None
+    
+    if cache_dir is None: 
+        assert isinstance(default_dir, str)
+        cache_dir = os.path.join(default_dir, 'canflood_cache')
+        
+    return SampCache(cache_dir, logger=logger)
+
+class SampCache(object): #store of sampled columns keyed by their inputs
+    """
+    each entry is a single column (pd.Series indexed by cid) in its own .npz
+        (index and values arrays, loaded w/o pickle)
+        named by the hash of everything used to sample it
+        (layer file signature, finv geometry hash, cid, sampling parameters)
+
+    so a changed raster (or finv) only invalidates its own columns
+
+    least recently used entries are evicted once the directory exceeds max_size
+        call evict() once at the end of a run
+    """
+    ext = '.npz'
+
+    def __init__(self,
+                 cache_dir, #directory to store entries in
+                 max_size=1e9, #bytes. evict beyond this
+                 logger=mod_logger,
+                 ):
+
+        self.logger = logger.getChild('SampCache')
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.cache_dir=cache_dir
+        self.max_size=max_size
+
+        self.logger.debug('on %s'%cache_dir)
+
+    def get_key(self, #hash the sampling inputs
+                **kwargs):
+        """pass everything that changes the sampled values"""
+
+        txt = ';'.join(['%s=%s'%(k, kwargs[k]) for k in sorted(kwargs.keys())])
+
+        return hashlib.sha1(txt.encode('utf-8')).hexdigest()
+
+    def _get_fp(self, key):
+        return os.path.join(self.cache_dir, key+self.ext)
+
+    def get(self, #retrieve an entry (or None)
+            key,
+            ):
+
+        fp = self._get_fp(key)
+        if not os.path.exists(fp):
+            return None
+
+        try:
+            with np.load(fp, allow_pickle=False) as npz:
+                ser = pd.Series(npz['values'], index=pd.Index(npz['index'], name=_str2nm(npz['index_name'])),
+                                name=_str2nm(npz['name']))
+        except Exception as e:
+            self.logger.warning('failed to load \'%s\'.. removing \n    %s'%(key, e))
+            os.remove(fp)
+            return None
+
+        os.utime(fp) #mark as recently used
+
+        return ser
+
+    def put(self, #store an entry
+            key,
+            ser,
+            ):
+
+        assert isinstance(ser, pd.Series)
+        
+        index_ar, values_ar = [np.asarray(e, dtype=str) if pd.api.types.is_string_dtype(e) else e.to_numpy()
+                                for e in (ser.index, ser)]
+        
+        #object arrays would need pickle
+        if index_ar.dtype==object or values_ar.dtype==object:
+            self.logger.debug('\'%s\' has object values... not caching'%ser.name)
+            return False
+
+        with open(self._get_fp(key), 'wb') as f:
+            np.savez(f, index=index_ar, values=values_ar, 
+                     name=np.array(_nm2str(ser.name)), index_name=np.array(_nm2str(ser.index.name)))
+            
+        return True
+
+    def evict(self, #remove the least recently used entries beyond max_size
+              max_size=None,
+              ):
+
+        if max_size is None: max_size=self.max_size
+
+        #collect entries
+        d = dict()
+        for fn in os.listdir(self.cache_dir):
+            if not fn.endswith(self.ext): continue
+
+            st = os.stat(os.path.join(self.cache_dir, fn))
+            d[fn] = {'size':st.st_size, 'mtime':st.st_mtime}
+
+        if len(d)==0:
+            return 0
+
+        df = pd.DataFrame.from_dict(d, orient='index').sort_values('mtime', ascending=False)
+
+        #drop those beyond the limit (newest are kept)
+        bx = df['size'].cumsum()>max_size
+
+        for fn in df.index[bx]:
+            os.remove(os.path.join(self.cache_dir, fn))
+
+        if bx.any():
+            self.logger.info('evicted %i (of %i) entries'%(bx.sum(), len(bx)))
+
+        return bx.sum()
+
+    def clear(self): #remove all entries
+
+        return self.evict(max_size=0)
+
+
+if __name__ =="__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='manage a CanFlood sample cache')
+    parser.add_argument('cache_dir')
+    parser.add_argument('--clear', action='store_true', help='remove all entries')
+    parser.add_argument('--max_size', type=float, default=None, help='evict entries beyond this (bytes)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cache_dir):
+        raise Error('cache_dir does not exist: %s'%args.cache_dir)
+
+    cache = SampCache(args.cache_dir)
+
+    if args.clear:
+        cache.clear()
+    elif not args.max_size is None:
+        cache.evict(max_size=args.max_size)
@@ -128,7 +128,7 @@ class Dcoms(ComWrkr):
         log.info('loaded expos_df w/ %i dtags and %i etags'%(len(tag_l), len(etag_l)))
         
         #collapse all dtags
-        l1 = [col.unique().tolist() for coln, col in df.loc[:, tag_l].items()]
+        l1 = [col.dropna().unique().tolist() for coln, col in df.loc[:, tag_l].items()] #segments may have fewer functions
         self.dtag_l = set([item for sublist in l1 for item in sublist])
         
         self.etag_l = etag_l
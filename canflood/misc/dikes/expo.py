@@ -22,7 +22,8 @@ import pandas as pd
 from pandas import IndexSlice as idx
 
 #Qgis imports
-from qgis.core import QgsVectorLayer, QgsWkbTypes, QgsMapLayerStore
+from qgis.core import QgsVectorLayer, QgsWkbTypes, QgsMapLayerStore, QgsFeatureRequest, \
+    QgsGeometry, QgsPointXY
  
 import processing
 #==============================================================================
@@ -32,7 +33,7 @@ from hlpr.exceptions import QError as Error
     
 
 from hlpr.Q import Qcoms, vlay_get_fdf, vlay_get_fdata, view, stat_pars_d, \
-    vlay_rename_fields
+    vlay_rename_fields, rlay_get_xyvals
     
  
 
@@ -46,11 +47,12 @@ from .dPlot import DPlotr
 class Dexpo(Qcoms, DPlotr):
  
     def __init__(self,
-                 
+                 expo_engine='array', #engine for building transects. see get_dike_expo()
                   *args,  **kwargs):
         
         super().__init__(*args,**kwargs)
         
+        self.expo_engine=expo_engine
 
         
         self.logger.debug('Diker.__init__ w/ feedback \'%s\''%type(self.feedback).__name__)
@@ -211,6 +213,8 @@ class Dexpo(Qcoms, DPlotr):
                     #wsl sampling
                     #wsl_stat = 'Max', #for transect wsl zvals, stat to use for summary
                     
+                    engine=None, #'array': transects as coordinate arrays (see _get_dike_expo_ar())
+                        #'processing': transect and drape algos
                     logger=None,
                     ): 
         
@@ -223,6 +227,7 @@ class Dexpo(Qcoms, DPlotr):
         if dtm_rlay is None: dtm_rlay = self.dtm_rlay
         if sid is None: sid = self.sid
         if nullSamp is None: nullSamp = self.nullSamp
+        if engine is None: engine=self.expo_engine
         mstore = QgsMapLayerStore() #build a new map store
         #=======================================================================
         # prechecks
@@ -242,6 +247,23 @@ class Dexpo(Qcoms, DPlotr):
         assert tside in tside_d, 'bad tside: \'%s\''%tside
         assert not tside =='Both', 'Both not supported'
         
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if engine=='array':
+            bad_l = [rlay.name() for rlay in list(noFailr_d.values())+[dtm_rlay] 
+                     if not rlay.providerType()=='gdal']
+            
+            if len(bad_l)==0:
+                return self._get_dike_expo_ar(noFailr_d, dike_vlay=dike_vlay, dtm_rlay=dtm_rlay, sid=sid,
+                            simp_dike=simp_dike, dist_dike=dist_dike, dist_trans=dist_trans, tside=tside,
+                            dens_int=dens_int, write_tr=write_tr, calc_dist=calc_dist, logger=log)
+                
+            log.warning('%i rasters w/o \'gdal\' provider... using processing engine \n    %s'%(
+                len(bad_l), bad_l))
+        else:
+            assert engine=='processing', 'unrecognized engine: \'%s\''%engine
+        
 
         
         #=======================================================================
@@ -603,6 +625,242 @@ class Dexpo(Qcoms, DPlotr):
 
         return self.expo_dxcol, self.expo_vlay_d
     
+    def _get_dike_expo_ar(self, #get exposure set for dikes from coordinate arrays
+                    noFailr_d,
+                    dike_vlay = None,
+                    dtm_rlay = None,
+                    sid = None,
+                    simp_dike = 0, 
+                    dist_dike = 40, 
+                    dist_trans = 100, 
+                    tside = 'Left', 
+                    dens_int = None, 
+                    write_tr = False, 
+                    calc_dist = True,
+                    logger=None,
+                    ):
+        """
+        same results as the processing chain of get_dike_expo()
+            w/o intermediate layers
+            
+        mimics:
+            'native:densifygeometriesgivenaninterval' (dike vertices): _densify_verts()
+            'native:transect' (90deg at each vertex): _get_vertex_angles()
+            'native:extractvertices' (distance along the dike)
+            'qgis:rastersampling' (crest elevation at the dike vertex)
+            'native:setzfromraster' > 'native:extractzvalues' (max wsl on the densified transect)
+            
+        the sample points are built once... then each raster is sampled w/ one windowed read
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log=logger.getChild('ar')
+        tr_fid = 'TR_ID'
+        
+        if dens_int is None: dens_int = min(dist_dike, dist_trans/2)
+        
+        #=======================================================================
+        # dike vertices-----
+        #=======================================================================
+        fnl = [f.name() for f in dike_vlay.fields()]
+        dcoln_l = [c for c in fnl if c in [sid, self.dikeID, self.segID]] #keep the layer order
+        
+        request = QgsFeatureRequest().setSubsetOfAttributes(dcoln_l, dike_vlay.fields())
+        
+        d_l, xy_l, ang_l, dist_l = list(), list(), list(), list()
+        for feat in dike_vlay.getFeatures(request):
+            geo = feat.geometry()
+            if geo.isNull() or geo.isEmpty(): continue
+            
+            if simp_dike > 0:
+                geo = geo.simplify(simp_dike)
+                
+            if geo.isMultipart():
+                part_l = geo.asMultiPolyline()
+            else:
+                part_l = [geo.asPolyline()]
+                
+            dist0 = 0.0 #distance along the feature (parts are walked in order)
+            vcnt = 0
+            for part in part_l:
+                if len(part)==0: continue
+                xy_ar = self._densify_verts(np.array([(pt.x(), pt.y()) for pt in part], dtype=float), dist_dike)
+                
+                seg_ar = np.hypot(*np.diff(xy_ar, axis=0).T)
+                
+                xy_l.append(xy_ar)
+                ang_l.append(self._get_vertex_angles(xy_ar))
+                dist_l.append(dist0 + np.concatenate([[0.0], np.cumsum(seg_ar)]))
+                
+                dist0 = dist_l[-1][-1]
+                
+                #transect attributes
+                for i in range(len(xy_ar)):
+                    d = {c:feat[c] for c in dcoln_l}
+                    d['TR_SEGMENT'] = vcnt+i+1 #vertex number on the feature
+                    d_l.append(d)
+                    
+                vcnt+=len(xy_ar)
+                
+        assert len(d_l)>0, 'failed to get any dike vertices'
+        
+        cxy_ar = np.vstack(xy_l) #crest points (start of each transect)
+        ang_ar = np.concatenate(ang_l)
+        
+        tr_df = pd.DataFrame(d_l, columns=dcoln_l+['TR_SEGMENT'])
+        tr_df.insert(len(dcoln_l), tr_fid, np.arange(len(tr_df)))
+        
+        for coln in dcoln_l:
+            tr_df[coln] = tr_df[coln].astype(int)
+        
+        if calc_dist:
+            tr_df[self.sdistn] = np.concatenate(dist_l).round(self.prec)
+            
+        log.info('got %i transects on %i dike segments'%(len(tr_df), tr_df[sid].nunique()))
+        
+        #=======================================================================
+        # transect points------
+        #=======================================================================
+        """point.project(-dist_trans, 90 + vertexAngle) for 'Left' (from the crest)
+        'Right' transects end on the crest... the densified vertices are the same"""
+        az_ar = ang_ar + np.pi/2
+        sgn = {'Left':-1.0, 'Right':1.0}[tside]
+        
+        dxy_ar = sgn*dist_trans*np.column_stack((np.sin(az_ar), np.cos(az_ar)))
+        
+        #densified transect vertices (from the crest)
+        tcnt = max(int(np.ceil(dist_trans/dens_int)), 1)
+        frac_ar = np.arange(tcnt+1)/tcnt
+        
+        pts_ar = cxy_ar[:, None, :] + frac_ar[None, :, None]*dxy_ar[:, None, :] #(transects, vertices, xy)
+        
+        log.info('sampling %i rasters on %i transects w/ %i vertices'%(
+            len(noFailr_d)+1, len(tr_df), tcnt+1))
+        
+        #=======================================================================
+        # crest el
+        #=======================================================================
+        tr_df[self.celn] = rlay_get_xyvals(dtm_rlay, cxy_ar, logger=log).round(self.prec)
+        
+        #=======================================================================
+        # transect layer
+        #=======================================================================
+        if tside=='Left':
+            line_ar = pts_ar
+        else:
+            line_ar = pts_ar[:, ::-1, :]
+            
+        geo_d = {trid:QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in line])
+                 for trid, line in zip(tr_df[tr_fid].values, line_ar.tolist())}
+        
+        tr_vlay = self.vlay_new_df2(tr_df, geo_d=geo_d, gkey=tr_fid, logger=log,
+                               layname='%s_%s_transects'%(self.tag, dike_vlay.name()))
+        
+        if write_tr:
+            self.vlay_write(tr_vlay, logger=log)
+        self.tr_vlay=tr_vlay #set for loading by the dialog
+        
+        log.info('joined crest elevations')
+        #=======================================================================
+        # get wsls----
+        #=======================================================================
+        geo_d = {trid:QgsGeometry.fromPointXY(QgsPointXY(x, y)) 
+                 for trid, (x, y) in zip(tr_df[tr_fid].values, cxy_ar.tolist())}
+        
+        txy_ar = pts_ar.reshape(-1, 2)
+        
+        res_d, df_d = dict(), dict()
+        log.info('building %i cross profile sets'%len(noFailr_d))
+        for eTag, wsl_rlay in noFailr_d.items():
+            
+            #max of the samples on each transect
+            v_ar = rlay_get_xyvals(wsl_rlay, txy_ar, logger=log).reshape(len(tr_df), tcnt+1)
+            
+            bx = np.isnan(v_ar).all(axis=1)
+            wsl_ar = np.full(len(tr_df), np.nan)
+            wsl_ar[~bx] = np.nanmax(v_ar[~bx], axis=1)
+            
+            log.debug('\'%s\' got %i (of %i) transects w/o wsl samples'%(eTag, bx.sum(), len(bx)))
+            
+            #calc freeboard
+            df = tr_df.copy()
+            df[self.wsln] = wsl_ar.round(self.prec)
+            df[self.fbn] = (df[self.celn] - wsl_ar).round(self.prec)
+            
+            #===================================================================
+            # #re-assemble layer
+            #===================================================================
+            res_d[eTag] = self.vlay_new_df2(df, geo_d=geo_d, logger=log, gkey=tr_fid,
+                                   layname='%s_%s_expo'%(dike_vlay.name(), eTag))
+            
+            df_d[eTag] = df.loc[:, (self.fbn, self.wsln)]
+            
+        #=======================================================================
+        # assemble data
+        #=======================================================================
+        df_d['common'] = tr_df
+        dxcol = pd.concat(df_d, axis=1, names=['eTag'])
+        
+        #=======================================================================
+        # wrap----
+        #=======================================================================
+        log.info('finished building exposure on %i events'%len(res_d))
+        self.expo_vlay_d = res_d
+        self.expo_dxcol = dxcol
+
+        return self.expo_dxcol, self.expo_vlay_d
+    
+    @staticmethod
+    def _densify_verts( #add vertices so no segment is longer than the interval
+            xy_ar, #(n, 2) vertices of a line
+            dist, #interval
+            ):
+        """
+        mimics QgsGeometry.densifyByDistance()
+            each segment is split into ceil(length/dist) equal parts
+        """
+        if len(xy_ar)<2:
+            return xy_ar
+        
+        d_ar = np.diff(xy_ar, axis=0)
+        cnt_ar = np.maximum(np.ceil(np.hypot(*d_ar.T)/dist), 1).astype(int)
+        
+        #start of each new segment
+        sidx = np.repeat(np.arange(len(d_ar)), cnt_ar)
+        frac_ar = (np.arange(cnt_ar.sum()) - np.repeat(np.cumsum(cnt_ar) - cnt_ar, cnt_ar))/cnt_ar[sidx]
+        
+        return np.vstack((xy_ar[sidx] + frac_ar[:, None]*d_ar[sidx], xy_ar[-1:]))
+    
+    @staticmethod
+    def _get_vertex_angles( #direction of the line at each vertex
+            xy_ar, #(n, 2) vertices of a line
+            ):
+        """
+        mimics QgsLineString.vertexAngle()
+            radians clockwise from north
+            bisector of the adjacent segments (closed lines wrap around)
+        """
+        if len(xy_ar)<2:
+            return np.zeros(len(xy_ar))
+        
+        d_ar = np.diff(xy_ar, axis=0)
+        seg_ar = np.mod(np.pi/2 - np.arctan2(d_ar[:, 1], d_ar[:, 0]), 2*np.pi) #segment azimuths
+        
+        #previous and next segment of each vertex
+        a1_ar = np.concatenate([seg_ar[:1], seg_ar])
+        a2_ar = np.concatenate([seg_ar, seg_ar[-1:]])
+        
+        if len(xy_ar)>2 and np.array_equal(xy_ar[0], xy_ar[-1]): #closed
+            a1_ar[0], a2_ar[-1] = seg_ar[-1], seg_ar[0]
+        
+        #average angle
+        cw_ar = np.mod(a2_ar - a1_ar, 2*np.pi)
+        res_ar = np.where(cw_ar<=np.pi, a1_ar + cw_ar/2, a1_ar - (2*np.pi - cw_ar)/2)
+        
+        return np.mod(res_ar, 2*np.pi)
+    
     def get_fb_smry(self, #get a summary of the freeboard value for feeding to the curves 
                       dxcol = None,
                       stat = 'min', #summary statistic to apply to the freeboard values (min=worst case)
@@ -16,13 +16,14 @@ mapping dike analysis results back onto geometry
 #==============================================================================
 # imports------------
 #==============================================================================
-import os
+import os, sqlite3
 import numpy as np
 import pandas as pd
 from pandas import IndexSlice as idx
 
 #Qgis imports
-from qgis.core import QgsVectorLayer, QgsWkbTypes, QgsMapLayerStore, QgsGeometry
+from qgis.core import QgsVectorLayer, QgsWkbTypes, QgsMapLayerStore, QgsGeometry, \
+    QgsVectorFileWriter, QgsCoordinateTransformContext
 
  
 import processing
@@ -33,7 +34,7 @@ from hlpr.exceptions import QError as Error
     
 
 from hlpr.Q import Qcoms, vlay_get_fdf, vlay_get_fdata, view, stat_pars_d, \
-    vlay_rename_fields
+    vlay_rename_fields, vlay_get_geohash
     
  
 
@@ -44,20 +45,69 @@ from .dPlot import DPlotr
 #==============================================================================
 # functions-------------------
 #==============================================================================
+def _sql_val(v): #format a value for an sql literal
+    if isinstance(v, str):
+        return "'%s'"%v.replace("'", "''")
+    return str(v)
+
+def gpkg_add_df( #add a frame as an attribute table to an open GeoPackage
+        con, #sqlite3.Connection
+        df,
+        tabn, #table name
+        index=False, #whether to include the index as a column
+        ):
+    """
+    registered in gpkg_contents as 'attributes' (no geometry) so QGIS/OGR list it
+    """
+    if index:
+        df = df.reset_index()
+        
+    #column types
+    def get_stype(dtype):
+        if 'int' in dtype.name or 'bool' in dtype.name: return 'INTEGER'
+        if 'float' in dtype.name: return 'REAL'
+        return 'TEXT'
+    
+    coln_l = ['"%s" %s'%(coln, get_stype(col.dtype)) for coln, col in df.items()]
+    
+    con.execute('CREATE TABLE "%s" (fid INTEGER PRIMARY KEY AUTOINCREMENT, %s)'%(
+        tabn, ', '.join(coln_l)))
+    
+    #values (as python types w/ None for nulls)
+    vals_l = [[None if pd.isna(v) else v for v in col.tolist()] for coln, col in df.items()]
+    
+    con.executemany('INSERT INTO "%s" (%s) VALUES (%s)'%(
+        tabn, ', '.join(['"%s"'%c for c in df.columns]), ', '.join(['?']*len(df.columns))),
+        zip(*vals_l))
+    
+    con.execute("""INSERT INTO gpkg_contents (table_name, identifier, data_type) 
+        VALUES (?, ?, 'attributes')""", (tabn, tabn))
+    
+#==============================================================================
+# classes-------------------
+#==============================================================================
 class DikeJoiner(Qcoms, DPlotr):
     """
 
     """
  
     #ifidN = 'ifzID'
+    
+    #table names for join_mode='long' (see output_long())
+    ifz_layn = 'ifz' #shared influence polygons
+    seg_layn = 'segs' #segment properties
+    pfl_layn = 'pfail' #long failure probabilities
 
 
     def __init__(self,
+                 join_mode='copy', #how to join the pfails onto the ifz polys (see join_pfails())
                   *args,
  
                     **kwargs):
         
         super().__init__(*args,**kwargs)
+        
+        self.join_mode=join_mode
  
         self.logger.debug('Diker.__init__ w/ feedback \'%s\''%type(self.feedback).__name__)
         
@@ -217,6 +267,12 @@ class DikeJoiner(Qcoms, DPlotr):
                     
                     split_dikes=False, #generate a fpoly layer for each dike
                         #where a breach raster 
+                        
+                    join_mode=None, #how to join
+                        #copy: new memory layer per event w/ a copy of the polygons for each segment
+                        #long: one GeoPackage w/ the shared polygons, long pfails, and a view per event
+                            #(see output_long() and build.lisamp.LikeSampler.run_long())
+                    out_fp=None, #GeoPackage for join_mode='long'
                     ):
         
         #=======================================================================
@@ -225,6 +281,7 @@ class DikeJoiner(Qcoms, DPlotr):
         log = self.logger.getChild('jp')
         if eifz_d is None: eifz_d=self.eifz_d
         if pf_df is None: pf_df = self.pfail_df
+        if join_mode is None: join_mode=self.join_mode
         
         log.info('on %i events w/ pfail %s'%(len(eifz_d), str(pf_df.shape)))
         #=======================================================================
@@ -243,6 +300,13 @@ class DikeJoiner(Qcoms, DPlotr):
         #     miss_l = set(['ifz_vlay']).difference(ed.keys())
         #     assert len(miss_l)==0, '%s keys mismatch: %s'%(eTag, miss_l)
         #=======================================================================
+        
+        if join_mode=='long':
+            self.ipf_vlay_d = self._join_pfails_long(eifz_d, pf_df, pf_min=pf_min, 
+                                     split_dikes=split_dikes, out_fp=out_fp, logger=log)
+            return self.ipf_vlay_d
+        elif not join_mode=='copy':
+            raise Error('bad join_mode: \'%s\''%join_mode)
             
         #=======================================================================
         # loop on events----
@@ -345,6 +409,210 @@ class DikeJoiner(Qcoms, DPlotr):
         self.ipf_vlay_d = res_d
         return self.ipf_vlay_d
     
+    def _join_pfails_long(self, #build the long pfail data against the shared ifz polys
+                          eifz_d,
+                          pf_df,
+                          pf_min=0.0,
+                          split_dikes=False,
+                          out_fp=None,
+                          logger=None,
+                          ):
+        """
+        the ifz polygons are the same for each event (only the pfail changes)
+            so write these once and key the pfails by (sid, eTag) in a separate table
+            
+        nothing is copied per event (see output_long())
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('long')
+        
+        if pf_df.index.name is None:
+            pf_df = pf_df.rename_axis(self.sid)
+        sidn = pf_df.index.name
+        
+        #=======================================================================
+        # shared polygons
+        #=======================================================================
+        """load_ifz_fps() fixes the geometry of repeat layers.. so compare the contents"""
+        vlay_d = dict() #{geometry hash: ifz vlay}
+        for eTag, vlay in eifz_d.items():
+            self._check_ifz(vlay)
+            ghash = vlay_get_geohash(vlay, fieldn_l=[self.ifidN])
+            if not ghash in vlay_d:
+                vlay_d[ghash] = vlay
+                
+        if not len(vlay_d)==1:
+            raise Error('join_mode=\'long\' expects the same influence polygons on all events ' + \
+                        '(got %i unique layers).. use join_mode=\'copy\''%len(vlay_d))
+            
+        ifz_vlay = list(vlay_d.values())[0]
+        
+        #check keys
+        ifz_ser = vlay_get_fdata(ifz_vlay, fieldn=self.ifidN, fmt='ser', logger=log)
+        miss_l = set(pf_df[self.ifidN]).symmetric_difference(ifz_ser)
+        assert len(miss_l)==0, 'got key mismatch: %s'%miss_l
+        
+        log.info('on \'%s\' w/ %i feats shared by %i events'%(
+            ifz_vlay.name(), len(ifz_ser), len(eifz_d)))
+        #=======================================================================
+        # long pfails
+        #=======================================================================
+        etag_l = [e for e in self.etag_l if e in eifz_d]
+        
+        pfl_df = pf_df.loc[:, etag_l].round(self.prec).rename_axis('eTag', axis=1
+                        ).stack().rename(self.pfn).reset_index().join(
+                            pf_df[self.ifidN], on=sidn)
+                            
+        pfl_df = pfl_df.loc[:, [sidn, self.ifidN, 'eTag', self.pfn]]
+        
+        #apply threshold
+        boolidx = pfl_df[self.pfn]<=pf_min
+        
+        if boolidx.any():
+            log.info('got %i (of %i) %s below threshold (%.2f)'%(
+                boolidx.sum(), len(boolidx), self.pfn, pf_min))
+            pfl_df = pfl_df.loc[~boolidx, :].reset_index(drop=True)
+        
+        miss_l = set(etag_l).difference(pfl_df['eTag'])
+        if len(miss_l)>0:
+            log.warning('all %s below threshold on %i (of %i) events... skipping \n    %s'%(
+                self.pfn, len(miss_l), len(etag_l), miss_l))
+            
+        assert len(pfl_df)>0, 'all %s below threshold'%self.pfn
+        
+        #segment properties
+        seg_df = pf_df.drop(self.etag_l, axis=1)
+        
+        #=======================================================================
+        # wrap
+        #=======================================================================
+        self.ifz_vlay, self.seg_df, self.pfl_df = ifz_vlay, seg_df, pfl_df
+        
+        log.debug('pfl_df %s'%str(pfl_df.shape))
+        
+        return self.output_long(out_fp=out_fp, split_dikes=split_dikes, logger=log)
+    
+    def output_long(self, #write the shared ifz polys and the long pfails to one GeoPackage
+                    ifz_vlay=None, #shared influence polygons
+                    seg_df=None, #segment properties (index=sid)
+                    pfl_df=None, #long pfails {sid, ifidN, eTag, pfn}
+                    out_fp=None,
+                    
+                    views=True, #add a view joining the polygons to each event's pfails
+                    split_dikes=False, #add a view for each event and dike
+                    logger=None,
+                    ):
+        """
+        tables:
+            ifz_layn: the polygons w/ just the ifidN field (written once)
+            seg_layn: attributes. one row per segment
+            pfl_layn: attributes. one row per (segment, event)
+            
+        views (one per event) match the layers of join_mode='copy'
+            geometry is only stored once (each view reads it from ifz_layn)
+            
+        see build.lisamp.LikeSampler.load_long()
+        
+        returns {eTag (or 'eTag.did' w/ split_dikes): view vlay} like join_pfails(join_mode='copy')
+            (empty if views=False)
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log=logger.getChild('output_long')
+        
+        if ifz_vlay is None: ifz_vlay=self.ifz_vlay
+        if seg_df is None: seg_df=self.seg_df
+        if pfl_df is None: pfl_df=self.pfl_df
+        
+        if out_fp is None: out_fp = os.path.join(self.out_dir, '%s_ifz.gpkg'%self.tag)
+        
+        sidn = seg_df.index.name
+        assert not sidn is None
+        
+        if os.path.exists(out_fp):
+            msg = 'requested file path already exists!. overwrite=%s \n    %s'%(
+                self.overwrite, out_fp)
+            if self.overwrite:
+                log.warning(msg)
+                os.remove(out_fp)
+            else:
+                raise Error(msg)
+        
+        #=======================================================================
+        # polygons
+        #=======================================================================
+        opts = QgsVectorFileWriter.SaveVectorOptions()
+        opts.driverName = 'GPKG'
+        opts.layerName = self.ifz_layn
+        opts.attributes = [ifz_vlay.fields().indexFromName(self.ifidN)]
+        
+        error = QgsVectorFileWriter.writeAsVectorFormatV2(ifz_vlay, out_fp, 
+                QgsCoordinateTransformContext(), opts)
+        
+        if not error[0] == QgsVectorFileWriter.NoError:
+            raise Error('FAILURE on writing layer \' %s \'  with code:\n    %s \n    %s'%(
+                ifz_vlay.name(),error, out_fp))
+        
+        #=======================================================================
+        # tables and views
+        #=======================================================================
+        view_d = dict() #{result key: (view name, sql filter)}
+        if views:
+            for eTag in pfl_df['eTag'].unique():
+                where = 'p."eTag"=%s'%_sql_val(eTag)
+                if not split_dikes:
+                    view_d[eTag] = ('%s_%s_ifz'%(self.tag, eTag), where)
+                else:
+                    did_l = seg_df.loc[pfl_df.loc[pfl_df['eTag']==eTag, sidn], self.dikeID].unique()
+                    for did in did_l:
+                        view_d['%s.%s'%(eTag, did)] = ('%s_%s_%s_ifz'%(self.tag, eTag, did), 
+                            '%s AND s."%s"=%s'%(where, self.dikeID, _sql_val(did)))
+                            
+        #columns of each view
+        col_l = ['s."%s"'%c for c in seg_df.columns if not c==self.ifidN]
+        col_l = ['p."%s"'%c for c in [sidn, self.ifidN]] + col_l + ['p."eTag"', 'p."%s"'%self.pfn]
+        
+        with sqlite3.connect(out_fp) as con:
+            gpkg_add_df(con, seg_df, self.seg_layn, index=True)
+            gpkg_add_df(con, pfl_df, self.pfl_layn)
+            
+            #geometry of the polygons
+            geomn, gtype, srs_id, z, m = con.execute("""SELECT column_name, geometry_type_name, 
+                srs_id, z, m FROM gpkg_geometry_columns WHERE table_name=?""", (self.ifz_layn, )).fetchone()
+            
+            for viewn, where in view_d.values():
+                con.execute("""CREATE VIEW "%s" AS SELECT p.fid AS OGC_FID, g."%s", %s 
+                    FROM "%s" p JOIN "%s" g ON g."%s"=p."%s" JOIN "%s" s ON s."%s"=p."%s"
+                    WHERE %s"""%(viewn, geomn, ', '.join(col_l), 
+                                 self.pfl_layn, self.ifz_layn, self.ifidN, self.ifidN, 
+                                 self.seg_layn, sidn, sidn, where))
+                
+                con.execute("""INSERT INTO gpkg_contents (table_name, identifier, data_type, srs_id)
+                    VALUES (?, ?, 'features', ?)""", (viewn, viewn, srs_id))
+                con.execute("""INSERT INTO gpkg_geometry_columns 
+                    (table_name, column_name, geometry_type_name, srs_id, z, m) 
+                    VALUES (?, ?, ?, ?, ?, ?)""", (viewn, geomn, gtype, srs_id, z, m))
+        
+        log.info('wrote %i polygons, %s pfails, and %i views to \n    %s'%(
+            ifz_vlay.dataProvider().featureCount(), str(pfl_df.shape), len(view_d), out_fp))
+        #=======================================================================
+        # load the views
+        #=======================================================================
+        vlay_d = dict()
+        for k, (viewn, _) in view_d.items():
+            vlay = QgsVectorLayer('%s|layername=%s'%(out_fp, viewn), viewn, 'ogr')
+            assert vlay.isValid(), 'failed to load view \'%s\''%viewn
+            vlay_d[k] = vlay
+            
+        self.long_fp = out_fp
+        
+        return vlay_d
+    
     def output_vlays(self,#convenience for outputting all the exposure data
                      vlay_d = None,
                      logger=None,
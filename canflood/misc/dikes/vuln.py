@@ -50,10 +50,14 @@ class Dvuln(DPlotr):
     pfmax = 0.999 #maximum failure probability to apply
 
     def __init__(self,
-                 
+                 pf_engine='vect', #engine for evaluating the fragility curves. see get_failP()
+                 dtag_rels='indep', #how to combine multiple fragility functions on a segment. see _get_failP_ar()
                   *args,  **kwargs):
         
         super().__init__(*args,**kwargs)
+        
+        self.pf_engine=pf_engine
+        self.dtag_rels=dtag_rels
 
         self.dfuncs_d = dict() #container for damage functions
         
@@ -129,6 +133,10 @@ class Dvuln(DPlotr):
     def get_failP(self, #get the failure probabilyt of each segment
                   dfuncs_d = None,
                   expo_df = None, #freeboard data (without crest buffer)
+                  engine=None, #how to evaluate the curves
+                    #vect: one array interpolation per fragility curve (see _get_failP_ar())
+                    #loop: unique freeboards per curve, mapped back with replace (one tag column only)
+                  dtag_rels=None, #combining multiple tag columns. see _get_failP_ar()
                   ): 
         """
         unlike the damage model... our 'inventory' and exposure data is on the same frame
@@ -139,6 +147,8 @@ class Dvuln(DPlotr):
         log = self.logger.getChild('get_failP')
         if dfuncs_d is None: dfuncs_d = self.dfuncs_d #i guess were not using weak refs
         if expo_df is None: expo_df = self.expo_df.copy()
+        if engine is None: engine=self.pf_engine
+        if dtag_rels is None: dtag_rels=self.dtag_rels
         
         log.info('on expo %s w/ %i dfuncs'%(str(expo_df.shape), len(dfuncs_d)))
         
@@ -147,11 +157,8 @@ class Dvuln(DPlotr):
         #=======================================================================
         tagCols = [c for c in expo_df.columns if c.endswith('_dtag')] #id tag columns
         
-        assert len(tagCols) == 1, 'only 1 tag column is supported now'
-        """ TODO: expand to handle multiple functins per curve
-        (where we calc union or mutEx probability for the combination)"""
-        
-        tag_ser = expo_df[tagCols[0]]
+        if engine=='loop':
+            assert len(tagCols) == 1, 'only 1 tag column is supported by engine=\'loop\''
         
         #=======================================================================
         # add crest buffers----------
@@ -174,6 +181,192 @@ class Dvuln(DPlotr):
         
         log.info('added %s values \n    %s'%(self.cbfn, cb_ser.to_dict()))
         
+        #=======================================================================
+        # calc
+        #=======================================================================
+        if engine=='vect':
+            rdf = pd.DataFrame(self._get_failP_ar(edf.values, expo_df.loc[:, tagCols], 
+                                                  dfuncs_d=dfuncs_d, dtag_rels=dtag_rels, logger=log),
+                               index=edf.index, columns=edf.columns)
+        elif engine=='loop':
+            rdf = self._get_failP_loop(edf, expo_df[tagCols[0]], dfuncs_d=dfuncs_d, logger=log)
+        else:
+            raise Error('unrecognized engine: \'%s\''%engine)
+            
+        return self._set_pf_df(rdf, expo_df, logger=log)
+    
+    def get_failP_dx(self, #get the failure probability of each segment from the transect exposures
+                  dfuncs_d = None,
+                  expo_df = None, #segment data (tags and crest buffers). see load_expo()
+                  dxcol = None, #transect freeboards. see load_expo_dx()
+                  chunk_size = int(1e5), #transects to evaluate at once
+                  dtag_rels=None,
+                  ):
+        """
+        evaluates the curves on each transect (w/ the tags and crest buffer of its segment)
+            then takes the worst (max) failure probability on each segment
+            
+        transects are handled in chunks so long dike systems dont need the full 
+            (transect x event x tag) arrays in memory
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        log = self.logger.getChild('get_failP_dx')
+        if dfuncs_d is None: dfuncs_d = self.dfuncs_d
+        if expo_df is None: expo_df = self.expo_df.copy()
+        if dxcol is None: dxcol = self.expo_dxcol
+        if dtag_rels is None: dtag_rels=self.dtag_rels
+        
+        tagCols = [c for c in expo_df.columns if c.endswith('_dtag')]
+        
+        #=======================================================================
+        # precheck
+        #=======================================================================
+        miss_l = set(self.etag_l).difference(dxcol.columns.levels[0])
+        assert len(miss_l)==0, 'expo_dxcol missing %i events: %s'%(len(miss_l), miss_l)
+        
+        sid_ar = dxcol.loc[:, ('common', self.sid)].values
+        
+        miss_l = set(sid_ar).difference(expo_df.index)
+        assert len(miss_l)==0, 'expo_dxcol has %i segments not in expo_df: %s'%(len(miss_l), miss_l)
+        
+        assert expo_df[self.cbfn].notna().all(), 'got nulls on %s data'%self.cbfn
+        
+        #transect freeboards (w/ segment crest buffers)
+        fb_ar = np.column_stack([dxcol[(eTag, self.fbn)].values for eTag in self.etag_l]).astype(float)
+        cb_ar = expo_df[self.cbfn].reindex(sid_ar).values
+        
+        log.info('on %i transects (%i segments) and %i events in chunks of %i'%(
+            len(sid_ar), len(set(sid_ar)), len(self.etag_l), chunk_size))
+        
+        #=======================================================================
+        # calc in chunks
+        #=======================================================================
+        res_l = list()
+        for i in range(0, len(sid_ar), chunk_size):
+            sids = sid_ar[i:i+chunk_size]
+            
+            p_ar = self._get_failP_ar(fb_ar[i:i+chunk_size] + cb_ar[i:i+chunk_size, None],
+                                       expo_df.loc[sids, tagCols],
+                                       dfuncs_d=dfuncs_d, dtag_rels=dtag_rels, logger=log)
+            
+            #worst transect on each segment
+            res_l.append(pd.DataFrame(p_ar, columns=self.etag_l).groupby(sids).max())
+            
+        rdf = pd.concat(res_l).groupby(level=0).max().reindex(expo_df.index)
+        
+        if rdf.isna().any().any():
+            log.warning('%i (of %i) segments w/o transects... setting pFail=0.0'%(
+                rdf.isna().any(axis=1).sum(), len(rdf)))
+            
+            rdf = rdf.fillna(0.0)
+        
+        return self._set_pf_df(rdf, expo_df, logger=log)
+    
+    def _get_failP_ar(self, #failure probabilities w/ one interpolation per fragility curve
+                      e_ar, #freeboards (w/ crest buffers). (segment x event)
+                      tag_df, #fragility tag columns (one row per segment)
+                      dfuncs_d=None,
+                      dtag_rels='indep', #how to combine the tags of each segment
+                        #indep: independent failure modes (1 - prod(1-p))
+                        #mutEx: mutually exclusive failure modes (sum, capped at 1)
+                        #max: worst failure mode
+                      logger=None,
+                      ):
+        """
+        for each tag column, same results as _get_failP_loop()
+            null tags (segments w/ fewer functions) get pFail=0.0
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if dfuncs_d is None: dfuncs_d = self.dfuncs_d
+        if logger is None: logger=self.logger
+        log = logger.getChild('vect')
+        
+        minFB, maxFB = min(self.minFB_d.values()), max(self.maxFB_d.values())
+        
+        #=======================================================================
+        # precheck
+        #=======================================================================
+        assert len(tag_df.columns)>0, 'no tag columns'
+        assert dtag_rels in ('indep', 'mutEx', 'max'), 'bad dtag_rels: \'%s\''%dtag_rels
+        assert e_ar.shape[0]==len(tag_df)
+        
+        tag_ar = tag_df.values.T #(tag column x segment)
+        tbx_ar = pd.notna(tag_ar)
+        assert tbx_ar.any(axis=0).all(), 'got some segments w/o tags'
+        
+        miss_l = set(tag_ar[tbx_ar]).difference(dfuncs_d.keys())
+        assert len(miss_l)==0, 'missing fragility curves: %s'%miss_l
+        
+        #flag exposures outside boundary as False (also flags Nulls as false)
+        with np.errstate(invalid='ignore'):
+            vbx_ar = np.logical_and(e_ar>=minFB, e_ar<=maxFB)
+            
+        assert vbx_ar.any(), 'all exposures outside bounds'
+        
+        #=======================================================================
+        # evaluate each curve
+        #=======================================================================
+        p_ar = np.zeros((len(tag_ar),)+e_ar.shape) #(tag column x segment x event)
+        
+        for dtag in np.unique(tag_ar[tbx_ar]):
+            #entries w/ this tag and a valid exposure
+            bx = np.logical_and((tag_ar==dtag)[:, :, None], vbx_ar[None, :, :])
+            if not bx.any():
+                log.warning('%s got no valid calcs.. skipping'%dtag)
+                continue
+            
+            p_ar[bx] = dfuncs_d[dtag].get_dmg(np.broadcast_to(e_ar, p_ar.shape)[bx])
+            
+            log.debug('calculated \'%s\' on %i entries'%(dtag, bx.sum()))
+            
+        #=======================================================================
+        # fill boundary values
+        #=======================================================================
+        """nulls and maximums stay at 0.0"""
+        with np.errstate(invalid='ignore'):
+            min_bx = np.logical_and(tbx_ar[:, :, None], e_ar<minFB) #water is WELL above the crest
+            
+        p_ar[min_bx] = self.pfmax
+        
+        #=======================================================================
+        # combine the tags
+        #=======================================================================
+        if len(p_ar)==1:
+            res_ar = p_ar[0]
+        elif dtag_rels=='indep':
+            res_ar = 1 - np.prod(1 - p_ar, axis=0)
+        elif dtag_rels=='mutEx':
+            res_ar = p_ar.sum(axis=0)
+            
+            if (res_ar>1).any():
+                log.warning('%i (of %i) mutEx sums exceed 1.0... capping at pfmax'%((res_ar>1).sum(), res_ar.size))
+        else:
+            res_ar = p_ar.max(axis=0)
+            
+        #combined values above the maximum (e.g., several curves at pfmax)
+        res_ar = np.minimum(res_ar, self.pfmax)
+            
+        log.info('got %s pFail from %i tag columns w/ \'%s\''%(str(res_ar.shape), len(p_ar), dtag_rels))
+        
+        return res_ar
+    
+    def _get_failP_loop(self, #failure probabilities w/ scalar calls on each unique freeboard
+                        edf, #freeboards (w/ crest buffers)
+                        tag_ser, #fragility tag of each segment
+                        dfuncs_d=None,
+                        logger=None,
+                        ):
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if dfuncs_d is None: dfuncs_d = self.dfuncs_d
+        if logger is None: logger=self.logger
+        log = logger.getChild('loop')
+        
         #=======================================================================
         # get valid exposure entries
         #=======================================================================
@@ -293,6 +486,17 @@ class Dvuln(DPlotr):
             
             rdf = rdf.where(~max_booldf, other=0.0)
             
+        return rdf
+    
+    def _set_pf_df(self, #check and attach the failure probabilities
+                   rdf, #pFail (segment x event)
+                   expo_df, #segment data
+                   logger=None,
+                   ):
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('pf_df')
+        
         #=======================================================================
         # checks
         #=======================================================================
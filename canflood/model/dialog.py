@@ -211,7 +211,13 @@ class ModelDialog(QtWidgets.QDialog, FORM_CLASS,
         # #build worker
         #======================================================================
         kwargs = {attn:getattr(self, attn) for attn in self.inherit_fieldNames}
+        chunk_size = self.spinBox_i2_chunk.value()
+        if chunk_size>0:
+            self._run_impact2_chunks(chunk_size, kwargs, log)
+            return
+        
         model = Dmg2(attriMode=self.checkBox_SS_attr.isChecked(),
+                     attriCompact=True, #see modcom.AttriMat
                      upd_cf = self.checkBox_SS_updCf.isChecked(),**kwargs
                      ).setup()
                              
@@ -281,6 +287,46 @@ class ModelDialog(QtWidgets.QDialog, FORM_CLASS,
             self.logger.info('linking in Risk 2')
             self.run_risk2()
             
+    def _run_impact2_chunks(self, #run Impacts (L2) on blocks of assets (see Dmg2.run_chunks())
+                            chunk_size,
+                            kwargs, #worker inheritance kwargs
+                            log,
+                            ):
+        start = time.time()
+        
+        if self.checkBox_SS_attr.isChecked():
+            raise Error('attribution is not supported on chunked runs... set the block size to 0')
+        
+        for chk, nm in ((self.checkBox_i2_ddf, 'depths'), (self.checkBox_i2_pbox, 'box plot'),
+                        (self.checkBox_i2_phist, 'histogram')):
+            if chk.isChecked():
+                log.warning('\'%s\' is not available on chunked runs... skipping'%nm)
+        
+        model = Dmg2(chunk_size=chunk_size,
+                     upd_cf = self.checkBox_SS_updCf.isChecked(),**kwargs
+                     ).setup()
+        
+        #run and stream the results to file
+        _ = model.run_chunks(write_bdmg=self.checkBox_i2_outExpnd.isChecked(),
+                             write_smry=self.checkBox_i2bSmry.isChecked())
+        self.feedback.upd_prog(90)
+        
+        if self.checkBox_SS_updCf.isChecked():
+            model.update_cf()
+            
+        #=======================================================================
+        # wrap
+        #=======================================================================
+        tdelta = (time.time()-start)/60.0
+        self.logger.push('Impacts2 complete in %.4f mins (blocks of %i assets, peak memory %.2f MB)'%(
+            tdelta, chunk_size, model.mem_peak/(1024**2)))
+ 
+        self.feedback.upd_prog(None)
+        
+        if self.checkBox_i2RunRisk.isChecked():
+            self.logger.info('linking in Risk 2')
+            self.run_risk2()
+            
     def run_risk2(self):
         #======================================================================
         # get run vars
@@ -297,6 +343,7 @@ class ModelDialog(QtWidgets.QDialog, FORM_CLASS,
         #======================================================================
         kwargs = {attn:getattr(self, attn) for attn in self.inherit_fieldNames}
         model = Risk2(attriMode=self.checkBox_SS_attr.isChecked(),
+                      attriCompact=True, #see modcom.AttriMat
                       upd_cf = self.checkBox_SS_updCf.isChecked(),**kwargs
                       ).setup()
         
@@ -12,7 +12,7 @@ impacts model 2
 # imports---------------------------
 #==============================================================================
 #python standards
-import configparser, os, logging, datetime
+import configparser, os, logging, datetime, sys
 
 """not sure what happened to the weak references..."""
 
@@ -29,10 +29,11 @@ idx = pd.IndexSlice
 from hlpr.exceptions import QError as Error
 
 #from hlpr.Q import *
-from hlpr.basic import view
+from hlpr.basic import view, unlink_shared
 #from model.modcom import Model
 from hlpr.plot import Plotr
-from model.modcom import DFunc, Model
+from model.modcom import DFunc, Model, CurveLib, AttriMat
+from hlpr.cache import file_hash
 
 #==============================================================================
 # functions----------------------
@@ -57,6 +58,7 @@ class Dmg2(Model, DFunc, Plotr):
         }
     
     dfuncs_d = dict() #container for damage functions
+    clib = None #compiled curve library (see load_df_ctrl())
     mi_meta_d = dict() #container for mitigation threshold counters
     #===========================================================================
     # #expectations from parameter file
@@ -96,13 +98,21 @@ class Dmg2(Model, DFunc, Plotr):
                     }
 
     
-    def __init__(self, **kwargs):
+    def __init__(self, 
+                 bdmg_engine='vect', #engine for raw impacts. see bdmg_raw()
+                 chunk_size=None, #count of assets (cids) per block. see run_chunks()
+                 use_clib=False, #load curves from a compiled library (written to the out_dir). see CurveLib
+                 **kwargs):
         
 
         
         #init the baseclass
         super().__init__(**kwargs) #initilzie Model
         
+        self.bdmg_engine=bdmg_engine
+        self.chunk_size=chunk_size
+        self.use_clib=use_clib
+        
         self.dtag_d={**self.dtag_d,**{
             'expos':{'index_col':0},
             'curves':{'sheet_name':None, 'header':None, 'index_col':None}
@@ -112,6 +122,26 @@ class Dmg2(Model, DFunc, Plotr):
         
         self.logger.debug('Dmg2.__init__ finished')
         
+    def load_df_ctrl(self, #load raw data from control file
+                     dtag_d=None,
+                     **kwargs):
+        """curves are taken from the compiled library (rather than re-reading the workbook)"""
+        if dtag_d is None: dtag_d=self.dtag_d
+        
+        if self.use_clib and 'curves' in dtag_d and not self.curves=='':
+            skey = ('CurveLib', file_hash(self.curves))
+            if not self.data_store is None and skey in self.data_store:
+                self.clib = self.data_store[skey] #read-only
+            else:
+                self.clib = CurveLib(self.curves, logger=self.logger, out_dir=self.out_dir).load()
+                
+                if not self.data_store is None:
+                    self.data_store[skey] = self.clib
+                
+            dtag_d = {k:v for k,v in dtag_d.items() if not k=='curves'}
+            
+        return super().load_df_ctrl(dtag_d=dtag_d, **kwargs)
+        
     def prep_model(self):
         #======================================================================
         # setup funcs
@@ -134,10 +164,12 @@ class Dmg2(Model, DFunc, Plotr):
         
 
         
-        self.build_exp_finv() #build the expanded finv
-        self.build_depths()
+        """for chunked runs, these are built on each block of assets by run_chunks()"""
+        if self.chunk_size is None:
+            self.build_exp_finv() #build the expanded finv
+            self.build_depths()
         
-        self.setup_dfuncs(self.raw_d['curves'])
+        self.setup_dfuncs(self.raw_d.get('curves', None))
         
 
         #======================================================================
@@ -154,7 +186,7 @@ class Dmg2(Model, DFunc, Plotr):
         return 
          
     def setup_dfuncs(self, # build curve workers from loaded xlsx data
-                 df_d, #{tab name: raw curve data
+                 df_d, #{tab name: raw curve data}. None: build from the compiled library
                  curve_deviation = None, #specify which curve deviation to build
                  ):
  
@@ -168,8 +200,15 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # get list of dfuncs in the finv
         #=======================================================================
-        assert self.bdf['ftag'].dtype.char == 'O'
-        ftags_valid = self.bdf['ftag'].unique().tolist()
+        if self.chunk_size is None:
+            assert self.bdf['ftag'].dtype.char == 'O'
+            ftags_valid = self.bdf['ftag'].unique().tolist()
+        else:
+            """expanded finv is not built yet... take all the tags from the finv"""
+            fdf = self.data_d['finv']
+            ftags_valid = pd.Series(
+                fdf.loc[:, fdf.columns.str.endswith('_tag')].values.ravel()
+                ).dropna().unique().tolist()
         
         if np.nan in ftags_valid:
             raise Error('got some nulls')
@@ -179,37 +218,50 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # #loop through each frame and build the func
         #=======================================================================
-        for tabn, df in df_d.items():
-            #===================================================================
-            # evaluate tab name
-            #===================================================================
-            if tabn.startswith('_'):
-                log.debug('skipping dummy tab \'%s\''%tabn)
-                continue
+        if df_d is None:
+            """build only the finv tags from the compiled library"""
+            assert not self.clib is None, 'no curves loaded'
+            for tabn in ftags_valid:
+                if not tabn in self.clib.pars_d and not tabn in self.clib.err_d:
+                    continue #see post checks
+                
+                dfunc = self.clib.get_dfunc(tabn, curve_deviation=curve_deviation, logger=self.logger)
+                
+                self.dfuncs_d[dfunc.tag] = dfunc
+                minDep_d[tabn] = dfunc.min_dep
+                
+        else:
+            for tabn, df in df_d.items():
+                #===================================================================
+                # evaluate tab name
+                #===================================================================
+                if tabn.startswith('_'):
+                    log.debug('skipping dummy tab \'%s\''%tabn)
+                    continue
             
-            tabn = tabn.strip() #remove whitespace
+                tabn = tabn.strip() #remove whitespace
             
-            #skip those not in the finv
-            if not tabn in ftags_valid:
-                log.debug('\'%s\' not in valid list'%tabn)
-                continue
+                #skip those not in the finv
+                if not tabn in ftags_valid:
+                    log.debug('\'%s\' not in valid list'%tabn)
+                    continue
             
-            if not isinstance(df, pd.DataFrame):
-                raise Error('unexpected type on tab \'%s\': %s'%(tabn, type(df)))
+                if not isinstance(df, pd.DataFrame):
+                    raise Error('unexpected type on tab \'%s\': %s'%(tabn, type(df)))
             
-            #===================================================================
-            # #build it
-            #===================================================================
-            dfunc = DFunc(tabn, curves_fp=self.curves, curve_deviation=curve_deviation,
-                          logger=self.logger
-                          ).build(df, log)
+                #===================================================================
+                # #build it
+                #===================================================================
+                dfunc = DFunc(tabn, curves_fp=self.curves, curve_deviation=curve_deviation,
+                              logger=self.logger
+                              ).build(df, log)
             
-            #store it
-            self.dfuncs_d[dfunc.tag] = dfunc
+                #store it
+                self.dfuncs_d[dfunc.tag] = dfunc
             
-            #collect stats
-            assert isinstance(dfunc.min_dep, float)
-            minDep_d[tabn] = dfunc.min_dep
+                #collect stats
+                assert isinstance(dfunc.min_dep, float)
+                minDep_d[tabn] = dfunc.min_dep
             
 
         #=======================================================================
@@ -250,22 +302,70 @@ class Dmg2(Model, DFunc, Plotr):
         # defaults
         #======================================================================
         log = self.logger.getChild('run')
+        
+        if not self.chunk_size is None:
+            raise Error('expanded finv not built for chunk_size=%s... use run_chunks()'%self.chunk_size)
+        
         self.feedback.upd_prog(10, method='raw') #add from here
         
         #=======================================================================
         # get impacts-----
         #=======================================================================
+        bres_df, cres_df = self._run_stages(logger=log)
+        self.feedback.upd_prog(70, method='raw')
+        
+        #=======================================================================
+        # wrap----
+        #=======================================================================
+        #=======================================================================
+        # get labels
+        #=======================================================================
+        if set_impactUnits:
+            """
+            if user wants to use the value in the c ontrol file.. pass set_impactUnits=False
+            otherwise we attempt to read from control file
+            
+            both should default to the modcom.Model.impact_units=impacts
+            """
+            self._set_impactUnits(logger=log)
+                
+        #for plotting
+        #=======================================================================
+        # report
+        #=======================================================================
+        log.debug('maxes:\n%s'%(
+            cres_df.max()))
+        
+        log.info('finished w/ %s and TtlDmg = %.2f'%(
+            str(cres_df.shape), cres_df.sum().sum()))
+        
+        self.feedback.upd_prog(80, method='raw')
+        
+        return cres_df
+    
+    def _run_stages(self, #impact stages on the loaded expanded finv (bdf and ddf)
+                    upd_prog=True, #report progress on each stage
+                    logger=None,
+                    ):
+        if logger is None: logger=self.logger
+        log = logger.getChild('stages')
+        
+        if upd_prog:
+            prog = lambda v:self.feedback.upd_prog(v, method='append')
+        else:
+            prog = lambda v:None
+        
         #======================================================================
         # dfunc, scale, and cap per bid
         #======================================================================
         bres_df = self.bdmg_raw()
-        self.feedback.upd_prog(5, method='append')
+        prog(5)
         
         bres_df = self.bdmg_scaled(res_df = bres_df)
-        self.feedback.upd_prog(5, method='append')
+        prog(5)
         
         bres_df = self.bdmg_capped(res_df=bres_df)
-        self.feedback.upd_prog(5, method='append')
+        prog(5)
         
         #=======================================================================
         # mitigations
@@ -276,73 +376,249 @@ class Dmg2(Model, DFunc, Plotr):
             #lower depth threshold
             if self.miLtcn in self.finv_cdf.columns:
                 bres_df, res_colg = self.bdmg_mitiT(res_df = bres_df, res_colg=res_colg)
-                self.feedback.upd_prog(5, method='append')
+                prog(5)
             
             #intermediate scale
             if self.miScn in self.finv_cdf.columns:
                 bres_df, res_colg = self.bdmg_mitiS(res_df = bres_df, res_colg=res_colg)
-                self.feedback.upd_prog(5, method='append')
+                prog(5)
             
             #intermediate value
             if self.miVcn in self.finv_cdf.columns:
                 bres_df, res_colg = self.bdmg_mitiV(res_df = bres_df, res_colg=res_colg)
-                self.feedback.upd_prog(5, method='append')
+                prog(5)
 
             #force positives
             """ mitigation vaslue shifts bdmg_mitiS() especially can lead to negative values"""
-            booldf = bres_df <0 #find negatives
-            if booldf.any().any():
+            bool_ar = bres_df.values <0 #find negatives
+            if bool_ar.any():
                 log.warning('mitigation handles got %i (of %i) negative values... replacing with zeros'%(
-                    booldf.sum().sum(), booldf.size))
+                    bool_ar.sum(), bool_ar.size))
                 
-                bres_df = bres_df.where(~booldf,
-                        pd.DataFrame(0, index=bres_df.index, columns=bres_df.columns))
+                bres_df = bres_df.clip(lower=0) #nulls are preserved
         #=======================================================================
         # finalize damages
         #=======================================================================
         """attaches cres_df to self"""
-        bres_df, cres_df = self.bdmg_cleaned(res_df=bres_df, res_colg=res_colg)
-        self.feedback.upd_prog(70, method='raw')
+        return self.bdmg_cleaned(res_df=bres_df, res_colg=res_colg)
+    
+    def _set_impactUnits(self, #set impact_units from the dfuncs
+                         logger=None):
+        if logger is None: logger=self.logger
+        log = logger.getChild('_set_impactUnits')
+        try:
+            dFunc_iu = self.get_DF_att(attn='impact_units')
+            if not dFunc_iu == '' or dFunc_iu is None:
+                self.impact_units = dFunc_iu
+        except Exception as e:
+            log.warning('failed to set \'impact_units\' w/ %s'%e)
+    
+
+    def run_chunks(self, #run on blocks of assets, streaming the results to file
+                   chunk_size=None, #count of assets (cids) per block
+                   
+                   #outputs
+                   write_bdmg=False, #stream the expanded results (see output_bdmg())
+                   write_smry=True, #write the accumulated summary (see bdmg_smry())
+                   set_impactUnits=True, #set impact_units from the dfunc
+                   ):
+        """
+        for inventories too large to expand (and hold each bdmg_* stage) in memory.
+            prep_model() skips the expansion when chunk_size is set
+        
+        each block of cids (so nests stay together) is expanded, run through the
+            same stages as run(), then appended to file:
+                dmgs (cid results. see output_cdmg(). columns in evals order)
+                dmgs_expnd (optional, see output_bdmg())
+            
+        only the additive summary tabs are kept between blocks (see _get_bdmg_smry())
+            'cap_data' is not written
+            
+        attribution and the plotters need the full results and are not supported
+        
+        returns the total impacts per event
+        """
+        #======================================================================
+        # defaults
+        #======================================================================
+        log = self.logger.getChild('run_chunks')
+        if chunk_size is None: chunk_size=self.chunk_size
+        cid, bid = self.cid, self.bid
+        
+        assert isinstance(chunk_size, int) and chunk_size>0, 'bad chunk_size: %s'%chunk_size
+        assert not self.attriMode, 'attribution not supported on chunked runs'
+        if self.chunk_size is None:
+            log.warning('expanded finv was built by prep_model()... init with chunk_size to avoid this')
+        
+        #full data (restored at the end)
+        fdf_full = self.data_d['finv']
+        wdf_full = self.data_d['expos']
+        
+        cid_ar = fdf_full.index.values
+        cnt = int(np.ceil(len(cid_ar)/chunk_size))
+        
+        log.info('on %i assets in %i blocks of %i'%(len(cid_ar), cnt, chunk_size))
+        self.feedback.upd_prog(10, method='raw')
         
         #=======================================================================
-        # wrap----
+        # loop on each block------
         #=======================================================================
+        fp_d, cols_d = dict(), dict() #output filepaths, column order
+        smry_d = None
+        bcnt = 0 #running count of expanded assets (for global bids)
+        
+        try:
+            for i, start in enumerate(range(0, len(cid_ar), chunk_size)):
+                log.debug('block %i/%i'%(i+1, cnt))
+                #===============================================================
+                # expand this block
+                #===============================================================
+                cids = cid_ar[start:start+chunk_size]
+                self.data_d['finv'] = fdf_full.loc[cids, :]
+                self.data_d['expos'] = wdf_full.loc[wdf_full.index.isin(cids), :]
+                
+                self.build_exp_finv()
+                
+                #offset the bids
+                self.bdf.index = self.bdf.index + bcnt
+                self.bdf.index.name = bid
+                self.bdf[bid] = self.bdf.index
+                
+                self.build_depths()
+                
+                #===============================================================
+                # impacts
+                #===============================================================
+                _, cres_df = self._run_stages(upd_prog=False, logger=log)
+                
+                #===============================================================
+                # write
+                #===============================================================
+                if i==0:
+                    fp_d['cdmg'] = self._get_chunk_fp('dmgs_%s_%s'%(self.name, self.tag))
+                    cols_d['cdmg'] = self.events_df.index.tolist()
+                    
+                    if write_bdmg:
+                        """named w/ the expanded asset count (like output_bdmg()) once its known"""
+                        fp_d['bdmg'] = self._get_chunk_fp('dmgs_expnd_%s_%s_%i_%i_partial'%(
+                            self.name, self.tag, len(self.events_df), len(cid_ar)))
+                        
+                self._append_chunk(cres_df, fp_d, cols_d, 'cdmg', first=i==0)
+                
+                if write_bdmg:
+                    self._append_chunk(self._get_bdmg_out(), fp_d, cols_d, 'bdmg', first=i==0)
+                
+                #===============================================================
+                # accumulate summaries
+                #===============================================================
+                ttl_ser1 = cres_df.sum()
+                ttl_ser = ttl_ser1 if i==0 else ttl_ser.add(ttl_ser1, fill_value=0)
+                
+                if write_smry:
+                    d = self._get_bdmg_smry(self.res_df, logger=log)
+                    if smry_d is None:
+                        smry_d = d
+                    else:
+                        smry_d = {k:v.add(d[k], fill_value=0) for k,v in smry_d.items()}
+                
+                #===============================================================
+                # wrap block
+                #===============================================================
+                bcnt += len(self.bdf)
+                
+                self.feedback.upd_prog(10+70*(i+1)/cnt, method='raw')
+                
+        finally:
+            self.data_d['finv'] = fdf_full
+            self.data_d['expos'] = wdf_full
+        
         #=======================================================================
-        # get labels
+        # wrap----
         #=======================================================================
+        self.out_fp = fp_d['cdmg'] #for update_cf()
+        
+        if write_bdmg:
+            ofp = self._get_chunk_fp('dmgs_expnd_%s_%s_%i_%i'%(
+                self.name, self.tag, len(self.events_df), bcnt))
+            os.replace(fp_d['bdmg'], ofp)
+            fp_d['bdmg'] = ofp
+            log.info('wrote expanded impacts to \n    %s'%ofp)
+        
         if set_impactUnits:
-            """
-            if user wants to use the value in the c ontrol file.. pass set_impactUnits=False
-            otherwise we attempt to read from control file
+            self._set_impactUnits(logger=log)
+        
+        if write_smry:
+            smry_d['cap_cnts'] = smry_d['cap_cnts'].astype(int)
+            self.bdmg_smry(smry_d=smry_d, bcnt=bcnt, logger=log)
             
-            both should default to the modcom.Model.impact_units=impacts
-            """
-            try:
-                dFunc_iu = self.get_DF_att(attn='impact_units')
-                if not dFunc_iu == '' or dFunc_iu is None:
-                    self.impact_units = dFunc_iu
-            except Exception as e:
-                log.warning('failed to set \'impact_units\' w/ %s'%e)
-                
-        #for plotting
         #=======================================================================
         # report
         #=======================================================================
-        log.debug('maxes:\n%s'%(
-            cres_df.max()))
-        
-        log.info('finished w/ %s and TtlDmg = %.2f'%(
-            str(cres_df.shape), cres_df.sum().sum()))
+        self.mem_peak = self._get_mem_peak()
+        log.info('finished %i blocks (%i expanded assets) w/ TtlDmg = %.2f and peak memory = %.2f MB \n    %s'%(
+            cnt, bcnt, ttl_ser.sum(), self.mem_peak/(1024**2), self.out_fp))
         
         self.feedback.upd_prog(80, method='raw')
         
-        return cres_df
+        return ttl_ser.loc[cols_d['cdmg']]
     
-
+    @staticmethod
+    def _get_mem_peak(): #peak resident memory of this process (bytes)
+        """
+        OS high-water mark (includes the expansion and stages within each block)
+            for the life of the process (not just this run)
+        """
+        try:
+            import resource #posix only
+        except ImportError:
+            import psutil
+            return psutil.Process(os.getpid()).memory_info().peak_wset #windows
+        
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        
+        if sys.platform=='darwin':
+            return maxrss #bytes
+        return maxrss*1024 #kilobytes
+    
+    def _get_chunk_fp(self, #get an output filepath for streaming
+                      ofn,
+                      ):
+        
+        out_fp = os.path.join(self.out_dir, ofn+'.csv')
+        
+        if os.path.exists(out_fp):
+            self.logger.warning('file exists \n    %s'%out_fp)
+            if not self.overwrite:
+                raise Error('file already exists')
+            
+        unlink_shared(out_fp) #blocks are appended... never through a link
+            
+        return out_fp
+    
+    def _append_chunk(self, #write a block of results to file
+                      df, 
+                      fp_d, #{key: output filepath}
+                      cols_d, #{key: column order}. set from the first block
+                      key,
+                      first=False,
+                      ):
+        
+        if first:
+            if not key in cols_d: cols_d[key] = df.columns.tolist()
+            
+        assert set(df.columns)==set(cols_d[key]), 'column mismatch on \'%s\''%key
+        
+        df.loc[:, cols_d[key]].to_csv(fp_d[key], mode='w' if first else 'a',
+                                      header=first, index=True)
+        
     def bdmg_raw(self, #get damages on expanded finv
              
             bdf = None, #expanded finv. see modcom.build_exp_finv(). each row has 1 ftag
             ddf = None,  #expanded exposure set. depth at each bid. see build_depths() or get_mitid()
+            engine=None, #how to evaluate the dfuncs
+                #vect: one array interpolation per dfunc (fast)
+                #loop: unique depths per dfunc, mapped back with replace (legacy)
+                #check: run both and compare the results
             ):
         #======================================================================
         # defaults
@@ -351,6 +627,7 @@ class Dmg2(Model, DFunc, Plotr):
         #defaults
         if ddf is None: ddf = self.ddf
         if bdf is None: bdf = self.bdf
+        if engine is None: engine=self.bdmg_engine
   
 
         """ddf is appending _1 to column names"""
@@ -422,16 +699,106 @@ class Dmg2(Model, DFunc, Plotr):
 
         
         #======================================================================
-        # RAW: loop and calc raw damage by ftag-------------
+        # RAW: calc raw damage by ftag-------------
         #======================================================================
-
+        if engine=='vect':
+            res_df = self._bdmg_raw_vect(edf, dep_booldf, bdf['ftag'])
+        elif engine=='loop':
+            res_df = self._bdmg_raw_loop(edf, dep_booldf, bdf['ftag'])
+        elif engine=='check':
+            res_df = self._bdmg_raw_vect(edf, dep_booldf, bdf['ftag'])
+            chk_df = self._bdmg_raw_loop(edf, dep_booldf, bdf['ftag'])
+            
+            """comparing the arrays (nulls in the same place are equal)"""
+            if not np.array_equal(res_df.values, chk_df.values, equal_nan=True):
+                bx = np.invert(np.logical_or(res_df.values==chk_df.values, 
+                            np.logical_and(res_df.isna().values, chk_df.isna().values)))
+                raise Error('vect and loop engines disagree on %i (of %i) entries'%(
+                    bx.sum(), bx.size))
+            
+            log.info('vect and loop engines match on %s'%str(res_df.shape))
+        else:
+            raise Error('unrecognized bdmg_engine: \'%s\''%engine)
+            
+        #=======================================================================
+        # wrap-------
+        #=======================================================================
+        log = self.logger.getChild('bdmg')
+        assert not res_df is None, 'failed to get any valid entries'
+        res_df.columns = ['%s_raw'%e for e in res_df.columns] #add the suffix
+        
+        #attach
+        self.res_df = res_df
+        
+        
+        
+        log.info('got raw impacts for %i dfuncs and %i events: \n    %s'%(
+            len(self.dfuncs_d),dboolcol.sum(), self._rdf_smry('_raw')))
+        
+        return res_df
+    
+    def _bdmg_raw_vect(self, #raw impacts w/ one interpolation per dfunc
+                       edf, #depths (bid:event)
+                       dep_booldf, #True=depth is valid
+                       ftag_ser, #ftag for each bid
+                       ):
+        """
+        evaluating all the valid depths of each ftag w/ a single call to np.interp
+            results are identical to the scalar calls in _bdmg_raw_loop()
+        """
+        log = self.logger.getChild('bdmg.vect')
+        
+        #=======================================================================
+        # prep
+        #=======================================================================
+        assert len(ftag_ser)==len(edf)
+        dep_ar = edf.values.astype(float)
+        dbx_ar = dep_booldf.values
+        res_ar = np.full(dep_ar.shape, np.nan)
+        
+        #row locations of each ftag {ftag: positional index array}
+        tagLoc_d = pd.Series(np.arange(len(ftag_ser))).groupby(ftag_ser.values).indices
+        
+        #=======================================================================
+        # loop on dfuncs
+        #=======================================================================
+        cnt=0
+        for indxr, (ftag, dfunc) in enumerate(self.dfuncs_d.items()):
+            if not ftag in tagLoc_d: continue
+            locs = tagLoc_d[ftag]
+            
+            #valid entries for this tag
+            bx = dbx_ar[locs]
+            if not bx.any():
+                log.debug('\'%s\' no valid entries!'%ftag)
+                continue
+            
+            #evaluate the curve
+            rsub_ar = np.full(bx.shape, np.nan)
+            rsub_ar[bx] = dfunc.get_dmg(dep_ar[locs][bx])
+            res_ar[locs] = rsub_ar
+            
+            log.debug('(%i/%i) calculated \'%s\' on %i entries for %i un-nested assets'%(
+                indxr+1, len(self.dfuncs_d), ftag, bx.sum(), bx.any(axis=1).sum()))
+            cnt+=1
+            
+        assert cnt>0, 'failed to get any valid entries'
+        
+        return pd.DataFrame(res_ar, index=edf.index, columns=edf.columns)
+    
+    def _bdmg_raw_loop(self, #raw impacts w/ scalar calls on each unique depth
+                       edf, #depths (bid:event)
+                       dep_booldf, #True=depth is valid
+                       ftag_ser, #ftag for each bid
+                       ):
+        
         res_df = None
         
         for indxr, (ftag, dfunc) in enumerate(self.dfuncs_d.items()):
             log = self.logger.getChild('bdmg.%s'%ftag)
                        
             #entries matching this tag
-            tag_booldf = pd.DataFrame(np.tile(bdf['ftag']==ftag, (len(dep_booldf.columns),1)).T,
+            tag_booldf = pd.DataFrame(np.tile(ftag_ser==ftag, (len(dep_booldf.columns),1)).T,
                                    index=dep_booldf.index, columns=dep_booldf.columns)
             
             booldf = np.logical_and(
@@ -480,23 +847,6 @@ class Dmg2(Model, DFunc, Plotr):
             else:
                 res_df.update(ri_df, overwrite=False, errors='raise')
                 
-            
-         
-        #=======================================================================
-        # wrap-------
-        #=======================================================================
-        log = self.logger.getChild('bdmg')
-        assert not res_df is None, 'failed to get any valid entries'
-        res_df.columns = ['%s_raw'%e for e in res_df.columns] #add the suffix
-        
-        #attach
-        self.res_df = res_df
-        
-        
-        
-        log.info('got raw impacts for %i dfuncs and %i events: \n    %s'%(
-            len(self.dfuncs_d),dboolcol.sum(), self._rdf_smry('_raw')))
-        
         return res_df
     
     def bdmg_scaled(self,
@@ -517,23 +867,15 @@ class Dmg2(Model, DFunc, Plotr):
         view(events_df)
         view(res_df)
         """
-        for event, e_ser in events_df.iterrows():
-
-            #find this raw damage column
-            boolcol =  res_df.columns == e_ser['raw']
-            
-            #check it
-            if not boolcol.sum() == 1:
-                raise Error('\'%s\' got bad match count'%event)
+        raw_ar = self._get_colg_ar(res_df, 'raw')
+        
+        for event in events_df.index[np.isnan(raw_ar).all(axis=0)]:
+            log.warning('%s got all nulls!'%event)
             
-            if res_df.loc[:, boolcol].isna().all().iloc[0]:
-                log.warning('%s got all nulls!'%event)
-
-            #calc and set the scalecd values
-            try:
-                res_df[e_ser['scaled']] = res_df.loc[:, boolcol].multiply(bdf['fscale'], axis=0)
-            except Exception as e:
-                raise Error('failed w/ \n    %s'%e)
+        #calc and set the scaled values (bid x event)
+        assert np.array_equal(res_df.index, bdf.index), 'index mismatch'
+        res_df = self._set_colg_ar(res_df, 
+                           raw_ar*bdf['fscale'].values.astype(float).reshape(-1,1), 'scaled')
                 
         #=======================================================================
         # wrap
@@ -565,44 +907,41 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # start meta
         #=======================================================================
-        meta_d = dict()
         cmeta_df =bdf.loc[:,bdf.columns.isin([cid, bid, 'ftag', 'fcap', 'fscale', 'nestID'])]
 
         #=======================================================================
-        # #loop and add scaled damages
+        # #cap the scaled damages
         #=======================================================================
-
-        for event, e_ser in events_df.iterrows():
-            
-            #join scaled values and cap values for easy comparison
-            if 'fcap' in bdf.columns:
-                sc_df = res_df[e_ser['scaled']].to_frame().join(bdf['fcap'])
-            else:
-                sc_df = res_df[e_ser['scaled']].to_frame()
-            
-            #identify nulls
-            boolidx = res_df[e_ser['scaled']].notna()
+        sc_ar = self._get_colg_ar(res_df, 'scaled')
+        
+        #identify nulls
+        notna_ar = np.invert(np.isnan(sc_ar))
+        
+        if 'fcap' in bdf.columns:
+            assert np.array_equal(res_df.index, bdf.index), 'index mismatch'
+            fcap_ar = bdf['fcap'].values.astype(float).reshape(-1,1)
             
-            #calc and set the scalecd values
-            """this will ignore any null fcap values when determining theminimum"""
-            res_df.loc[boolidx, e_ser['capped']] = sc_df[boolidx].min(axis=1, skipna=True)
+            """fmin ignores any null fcap values when determining the minimum"""
+            cap_ar = np.where(notna_ar, np.fmin(sc_ar, fcap_ar), np.nan)
             
- 
-            #===================================================================
-            # #meta
-            #===================================================================
+            #where the scaled values were capped (null where the scaled values are)
+            mdf = pd.DataFrame(sc_ar>fcap_ar, index=res_df.index, columns=events_df.index
+                               ).where(notna_ar)
+        else:
+            cap_ar = sc_ar.copy()
             
-            #where the scaled values were capped
-            if 'fcap' in bdf.columns:
-                mser = res_df.loc[boolidx, e_ser['scaled']] >bdf.loc[boolidx, 'fcap'] 
-            else:
-                #all FALSE
-                mser = pd.Series(index=cmeta_df.index, dtype=bool)
-                
-            cmeta_df= cmeta_df.join(mser.rename(event), how='left')
+            #all FALSE
+            mdf = pd.DataFrame(False, index=res_df.index, columns=events_df.index)
             
-            #totals
-            meta_d[event] = mser.sum()
+        res_df = self._set_colg_ar(res_df, cap_ar, 'capped')
+        
+        #=======================================================================
+        # #meta
+        #=======================================================================
+        cmeta_df = cmeta_df.join(mdf, how='left')
+        
+        #totals
+        meta_d = mdf.fillna(False).astype(bool).sum(axis=0).to_dict()
                 
         #=======================================================================
         # wrap
@@ -649,34 +988,32 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # setup results
         #=======================================================================
-        events_df, rdf_raw = self._mi_resSetup(res_df, mcoln, res_colg)
+        events_df, raw_ar = self._mi_resSetup(res_df, mcoln, res_colg)
 
         #=======================================================================
-        # retrieve expanded threshold data
+        # retrieve threshold data
         #=======================================================================
-        ddf, dt_df = self._get_fexpnd(mcoln)
+        dep_ar, dt_ar = self._get_fexpnd_ar(mcoln, index=res_df.index)
 
         
         #=======================================================================
         # apply threshold
         #=======================================================================
         
-        #find those meeting the threshold
-        booldf = ddf >=dt_df
+        #find those meeting the threshold (nulls are False)
+        bool_ar = dep_ar >=dt_ar
         
         #raw results, with those not meeting the threshold as 0
-        rdf = rdf_raw.where(booldf, other=0.0)
-        
-        #retireve the nulls
         """
         user 0.0 as the threshold force.. but preserving nulls
         """
-        rdf = rdf.where(rdf_raw.notna(), other=np.nan)
+        ar = np.where(bool_ar, raw_ar, 0.0)
+        ar[np.isnan(raw_ar)] = np.nan
         
         #=======================================================================
         # wrap
         #=======================================================================
-        return self._mi_wrap(rdf, events_df, mcoln, booldf, log)
+        return self._mi_wrap(ar, events_df, mcoln, bool_ar, log)
     
 
         
@@ -713,13 +1050,13 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # setup results
         #=======================================================================
-        events_df, rdf_raw = self._mi_resSetup(res_df, mcoln, res_colg)
+        events_df, raw_ar = self._mi_resSetup(res_df, mcoln, res_colg)
         
         
         #=======================================================================
         # retrieve data
         #=======================================================================
-        ddf, dt_df = self._get_fexpnd(self.miUtcn,logger=log)
+        dep_ar, dt_ar = self._get_fexpnd_ar(self.miUtcn, index=res_df.index, logger=log)
         
         #get scale data
         
@@ -728,25 +1065,20 @@ class Dmg2(Model, DFunc, Plotr):
         # apply scales to threshold
         #=======================================================================
         #find those we want to apply teh scale to
-        booldf = np.logical_and(
-            ddf<=dt_df, #exposure less than threshold
-            np.logical_and( #nether set is null
-                ddf.notna(),
-                dt_df.notna())
-                )
+        """exposure less than threshold (False where either set is null)"""
+        bool_ar = dep_ar<=dt_ar
         
-        if not booldf.any().any():
+        if not bool_ar.any():
             log.warning('got no entries to apply %s to!'%mcoln)
             return res_df, res_colg
         
         #get scaled results
-        scale_ser = bdf[mcoln].fillna(1.0) #replace nulls
-        rdf_S = rdf_raw.multiply(scale_ser, axis=0)
+        scale_ar = bdf[mcoln].fillna(1.0).values.astype(float).reshape(-1,1) #replace nulls
         
         #take scaled where selected... otherwise use the raw
-        rdf = rdf_S.where(booldf, other=rdf_raw)
+        ar = np.where(bool_ar, raw_ar*scale_ar, raw_ar)
         
-        return self._mi_wrap(rdf, events_df, mcoln, booldf, log)
+        return self._mi_wrap(ar, events_df, mcoln, bool_ar, log)
         
         
 
@@ -782,13 +1114,13 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # setup results
         #=======================================================================
-        events_df, rdf_raw = self._mi_resSetup(res_df, mcoln, res_colg)
+        events_df, raw_ar = self._mi_resSetup(res_df, mcoln, res_colg)
         
         
         #=======================================================================
         # retrieve data
         #=======================================================================
-        ddf, dt_df = self._get_fexpnd(self.miUtcn,logger=log)
+        dep_ar, dt_ar = self._get_fexpnd_ar(self.miUtcn, index=res_df.index, logger=log)
         
         #get scale data
         
@@ -797,28 +1129,50 @@ class Dmg2(Model, DFunc, Plotr):
         # apply scales to threshold
         #=======================================================================
         #find those we want to apply teh scale to
-        booldf = np.logical_and(
-            ddf<=dt_df, #exposure less than threshold
-            np.logical_and( #nether set is null
-                ddf.notna(),
-                dt_df.notna())
-                )
+        """exposure less than threshold (False where either set is null)"""
+        bool_ar = dep_ar<=dt_ar
         
-        if not booldf.any().any():
+        if not bool_ar.any():
             log.warning('got no entries to apply %s to!'%mcoln)
             return res_df, res_colg
         
         #get scaled results
-        mser = bdf[mcoln].fillna(0) #replace nulls
-        rdf_S = rdf_raw.add(mser, axis=0)
+        mval_ar = bdf[mcoln].fillna(0).values.astype(float).reshape(-1,1) #replace nulls
         
         #take new where selected... otherwise use the raw
-        rdf = rdf_S.where(booldf, other=rdf_raw)
+        ar = np.where(bool_ar, raw_ar+mval_ar, raw_ar)
         
-        return self._mi_wrap(rdf, events_df, mcoln, booldf, log)
+        return self._mi_wrap(ar, events_df, mcoln, bool_ar, log)
     
 
 
+    def _get_colg_ar(self, #get the results of one column group as a (bid x event) array
+                     res_df,
+                     colg, #column group (see events_df)
+                     ):
+        coln_l = self.events_df[colg].tolist()
+        
+        miss_l = set(coln_l).difference(res_df.columns)
+        assert len(miss_l)==0, 'missing results columns: %s'%miss_l
+        
+        df = res_df.loc[:, coln_l]
+        if not df.shape[1]==len(coln_l):
+            raise Error('\'%s\' got bad match count'%colg)
+        
+        return df.values.astype(float)
+    
+    def _set_colg_ar(self, #add the (bid x event) array of one column group onto the results
+                     res_df,
+                     ar,
+                     colg, #column group (see events_df)
+                     ):
+        """the wide res_df is just the output view... each stage adds its block once"""
+        assert ar.shape==(len(res_df), len(self.events_df)), colg
+        
+        df = pd.DataFrame(ar, index=res_df.index, columns=self.events_df[colg].values)
+        
+        return pd.concat([res_df.drop(df.columns, axis=1, errors='ignore'), df], axis=1)
+        
     def _rdf_smry(self, #get a summary string of the bid results data
                           
                           sfx,
@@ -846,37 +1200,37 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         #check the results data
         assert res_colg in events_df.columns
-        miss_l = set(events_df[res_colg].values).difference(res_df.columns)
-        assert len(miss_l)==0, 'missing results columns: %s'%miss_l
         
         #=======================================================================
         # setup data
         #=======================================================================
-        events_df[mcoln] = events_df.index + '_%s'%mcoln #update events metadata
+        #predecessor results (bid x event)
+        raw_ar = self._get_colg_ar(res_df, res_colg)
         
-        #raw results with names matching the events 
-        rdf_raw = res_df.loc[:, events_df[res_colg]].rename(
-            columns={v:k for k,v in events_df[res_colg].to_dict().items()})
+        events_df[mcoln] = events_df.index + '_%s'%mcoln #update events metadata
         
-        return events_df, rdf_raw
+        return events_df, raw_ar
     
     def _mi_wrap(self, #wrapper function for mitigation series 
-                 rdf, events_df, mcoln, booldf, log):
+                 ar, #mitigated results (bid x event)
+                 events_df, mcoln, 
+                 bool_ar, #entries the mitigation was applied to (bid x event)
+                 log):
         
 
-        #join these back onto the main results (and rename columns)
-        self.res_df = self.res_df.join(rdf.rename(
-            columns=events_df[mcoln].to_dict())) 
+        #add these onto the main results
+        self.res_df = self._set_colg_ar(self.res_df, ar, mcoln)
 
         self.res_colg=mcoln #set for next
         
         
-        self.mi_meta_d[mcoln] = pd.Series(booldf.sum(axis=0), name='miti_hit_cnt')
+        cnt_ser = pd.Series(bool_ar.sum(axis=0), index=events_df.index, name='miti_hit_cnt')
+        self.mi_meta_d[mcoln] = cnt_ser
         #=======================================================================
         # report
         #=======================================================================
         log.info('got %i (of %i) below \'%s\': \n    %s \n    %s'%(
-            booldf.sum().sum(), booldf.size, mcoln, booldf.sum(axis=0).to_dict(),
+            cnt_ser.sum(), bool_ar.size, mcoln, cnt_ser.to_dict(),
             self._rdf_smry(mcoln)))
 
         return self.res_df, mcoln
@@ -903,9 +1257,8 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # duplicate onto cleaned columns and fill nulls
         #=======================================================================
-        for event, e_ser in self.events_df.iterrows():
-            boolcol = res_df.columns == e_ser[res_colg]
-            res_df[e_ser['dmg']] = res_df.loc[:, boolcol].fillna(0)
+        ar = self._get_colg_ar(res_df, res_colg)
+        res_df = self._set_colg_ar(res_df, np.where(np.isnan(ar), 0.0, ar), 'dmg')
             
       
         
@@ -987,7 +1340,8 @@ class Dmg2(Model, DFunc, Plotr):
                   cmeta_df=None, #cap by asset
                   gCn = 'ftag', #column name to group on
                   
-                  
+                  smry_d=None, #pre-built summary tabs (e.g., accumulated by run_chunks())
+                  bcnt=None, #count of expanded assets (for the filename)
                   logger=None,
                   
                   ):
@@ -995,15 +1349,65 @@ class Dmg2(Model, DFunc, Plotr):
         #=======================================================================
         # defaults
         #=======================================================================
-        if res_df_raw is None: res_df_raw=self.res_df.copy()
+        if logger is None: logger=self.logger
+        log=logger.getChild('bdmg_smry')
+        
+        #=======================================================================
+        # build the tabs
+        #=======================================================================
+        if smry_d is None:
+            if res_df_raw is None: res_df_raw=self.res_df.copy()
+            if cmeta_df is None: cmeta_df=self.cmeta_df
+            
+            smry_d = {**self._get_bdmg_smry(res_df_raw, events_df=events_df, cmeta_df=cmeta_df,
+                                            gCn=gCn, logger=log),
+                      'cap_data':cmeta_df.fillna(False)}
+            
+            if bcnt is None: bcnt = len(res_df_raw)
+            
+        assert isinstance(bcnt, int)
+        
+        #=======================================================================
+        # write results
+        #=======================================================================
+        out_fp = os.path.join(self.out_dir, 'dmg2_smry_%s_%s_%i.xls'%(self.tag, gCn, bcnt))
+        
+        d = {k:(v.round(self.prec) if k=='_smry' else v) for k,v in smry_d.items()}
+   
+        with pd.ExcelWriter(out_fp) as writer:
+            for tabnm, df in d.items():
+                assert isinstance(df, pd.DataFrame), tabnm
+                try:
+                    df.to_excel(writer, sheet_name=tabnm, index=True, header=True)
+                except Exception as e:
+                    log.error('failed to write tab \'%s\' w/ \n    %s'%(tabnm, e))
+        
+        log.info('wrote %i tabs to \n    %s'%(len(d), out_fp))
+
+        
+        return d
+    
+    def _get_bdmg_smry(self, #additive summary tabs (grouped totals and counts)
+                  res_df_raw, #built results (by bid)
+                  events_df=None,  #event name matrix
+                  cmeta_df=None, #cap by asset
+                  gCn = 'ftag', #column name to group on
+                  logger=None,
+                  ):
+        """
+        all tabs are sums or counts, so the summaries of separate asset blocks
+            can be combined with df.add(fill_value=0) (see run_chunks())
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
         if events_df is None: events_df=self.events_df
         if cmeta_df is None: cmeta_df=self.cmeta_df
         if logger is None: logger=self.logger
         
         bdf = self.bdf
-        #cid = self.cid
         
-        log=logger.getChild('bdmg_smry')
+        log=logger.getChild('_get_bdmg_smry')
         
 
         #=======================================================================
@@ -1071,32 +1475,9 @@ class Dmg2(Model, DFunc, Plotr):
             else:
                 p_df = p_df.append(rdf1)
 
-        #=======================================================================
-        # write results
-        #=======================================================================
-        
-        out_fp = os.path.join(self.out_dir, 'dmg2_smry_%s_%s_%i.xls'%(self.tag, gCn, len(res_df)))
-        
-        d = {
-            '_smry':p_df.round(self.prec),
-            **res_d, 
-             'cap_cnts':cm_df1, 
-             'cap_data':cmeta_df.fillna(False),
-             
-             }
-   
-        with pd.ExcelWriter(out_fp) as writer:
-            for tabnm, df in d.items():
-                assert isinstance(df, pd.DataFrame), tabnm
-                try:
-                    df.to_excel(writer, sheet_name=tabnm, index=True, header=True)
-                except Exception as e:
-                    log.error('failed to write tab \'%s\' w/ \n    %s'%(tabnm, e))
-        
-        log.info('wrote %i tabs to \n    %s'%(len(d), out_fp))
-
+        log.debug('got %i result types on %i assets'%(len(res_d), len(res_df)))
         
-        return d
+        return {'_smry':p_df, **res_d, 'cap_cnts':cm_df1}
     
     def bdmg_pies(self, #generate pie charts of the damage summaries
                   df_raw, #generate a pie chart for each column
@@ -1291,6 +1672,17 @@ class Dmg2(Model, DFunc, Plotr):
         miss_l = set(cres_df.columns).difference(bdf.columns)
         assert len(miss_l)==0, 'event rastesr mismatch'
 
+        #=======================================================================
+        # compact----
+        #=======================================================================
+        if self.attriCompact:
+            """same values as below w/o the dense pivot (and its copies)"""
+            atr_am = AttriMat.from_nested(bdf, cres_df, cid=cid, grpColn=grpColn)
+            atr_am = self._attriM_nulls(cres_df, atr_am, logger=log)
+            
+            self.att_df = atr_am
+            log.info('finished w/ %s'%atr_am)
+            return atr_am
         
         #=======================================================================
         # get pivot
@@ -1475,15 +1867,17 @@ class Dmg2(Model, DFunc, Plotr):
         view(self.res_df)
         
         """
-        #get just the useful stuff off the expanded finv
-        l = set(self.bdf.columns).difference(self.res_df.columns)
+        return self.output_df(self._get_bdmg_out(), ofn, write_index=True)
+    
+    def _get_bdmg_out(self): #expanded results w/ the useful stuff off the expanded finv
+        l = [c for c in self.bdf.columns if not c in self.res_df.columns]
         bdf1 = self.bdf.loc[:, l]
         bdf1.index.name = None
                              
         rdf = self.res_df.drop(self.bid, axis=1).join(bdf1)
         rdf.index.name = self.bid
-            
-        return self.output_df(rdf, ofn, write_index=True)
+        
+        return rdf
     
     def output_depths_df(self,
                          ofn = None):
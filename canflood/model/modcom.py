@@ -11,7 +11,7 @@ Created on Feb. 9, 2020
 # imports------------
 #==============================================================================
 
-import configparser, os, inspect, logging, copy, datetime
+import configparser, os, inspect, logging, copy, datetime, hashlib, json
 import pandas as pd
 idx = pd.IndexSlice
 import numpy as np
@@ -27,7 +27,49 @@ mod_logger = logging.getLogger('common') #get the root logger
 from hlpr.exceptions import QError as Error
     
 from hlpr.basic import ComWrkr, view
+from hlpr.cache import file_hash
 
+#==============================================================================
+# functions-------------
+#==============================================================================
+def _copy_data(data): #copy loaded data (frames or {sheet name: frame})
+    if isinstance(data, dict):
+        return {k:v.copy() for k,v in data.items()}
+    return data.copy()
+
+def get_monot_ar( #flag the monotonic rows of a 2D array
+        ar,
+        increasing=True, #False: check for decreasing
+        ):
+    """same as df.apply(lambda x: x.is_monotonic_increasing, axis=1)
+        (non-strict. rows w/ any nulls are not monotonic)"""
+    ar = np.asarray(ar, dtype=float)
+    
+    if increasing:
+        bool_ar = ar[:, 1:] >= ar[:, :-1]
+    else:
+        bool_ar = ar[:, 1:] <= ar[:, :-1]
+        
+    return np.logical_and(bool_ar.all(axis=1), ~np.isnan(ar).any(axis=1))
+
+def get_multival_ar( #flag the rows of a 2D array w/ more than one unique value
+        ar,
+        dropna=True, #False: nulls count as a value
+        ):
+    """same as df.nunique(axis=1, dropna=dropna) > 1"""
+    ar = np.asarray(ar, dtype=float)
+    if ar.shape[1]==0:
+        return np.full(len(ar), False)
+    
+    #nulls are ignored by fmax/fmin
+    bool_ar = np.fmax.reduce(ar, axis=1) > np.fmin.reduce(ar, axis=1)
+    
+    if not dropna: #some nulls and some values
+        null_ar = np.isnan(ar)
+        bool_ar = np.logical_or(bool_ar, 
+                        np.logical_and(null_ar.any(axis=1), ~null_ar.all(axis=1)))
+        
+    return bool_ar
 
 #==============================================================================
 # class-----------
@@ -209,6 +251,9 @@ class Model(ComWrkr,
     miVcn = 'mi_iVal'
     miScn = 'mi_iScale'
     
+    chk_mode = 'full' #see _chk_sample()
+    chk_sample = int(1e4) #row count for chk_mode='sample'
+    
 
     def __init__(self,
                  cf_fp='', #control file path TODO: make this a kwarg
@@ -219,7 +264,10 @@ class Model(ComWrkr,
                  
                  base_dir =None, #for absolute_fp=False, base directory to use (defaults 
                  attriMode = False, #flow control for some attribution matrix functions
+                 attriCompact = False, #store attribution matrices as AttriMat (float32 w/ level codes)
                  upd_cf = True, #control ssome updating of control file writes
+                 data_store=None, #{key: parsed data} shared between workers. see load_df_ctrl()
+                 chk_mode='full', #thoroughness of the monotonicity checks. see _chk_sample()
                  
                  **kwargs):
         
@@ -251,7 +299,10 @@ class Model(ComWrkr,
         
         
         self.attriMode=attriMode
+        self.attriCompact=attriCompact
         self.upd_cf=upd_cf
+        self.data_store=data_store
+        self.chk_mode=chk_mode
 
 
         """moved to comWrkr
@@ -736,6 +787,14 @@ class Model(ComWrkr,
             #check it
             assert os.path.exists(fp), '\'%s\' got pad filepath: \n    %s'%(dtag, fp)
             
+            #check the shared store
+            if not self.data_store is None:
+                skey = (file_hash(fp), str(sorted(d.items())))
+                if skey in self.data_store:
+                    log.info('got \'%s\' from the data store'%dtag)
+                    self.raw_d[dtag] = _copy_data(self.data_store[skey])
+                    continue
+            
             #load by type
             ext = os.path.splitext(fp)[1]
             if ext == '.csv':
@@ -747,6 +806,9 @@ class Model(ComWrkr,
             else:
                 raise Error('unrecognized filetype: %s'%ext)
                 
+            if not self.data_store is None:
+                self.data_store[skey] = _copy_data(data) #keep an unmodified copy
+                
             self.raw_d[dtag] = data
             
             
@@ -1552,6 +1614,38 @@ class Model(ComWrkr,
             index = bdf[mcoln].index, columns= ddfc.columns)
         
         return ddfc, dt_df
+    
+    def _get_fexpnd_ar(self, #exposure and finv data as arrays for broadcasting
+                    mcoln, #finv column with threshol dinfo
+                    index=None, #expected bid order (e.g., of the results)
+                    ddf = None,
+                    bdf=None,
+                    logger=None,
+                    ):
+        """
+        like _get_fexpnd() but w/o tiling the finv data across the events
+        
+        returns
+            dep_ar: exposure (bid x event)
+            dt_ar: finv values (bid x 1)
+        """
+        if ddf is None: ddf = self.ddf
+        if bdf is None: bdf = self.bdf
+        
+        assert mcoln in bdf.columns
+        assert bdf.index.name == self.bid, 'bad index on expanded finv data'
+        assert np.array_equal(ddf.index, bdf.index), 'index mismatch on depth data'
+        if not index is None:
+            assert np.array_equal(index, bdf.index), 'index mismatch on results'
+        
+        #check the depth data
+        miss_l = set(self.events_df.index).difference(ddf.columns)
+        assert len(miss_l)==0, 'column mismatch on depth data: %s'%miss_l
+        
+        dep_ar = ddf.loc[:, self.events_df.index].values.astype(float)
+        dt_ar = bdf[mcoln].values.astype(float).reshape(-1,1)
+        
+        return dep_ar, dt_ar
         
         
         
@@ -1684,6 +1778,20 @@ class Model(ComWrkr,
         #=======================================================================
         if logger is None: logger=self.logger
         log=logger.getChild('_attriM_nulls')
+        
+        #=======================================================================
+        # compact
+        #=======================================================================
+        if isinstance(aRaw_dxcol, AttriMat):
+            miss_l = set(aRaw_dxcol.get_lvals(aRaw_dxcol.names[0])).symmetric_difference(idf.columns)
+            assert len(miss_l)==0, 'impacts and top level dont match'
+            
+            cnt_d = aRaw_dxcol.fill_nulls(idf)
+            log.debug('set %i full dmg=0 entries with equal attribution'%sum(cnt_d.values()))
+            
+            self.check_attrimat(atr_dxcol=aRaw_dxcol, logger=log)
+            return aRaw_dxcol
+        
         mdex = aRaw_dxcol.columns
         nameRank_d= {lvlName:i for i, lvlName in enumerate(mdex.names)}
         
@@ -1900,64 +2008,35 @@ class Model(ComWrkr,
         #======================================================================
         # identify offenders
         #======================================================================
-        boolidx1 = ~df.apply(lambda x: x.is_monotonic_decreasing, axis=1)
-        boolidx2 = df.nunique(axis=1, dropna=False) > 1
+        ar = df.values.astype(float)
         
-        """
-        212 in df[boolidx1].index
-        212 in df[boolidx2].index
-        
-        df.loc[[212, 1462],:].nunique(axis=1, dropna=False) >1
-        
-        """
         #get offenders (from 
-        boolidx = np.logical_and(
-            boolidx1, #NOT going left big to righ textreme
-            boolidx2, #more than 1 value per row
+        bool_ar = np.logical_and(
+            ~get_monot_ar(ar, increasing=False), #NOT going left big to righ textreme
+            get_multival_ar(ar, dropna=False), #more than 1 value per row
             )
         
-        if not boolidx.any():
+        if not bool_ar.any():
             raise Error('no offending entries!')
         
-        log.info('fixing %i (of %i) non-monos'%(boolidx.sum(), len(boolidx)))
+        log.info('fixing %i (of %i) non-monos'%(bool_ar.sum(), len(bool_ar)))
         
         #======================================================================
         # apply
         #======================================================================
-        def force_mo(ser):
-            #get first non-null
-            first = True
-            for indxr, val in ser[ser.notna().idxmax():].items():
-                if first:
-                    lval = val
-                    first=False
-                    continue
-                
-                if pd.isnull(val):
-                    ser.loc[indxr] = lval
-                elif val < lval:
-                    ser.loc[indxr] = lval
-                else:
-                    lval = val
-                    
-            #check
-            if not ser.dropna().is_monotonic_increasing:
-                raise Error('failed')
-            
-                    
-            return ser
-                
-
-                
-        #flip the column order (likely -> extreme)
-        df = df.sort_index(axis=1, ascending=False)
+        """
+        flip the column order (likely -> extreme) then take the running maximum
+            fmax skips nulls, so these take the preceding value (leading nulls are kept)
+        """
+        fix_ar = np.fmax.accumulate(ar[bool_ar, ::-1], axis=1)[:, ::-1]
         
-        #apply the forcing
-        res_df = df.copy()
-        res_df.loc[boolidx,:] = res_df[boolidx].apply(force_mo, axis=1)
+        #check
+        if not get_monot_ar(np.where(np.isnan(fix_ar), -np.inf, fix_ar), increasing=False).all():
+            raise Error('failed')
         
-        #flip columns back
-        res_df = res_df.sort_index(axis=1, ascending=True)
+        res_ar = ar.copy()
+        res_ar[bool_ar, :] = fix_ar
+        res_df = pd.DataFrame(res_ar, index=df.index, columns=df.columns)
         
         """
         212 in res_df[boolidx].index
@@ -2076,8 +2155,11 @@ class Model(ComWrkr,
         # sumLvl = atr_dxcol.columns.nlevels -2 #should always be the last rank/level
         #=======================================================================
         
-        #sum each of the grpColns nested under the rEventName        
-        bool_df = atr_dxcol.sum(axis=1, level=0, skipna=False).round(self.prec)==1.0
+        #sum each of the grpColns nested under the rEventName
+        if isinstance(atr_dxcol, AttriMat):
+            bool_df = atr_dxcol.sum_level().round(self.prec)==1.0
+        else:      
+            bool_df = atr_dxcol.sum(axis=1, level=0, skipna=False).round(self.prec)==1.0
         
         #=======================================================================
         # #drop all but the top level. identify null locations
@@ -2107,6 +2189,7 @@ class Model(ComWrkr,
                      df_raw, #event:asset like data. expectes columns as aep 
                      split_key = False, #optional key to split hazard columns with (for fail/noFail sets)
                      aep_ser=None, event_probs = 'aep', #optional kwargs for column conversion
+                     mode=None, #how thorough to be. see _chk_sample()
                      logger=None
                      ):
         """
@@ -2122,6 +2205,7 @@ class Model(ComWrkr,
         
         if logger is None: logger=self.logger
         if split_key is None: split_key = self.split_key
+        if mode is None: mode=self.chk_mode
         log = logger.getChild('check_monot')
         
         #======================================================================
@@ -2136,6 +2220,8 @@ class Model(ComWrkr,
                 df, d = self._conv_expo_aep(df_raw, aep_ser, event_probs=event_probs, logger=log)
             else:
                 df = df_raw.copy()
+                
+            df = self._chk_sample(df, mode=mode, logger=log)
             
             log.debug('on %s w/ cols: \n    %s'%(str(df.shape), df.columns.tolist()))
             #======================================================================
@@ -2158,26 +2244,25 @@ class Model(ComWrkr,
             #======================================================================
             # check
             #======================================================================
-            """
-                    #apply the ead func
-            df.loc[boolidx, 'ead'] = df.loc[boolidx, :].apply(
-                self._get_ev, axis=1, dx=dx)
-            """
-            def chk_func(ser):
-                return ser.is_monotonic_decreasing
-        
             #check for damage monotonicity (should go from left BIG/extreme to right small/likely
             """
             view(df)
             view(df[boolidx])
             """
+            ar = df.values.astype(float)
+            
             #get offenders (from 
-            boolidx = np.logical_and(
-                ~df.apply(chk_func, axis=1), #NOT going left big to righ textreme
-                df.nunique(axis=1) > 1, #only one value per row
-                )
+            boolidx = pd.Series(np.logical_and(
+                ~get_monot_ar(ar, increasing=False), #NOT going left big to righ textreme
+                get_multival_ar(ar), #only one value per row
+                ), index=df.index)
     
-            if boolidx.any():
+            if boolidx.any() and mode=='counts':
+                log.warning(' %i (of %i)  assets have non-monotonic-increasing damages'%(
+                        boolidx.sum(), len(boolidx)))
+                return False
+            
+            elif boolidx.any():
                 with pd.option_context(
                                 'display.max_rows', None, 
                                'display.max_columns', None,
@@ -2213,13 +2298,33 @@ class Model(ComWrkr,
             
         return result
     
+    def _chk_sample(self, #select the rows to check
+                    df,
+                    mode='full', 
+                        #full: check all rows and log the offenders
+                        #counts: check all rows but only report the counts
+                        #sample: check (and log) a random sample of chk_sample rows
+                    logger=None,
+                    ):
+        
+        assert mode in ['full', 'counts', 'sample'], 'bad chk_mode: %s'%mode
+        
+        if mode=='sample' and len(df)>self.chk_sample:
+            logger.info('checking a sample of %i (of %i) rows'%(self.chk_sample, len(df)))
+            df = df.sample(n=self.chk_sample, random_state=1)
+            
+        return df
+    
     def check_eDmg(self, #check eap vs. impact like frames
                  df_raw,
                  dropna=True,
+                 mode=None, #how thorough to be. see _chk_sample()
                  logger=None):
         #=======================================================================
         # defaults
         #=======================================================================
+        if logger is None: logger = self.logger
+        if mode is None: mode=self.chk_mode
         log = logger.getChild('chk_eDmg')
         
         #=======================================================================
@@ -2239,6 +2344,8 @@ class Model(ComWrkr,
             assert df_raw.notna().all().all(), 'got some nulls when dropna=False'
             df = df_raw
             
+        df = self._chk_sample(df, mode=mode, logger=log)
+            
         #=======================================================================
         # check order
         #=======================================================================
@@ -2247,11 +2354,14 @@ class Model(ComWrkr,
         #=======================================================================
         # #check everything is positive
         #=======================================================================
-        booldf = df>=0
-        if not booldf.all().all():
-            log.debug('\n%s'%df[booldf])
+        ar = df.values.astype(float)
+        
+        bool_ar = ar>=0
+        if not bool_ar.all():
+            if not mode=='counts':
+                log.debug('\n%s'%df.where(bool_ar))
             log.warning('got %i (of %i) negative values... see logger'%(
-                np.invert(booldf).sum().sum(), booldf.size))
+                np.invert(bool_ar).sum(), bool_ar.size))
             return False
         
         #=======================================================================
@@ -2262,11 +2372,10 @@ class Model(ComWrkr,
         cboolidx.name='non-mono'
         view(df.join(cboolidx))
         """
-        cboolidx = np.invert(df.apply(lambda x: x.is_monotonic_increasing, axis=1))
+        cboolidx = np.invert(get_monot_ar(ar, increasing=True))
         if cboolidx.any():
-            if logger is None: logger = self.logger
-            
-            log.debug('\n%s'%df.loc[cboolidx, :])
+            if not mode=='counts':
+                log.debug('\n%s'%df.loc[cboolidx, :])
             log.warning(' %i (of %i)  assets have non-monotonic-increasing damages. see logger'%(
                 cboolidx.sum(), len(cboolidx)))
             
@@ -2430,11 +2539,16 @@ class Model(ComWrkr,
         # defaults
         #=======================================================================
         if upd_cf is None: upd_cf = self.upd_cf
+        
+        att_df = self.att_df
+        if isinstance(att_df, AttriMat):
+            att_df = att_df.to_dxcol()
+            
         if ofn is None:
-            ofn = 'attr%02d_%s_%s'%(self.att_df.columns.nlevels, self.name, self.tag)
+            ofn = 'attr%02d_%s_%s'%(att_df.columns.nlevels, self.name, self.tag)
         if dtag is None: dtag = self.attrdtag_out
             
-        out_fp = self.output_df(self.att_df, ofn, logger=logger)
+        out_fp = self.output_df(att_df, ofn, logger=logger)
         
         #update the control file
         if upd_cf:
@@ -2555,6 +2669,30 @@ class DFunc(ComWrkr, #damage function or DFunc handler
             log.error('curve failed check w/ \n    %s'%e)
         
 
+        pars_d, ddf1 = self._get_pars_dd(df_raw)
+        
+        #handle curve deviation
+        if not curve_deviation=='base':
+            assert curve_deviation in ddf1.columns.values, \
+                'requested curve_deviation \'%s\' not found on \'%s\''%(
+                    curve_deviation, self.tabn)
+                
+        #select deviation
+        if curve_deviation=='base':
+            ddcol = ddf1.columns[0] #taking first
+        else:
+            ddcol = curve_deviation
+            
+        return self.build_ar(self._get_dd_ar(ddf1, ddcol), pars_d, log)
+    
+    def _get_pars_dd(self, #split the raw tab into parameters and depth-damage data
+                     df_raw,
+                     ):
+        """
+        returns
+            pars_d: {parameter name: value}
+            ddf1: depth-damage data w/ a column for each curve deviation
+        """
         #slice and clean
  
         
@@ -2597,20 +2735,6 @@ class DFunc(ComWrkr, #damage function or DFunc handler
         assert pars_d['tag']==self.tabn, 'tag/tab mismatch (\'%s\', \'%s\')'%(
             pars_d['tag'], self.tabn)
         
-        #handle curve deviation
-        if not curve_deviation=='base':
-            assert curve_deviation in df.loc['exposure', :].values, \
-                'requested curve_deviation \'%s\' not found on \'%s\''%(
-                    curve_deviation, self.tabn)
-                
-         
-        
-        for varnm, val in pars_d.items():  #loop and store on instance
-            setattr(self, varnm, val)
-            
-        log.debug('attached %i parameters to Dfunc: \n    %s'%(len(pars_d), pars_d))
-        self.pars_d = pars_d.copy()
-        
         #======================================================================
         # extract depth-dmaage data
         #======================================================================
@@ -2623,13 +2747,14 @@ class DFunc(ComWrkr, #damage function or DFunc handler
         ddf1.columns = ddf1.loc[depthLoc_key]
         ddf1 = ddf1.drop(depthLoc_key)
         
+        return pars_d, ddf1
+    
+    def _get_dd_ar(self, #get the (sorted) depth-damage array for one deviation
+                   ddf1, #depth-damage data (see _get_pars_dd())
+                   ddcol, #deviation column
+                   ):
+        depthLoc_key='exposure'
         
-        #select deviation
-        if curve_deviation=='base':
-            ddcol = ddf1.columns[0] #taking first
-        else:
-            ddcol = curve_deviation
-            
         #reindex for this deviation
         ddf2 = ddf1.loc[:, ddcol].to_frame().reset_index().rename(columns={'index':depthLoc_key})
         
@@ -2644,7 +2769,24 @@ class DFunc(ComWrkr, #damage function or DFunc handler
         view(dd_df)
         """
         
-        ar = ddf2.sort_values(depthLoc_key).T.values
+        return ddf2.sort_values(depthLoc_key).T.values
+    
+    def build_ar(self, #build from parsed parameters and depth-damage array
+                 ar, #depth-damage array [[exposure], [impact]]
+                 pars_d, #parameters read from the tab
+                 logger,
+                 ):
+        """
+        called by build() and CurveLib.get_dfunc()
+        """
+        log=logger
+        
+        for varnm, val in pars_d.items():  #loop and store on instance
+            setattr(self, varnm, val)
+            
+        log.debug('attached %i parameters to Dfunc: \n    %s'%(len(pars_d), pars_d))
+        self.pars_d = pars_d.copy()
+        
         """NO! leave unsorted
         ar = np.sort(np.array([dd_df.iloc[:,0].tolist(), dd_df.iloc[:,1].tolist()]), axis=1)"""
         self.dd_ar = ar
@@ -2937,4 +3079,454 @@ class DFunc(ComWrkr, #damage function or DFunc handler
 
     
     
-    
\ No newline at end of file
+        
+    
+class CurveLib(ComWrkr): #compiled library of DFunc data
+    """
+    reading and parsing large curve workbooks (e.g., tools.vfunc_conv outputs) with
+        pd.read_excel and DFunc.build() can take longer than the damage calcs
+    
+    compiles the workbook once into the lib_dir (defaults to the out_dir):
+        <name>.cflib.npz
+            dd_ar: packed depth-damage data for every tag and deviation [[exposure], [impact]]
+        <name>.cflib.json
+            sig: workbook signature
+            index: (tag, deviation) offsets into dd_ar
+            pars_d: parameters of each tag (non-json values as text)
+            err_d: tabs which failed to parse {tag: msg} (raised when requested)
+            chk_d: tabs which failed check_cdf() {tag: msg}
+        
+    the compiled library is rebuilt whenever the size or modification time of the workbook changes
+    
+    DFuncs are then built from the arrays only when requested (see get_dfunc())
+    """
+    version = 2 #bump when the compiled format changes
+    ext = '.cflib'
+    
+    def __init__(self,
+                 curves_fp, #curves workbook (.xls)
+                 lib_dir=None, #directory for the compiled library (defaults to out_dir)
+                 **kwargs):
+        
+        super().__init__(**kwargs)
+        
+        assert os.path.exists(curves_fp), 'bad curves_fp: %s'%curves_fp
+        self.curves_fp = curves_fp
+        
+        if lib_dir is None: lib_dir=self.out_dir
+        if not os.path.exists(lib_dir):
+            os.makedirs(lib_dir)
+            
+        #name by the workbook path (so libraries of same-named workbooks dont collide)
+        fp = os.path.normcase(os.path.abspath(curves_fp))
+        self.lib_fp = os.path.join(lib_dir, '%s_%s%s'%(
+            os.path.splitext(os.path.basename(curves_fp))[0],
+            hashlib.sha1(fp.encode('utf-8')).hexdigest()[:8], self.ext))
+        
+    def get_sig(self): #signature of the source workbook
+        st = os.stat(self.curves_fp)
+        return [self.version, os.path.normcase(os.path.abspath(self.curves_fp)), st.st_size, st.st_mtime_ns]
+        
+    def load(self, #load the compiled library (compiling if stale)
+             df_d=None, #{tab name: raw curve data}. read from the workbook if not passed
+             logger=None,
+             ):
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('load')
+        
+        #=======================================================================
+        # from the compiled
+        #=======================================================================
+        if os.path.exists(self.lib_fp+'.json'):
+            try:
+                lib_d = self._read_lib()
+                assert lib_d['sig']==self.get_sig(), 'stale'
+            except Exception as e:
+                log.info('rebuilding compiled library (%s)'%e)
+                lib_d=None
+                
+            if not lib_d is None:
+                log.info('loaded %i curves from %s'%(len(lib_d['pars_d']), self.lib_fp))
+                self._set_lib(lib_d)
+                return self
+        
+        #=======================================================================
+        # compile
+        #=======================================================================
+        if df_d is None:
+            df_d = pd.read_excel(self.curves_fp, sheet_name=None, header=None, index_col=None)
+            
+        lib_d = self.compile(df_d, logger=log)
+        
+        try:
+            self._write_lib(lib_d)
+            log.info('wrote compiled library to %s'%self.lib_fp)
+        except Exception as e:
+            log.warning('failed to write compiled library w/ \n    %s'%e)
+            
+        self._set_lib(lib_d)
+        
+        return self
+    
+    def _write_lib(self, lib_d):
+        
+        with open(self.lib_fp+'.npz', 'wb') as f:
+            np.savez(f, dd_ar=lib_d['dd_ar'])
+        
+        def to_json(v): #parameter values from the workbook
+            if isinstance(v, np.generic):
+                return v.item()
+            return str(v)
+        
+        #written last (marks a complete library)
+        with open(self.lib_fp+'.json', 'w') as f:
+            json.dump({'sig':lib_d['sig'],
+                       'index':lib_d['index_df'].reset_index().to_dict(orient='records'),
+                       **{k:lib_d[k] for k in ['pars_d', 'err_d', 'chk_d']}}, 
+                      f, indent=1, default=to_json)
+            
+    def _read_lib(self):
+        
+        with open(self.lib_fp+'.json', 'r') as f:
+            lib_d = json.load(f)
+            
+        with np.load(self.lib_fp+'.npz', allow_pickle=False) as npz:
+            lib_d['dd_ar'] = npz['dd_ar']
+            
+        lib_d['index_df'] = pd.DataFrame(lib_d.pop('index'), columns=['tag', 'deviation', 'start', 'stop']
+                                         ).set_index(['tag', 'deviation'])
+        
+        return lib_d
+        
+    def _set_lib(self, lib_d):
+        self.dd_ar = lib_d['dd_ar']
+        self.index_df = lib_d['index_df']
+        self.pars_d = lib_d['pars_d']
+        self.err_d = lib_d['err_d']
+        self.chk_d = lib_d['chk_d']
+        
+    def compile(self, #parse all the tabs into packed arrays
+                df_d, #{tab name: raw curve data}
+                logger=None,
+                ):
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('compile')
+        
+        ar_l, index_l, pars_d, err_d, chk_d = list(), list(), dict(), dict(), dict()
+        cnt=0
+        for tabn, df in df_d.items():
+            if tabn.startswith('_'): continue
+            tabn = tabn.strip() #remove whitespace
+            
+            dfunc = DFunc(tabn, curves_fp=self.curves_fp, logger=self.logger)
+            try:
+                try:
+                    assert dfunc.check_cdf(df)
+                except Exception as e:
+                    chk_d[tabn] = str(e)
+                
+                pars_d[tabn], ddf1 = dfunc._get_pars_dd(df)
+                
+                #add each deviation
+                for i, ddcol in enumerate(ddf1.columns):
+                    ar = dfunc._get_dd_ar(ddf1, ddcol)
+                    
+                    for dev in (['base', ddcol] if i==0 else [ddcol]):
+                        index_l.append({'tag':tabn, 'deviation':dev, 'start':cnt, 'stop':cnt+ar.shape[1]})
+                        
+                    ar_l.append(ar)
+                    cnt+=ar.shape[1]
+                    
+            except Exception as e:
+                """only an error if this curve is requested"""
+                err_d[tabn] = str(e)
+                pars_d.pop(tabn, None)
+                
+        if len(err_d)>0:
+            log.warning('failed to parse %i tabs: %s'%(len(err_d), list(err_d.keys())))
+                
+        index_df = pd.DataFrame(index_l, columns=['tag', 'deviation', 'start', 'stop']
+                    ).drop_duplicates(subset=['tag', 'deviation']).set_index(['tag', 'deviation'])
+        
+        log.info('compiled %i curves (%i deviations) from %s'%(
+            len(pars_d), len(index_df), self.curves_fp))
+        
+        return {'sig':self.get_sig(), 
+                'dd_ar':np.concatenate(ar_l, axis=1) if len(ar_l)>0 else np.empty((2,0)),
+                'index_df':index_df, 'pars_d':pars_d, 'err_d':err_d, 'chk_d':chk_d}
+    
+    def get_dfunc(self, #build a DFunc from the compiled data
+                  tag,
+                  curve_deviation='base',
+                  logger=None,
+                  **kwargs): #passed to DFunc.__init__
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild(tag)
+        
+        if tag in self.err_d:
+            raise Error('failed to parse \'%s\' w/ \n    %s'%(tag, self.err_d[tag]))
+        
+        if tag in self.chk_d:
+            """letting this pass for backwards compatability"""
+            log.error('curve failed check w/ \n    %s'%self.chk_d[tag])
+            
+        assert (tag, curve_deviation) in self.index_df.index, \
+            'requested curve_deviation \'%s\' not found on \'%s\''%(curve_deviation, tag)
+            
+        start, stop = self.index_df.loc[(tag, curve_deviation), ['start', 'stop']]
+        
+        return DFunc(tag, curves_fp=self.curves_fp, curve_deviation=curve_deviation,
+                     logger=logger, **kwargs).build_ar(
+                         self.dd_ar[:, start:stop].copy(), self.pars_d[tag], log)
+    
+    
+class AttriMat(object): #compact attribution matrix
+    """
+    cid x (lvl0, lvl1, ...) attribution fractions w/o the dense MultiIndex frame
+        ar: float32 values (n_assets, n_columns)
+        lvl_d: one categorical per column level {lvlName: pd.Categorical(n_columns)}
+        
+    most entries are 0 or 1 (single nests), but zero-impact events get equal portions (see fill_nulls())
+        so values are kept dense (sparse storage wouldnt help these rows)
+        
+    built by dmg2.Dmg2.get_attribution() (from_nested) or from a loaded attrimat (from_dxcol)
+        converted back with to_dxcol() for writing
+    """
+    dtype = np.float32
+    
+    def __init__(self,
+                 ar, #attribution values (n_assets, n_columns)
+                 index, #asset index (cid)
+                 lvl_d, #{lvlName: pd.Categorical (n_columns)}. in level order
+                 ):
+        
+        assert isinstance(ar, np.ndarray)
+        assert ar.shape == (len(index), ar.shape[1])
+        for lvlName, cat in lvl_d.items():
+            assert isinstance(cat, pd.Categorical), lvlName
+            assert len(cat)==ar.shape[1], lvlName
+        
+        self.ar = ar
+        self.index = index
+        self.lvl_d = lvl_d
+        
+    @property
+    def names(self): #column level names
+        return list(self.lvl_d.keys())
+    
+    @property
+    def shape(self):
+        return self.ar.shape
+    
+    def __repr__(self):
+        return '%s %s on %s'%(self.__class__.__name__, str(self.shape), self.names)
+    
+    #===========================================================================
+    # constructors-------
+    #===========================================================================
+    @classmethod
+    def from_dxcol(cls, #convert a dense attribution frame
+                   dxcol,
+                   dtype=None,
+                   ):
+        if dtype is None: dtype=cls.dtype
+        mdex = dxcol.columns
+        
+        lvl_d = {lvlName:pd.Categorical(mdex.get_level_values(i)) for i, lvlName in enumerate(mdex.names)}
+        
+        return cls(dxcol.values.astype(dtype), dxcol.index.copy(), lvl_d)
+    
+    @classmethod
+    def from_nested(cls, #build from nested impacts (w/o pivoting)
+                    bdf, #nested impacts (cid, grpColn, rEventName1, rEventName2, ...)
+                    cres_df, #asset totals (cid: rEventName)
+                    cid='xid',
+                    grpColn='nestID',
+                    dtype=None,
+                    ):
+        """
+        equivalent to:
+            bdf.pivot(index=cid, columns=grpColn, values=cres_df.columns).divide(cres_df, level='rEventName')
+            
+        entries for missing nests (and zero totals) are left null (see fill_nulls())
+        """
+        if dtype is None: dtype=cls.dtype
+        
+        assert not bdf.duplicated([cid, grpColn]).any(), 'duplicated %s-%s pairs'%(cid, grpColn)
+        
+        #locate each entry
+        row_ar = cres_df.index.get_indexer(bdf[cid])
+        assert (row_ar>=0).all(), 'key mismatch'
+        
+        nest_cat = pd.Categorical(bdf[grpColn])
+        ne, nn = len(cres_df.columns), len(nest_cat.categories)
+        
+        #fill in each event block
+        ar = np.full((len(cres_df), ne*nn), np.nan, dtype=dtype)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for j, coln in enumerate(cres_df.columns):
+                ar[row_ar, j*nn + nest_cat.codes] = bdf[coln].values/cres_df[coln].values[row_ar]
+            
+        lvl_d = {
+            'rEventName':pd.Categorical(np.repeat(cres_df.columns.values, nn)),
+            grpColn:pd.Categorical.from_codes(np.tile(np.arange(nn), ne), nest_cat.categories),
+            }
+        
+        return cls(ar, cres_df.index.copy(), lvl_d)
+    
+    def copy(self):
+        return self.__class__(self.ar.copy(), self.index.copy(), 
+                              {k:v.copy() for k,v in self.lvl_d.items()})
+    
+    def to_dxcol(self, #build the dense frame (e.g., for writing)
+                 dtype=float,
+                 ):
+        mdex = pd.MultiIndex(levels=[c.categories for c in self.lvl_d.values()],
+                             codes=[c.codes for c in self.lvl_d.values()], names=self.names)
+        
+        return pd.DataFrame(self.ar.astype(dtype), index=self.index.copy(), columns=mdex)
+    
+    #===========================================================================
+    # level handling------
+    #===========================================================================
+    def get_lvals(self, #unique values on a level
+                  lvlName):
+        return self.lvl_d[lvlName].remove_unused_categories().categories
+    
+    def get_lvals_d(self, #child level values on each parent level value
+                    lvlName, #parent
+                    lvlName2, #child
+                    ):
+        cdf = pd.DataFrame({k:np.asarray(self.lvl_d[k]) for k in [lvlName, lvlName2]})
+        
+        return {k:pd.Index(v.unique()) for k,v in cdf.groupby(lvlName, sort=True)[lvlName2]}
+    
+    def add_level(self, #add a new top level mapped from an existing level
+                  lvlName,
+                  map_ser, #{existing level value: new level value}
+                  on='rEventName', #existing level to map from
+                  ):
+        assert not lvlName in self.lvl_d
+        
+        vals = pd.Series(np.asarray(self.lvl_d[on])).map(map_ser)
+        assert vals.notna().all(), 'failed to map some \'%s\' values'%on
+        
+        self.lvl_d = {lvlName:pd.Categorical(vals.values), **self.lvl_d}
+        
+        return self
+    
+    def set_lvals(self, #apply a function to the values of a level (e.g., rounding)
+                  lvlName,
+                  func):
+        self.lvl_d[lvlName] = pd.Categorical(func(np.asarray(self.lvl_d[lvlName])))
+        
+        return self
+    
+    def sort(self, #sort the columns by level values
+             ascending=True, #for the first level (remaining levels are always ascending)
+             ):
+        
+        #categories are sorted.. so the codes give the value order
+        code_l = [c.codes.astype(np.int64) for c in self.lvl_d.values()]
+        if not ascending:
+            code_l[0] = -code_l[0]
+        
+        order = np.lexsort(code_l[::-1])
+        
+        self.ar = self.ar[:, order]
+        self.lvl_d = {k:v[order] for k,v in self.lvl_d.items()}
+        
+        return self
+    
+    def _get_blocks(self, #column selectors for each value of a level
+                    lvlName):
+        cat = self.lvl_d[lvlName]
+        
+        for j, lval in enumerate(cat.categories):
+            bx = cat.codes==j
+            if bx.any():
+                yield lval, bx
+        
+    #===========================================================================
+    # operations-------
+    #===========================================================================
+    def slice(self, #select columns by level values
+              lvals_d, #{lvlName:(lvlval1, lvlval2...)}
+              ):
+        bx = np.full(self.shape[1], True)
+        for lvlName, lvals in lvals_d.items():
+            bx = np.logical_and(bx, self.lvl_d[lvlName].isin(lvals))
+            
+        return self.__class__(self.ar[:, bx], self.index.copy(), 
+                      {k:v[bx].remove_unused_categories() for k,v in self.lvl_d.items()})
+    
+    def _apply(self, #broadcast a (cid: lvlval) frame onto the matching columns
+               df, 
+               lvlName,
+               func,
+               inplace=False,
+               ):
+        """looping over the level blocks so the frame is never expanded to the full width"""
+        am = self if inplace else self.copy()
+        
+        df = df.reindex(index=self.index) #same alignment as dxcol.multiply()
+        
+        miss_l = set(self.get_lvals(lvlName)).difference(df.columns)
+        assert len(miss_l)==0, '\'%s\' mismatch: %s'%(lvlName, miss_l)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for lval, bx in am._get_blocks(lvlName):
+                am.ar[:, bx] = func(am.ar[:, bx], df[lval].values.astype(am.ar.dtype).reshape(-1,1))
+            
+        return am
+    
+    def multiply(self, df, lvlName, inplace=False):
+        return self._apply(df, lvlName, np.multiply, inplace=inplace)
+    
+    def divide(self, df, lvlName, inplace=False):
+        return self._apply(df, lvlName, np.divide, inplace=inplace)
+    
+    def fill_nulls(self, #fill nulls left by zero impacts (see Model._attriM_nulls())
+                   idf, #impact values (cid: lvl0 value)
+                   ):
+        """
+        zero impact for the whole lvl0 group: equal attribution
+        remaining (partial zero impact nests): zero
+        """
+        lvlName = self.names[0]
+        idf = idf.reindex(index=self.index)
+        
+        cnt_d = dict()
+        for lval, bx in self._get_blocks(lvlName):
+            zbx = idf[lval].values==0.0
+            cnt_d[lval] = zbx.sum()
+            
+            self.ar[np.ix_(zbx, bx)] = 1/bx.sum()
+            
+        self.ar[np.isnan(self.ar)] = 0.0
+        
+        return cnt_d
+    
+    def sum_level(self, #sum the columns on each value of a level (cid: lvlval)
+                  lvlName=None,
+                  ):
+        """nulls propagate (like skipna=False)"""
+        if lvlName is None: lvlName=self.names[0]
+        
+        d = {lval:self.ar[:, bx].sum(axis=1, dtype=float) for lval, bx in self._get_blocks(lvlName)}
+        
+        df = pd.DataFrame(d, index=self.index)
+        df.columns.name=lvlName
+        
+        return df
+    
+    def sum_cols(self, #sum all assets then group the columns by level values
+                 lvlNames,
+                 ):
+        cdf = pd.DataFrame({k:np.asarray(self.lvl_d[k]) for k in lvlNames})
+        cdf['sum'] = self.ar.sum(axis=0, dtype=float)
+        
+        return cdf.groupby(lvlNames, sort=True)['sum'].sum()
@@ -29,6 +29,7 @@ from hlpr.basic import view
 #from model.modcom import Model
 #from results.riskPlot import Plotr
 from model.riskcom import RiskModel
+from model.modcom import AttriMat
 #==============================================================================
 # functions----------------------
 #==============================================================================
@@ -250,6 +251,23 @@ class Risk2(RiskModel, #This inherits 'Model'
         """
         
         aep_ser = self.data_d['evals'].copy()
+        
+        if self.attriCompact:
+            atr_dxcol = self.data_d.pop(dtag)
+            atr_am = AttriMat.from_dxcol(atr_dxcol).add_level(aep_ser.name, aep_ser, on='rEventName')
+            
+            #check the values all match (columns are not re-ordered until the sort)
+            assert np.array_equal(np.asarray(atr_am.lvl_d['rEventName']), 
+                                  atr_dxcol.columns.get_level_values('rEventName')), 'bad conversion'
+            assert np.array_equal(np.nan_to_num(atr_am.ar, nan=999), 
+                                  np.nan_to_num(atr_dxcol.values.astype(atr_am.dtype), nan=999)), 'bad conversion'
+            
+            self.att_df = atr_am.sort()
+            
+            assert self.attriMode
+            
+            return
+        
         atr_dxcol = self.data_d[dtag].copy()
         """
         view(atr_dxcol)
@@ -12,7 +12,7 @@ from scipy import interpolate, integrate
 
 from hlpr.exceptions import QError as Error
 from hlpr.plot import Plotr, view
-from model.modcom import Model
+from model.modcom import Model, AttriMat
 
 
 class RiskModel(Plotr, Model): #common methods for risk1 and risk2
@@ -22,7 +22,10 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
     
 
     
-    def __init__(self,**kwargs):
+    def __init__(self,
+                 ead_engine='vect', #engine for tail extrapolation and integration. see calc_ead()
+                 indep_engine='vect', #engine for resolving complex 'indep' events. see ev_multis()
+                 **kwargs):
         self.dtag_d={**self.dtag_d, 
                      **{
                         'exlikes':{'index_col':0},
@@ -30,6 +33,9 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         
         super().__init__(**kwargs) 
         
+        self.ead_engine=ead_engine
+        self.indep_engine=indep_engine
+        
     #===========================================================================
     # LOADERS------------
     #===========================================================================
@@ -365,6 +371,9 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                     #lower bound
                 #indep: assume each event is independent (failure of one does not influence the other)
                     #upper bound
+           engine=None, #how to resolve complex 'indep' events
+                #vect: closed form on all assets at once (see _get_indeEV_ar())
+                #loop: enumerate the failure scenarios of each asset (see _get_indeEV())
            logger=None,
                        ):
         """
@@ -391,6 +400,7 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         
         """needs to be consistent with what was done during set_exlikes()"""
         if event_rels is None: event_rels = self.event_rels
+        if engine is None: engine=self.indep_engine
 
         #======================================================================
         # precheck
@@ -503,10 +513,6 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                 # independent
                 #===============================================================
                 elif event_rels == 'indep':
-                    """
-                    NOTE: this is a very slow routine
-                    TODO: parallel processing
-                    """
                     
                     #identify those worth calculating
                     bx = np.logical_and(
@@ -514,28 +520,38 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                         ddf.loc[:,exn_l].sum(axis=1).round(self.prec)>0  #with some damages
                         )
                     
-                    #build the event type flags
-                    etype_df = pd.Series(index=exn_l, dtype=np.bool, name='mutEx').to_frame()
+                    #identify the noFail event
+                    bxnf = pd.Index(exn_l).isin(self.noFailExn_d.values())
+                    assert bxnf.sum()==1
 
-                    #mark the failure event
-                    etype_df.loc[etype_df.index.isin(self.noFailExn_d.values()), 'mutEx']=True
-                    assert etype_df.iloc[:,0].sum()==1
-
-                    """todo: consider using 'apply'
-                    tricky w/ multiple data frames...."""
                     log.info('aep %.4f calculating %i (of %i) EVs from %i events w/ indepedence'%(
                         aep, bx.sum(), len(bx), len(exn_l)))
                     
-                    #loop and resolve each asset
-                    for cindx, pser in edf.loc[bx, exn_l].iterrows():
-                   
-                        #assemble the prob/consq set for this asset
-                        inde_df = pser.rename('prob').to_frame().join(
-                            ddf.loc[cindx, exn_l].rename('consq').to_frame()
-                            ).join(etype_df)
-                            
-                        #resolve for this asset
-                        res_df.loc[cindx, aep] = self._get_indeEV(inde_df)
+                    if engine=='vect': #resolve all the assets at once
+                        p_ar = edf.loc[bx, exn_l].values
+                        c_ar = ddf.loc[bx, exn_l].values
+                        
+                        res_df.loc[bx, aep] = self._get_indeEV_ar(
+                            p_ar[:, ~bxnf], c_ar[:, ~bxnf], #failure events
+                            p_ar[:, bxnf][:,0], c_ar[:, bxnf][:,0], #noFail event
+                            )
+                        
+                    elif engine=='loop':
+                        #build the event type flags
+                        etype_df = pd.Series(bxnf, index=exn_l, name='mutEx').to_frame()
+                        
+                        #loop and resolve each asset
+                        for cindx, pser in edf.loc[bx, exn_l].iterrows():
+                       
+                            #assemble the prob/consq set for this asset
+                            inde_df = pser.rename('prob').to_frame().join(
+                                ddf.loc[cindx, exn_l].rename('consq').to_frame()
+                                ).join(etype_df)
+                                
+                            #resolve for this asset
+                            res_df.loc[cindx, aep] = self._get_indeEV(inde_df)
+                    else:
+                        raise Error('unrecognized indep_engine: \'%s\''%engine)
                         
                     #fill in remainderes
                     assert res_df.loc[~bx, aep].isna().all()
@@ -567,9 +583,16 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         #=======================================================================
         if self.attriMode:
             atr_dxcol_raw = self.att_df.copy()
-            mdex = atr_dxcol_raw.columns
-            nameRank_d= {lvlName:i for i, lvlName in enumerate(mdex.names)}
             edf = edf.sort_index(axis=1, ascending=False)
+            
+            #get events on each aep
+            if isinstance(atr_dxcol_raw, AttriMat):
+                exn_d = atr_dxcol_raw.get_lvals_d(atr_dxcol_raw.names[0], 'rEventName')
+            else:
+                mdex = atr_dxcol_raw.columns
+                nameRank_d= {lvlName:i for i, lvlName in enumerate(mdex.names)}
+                exn_d = {aep:gdf.columns.remove_unused_levels().levels[nameRank_d['rEventName']]
+                         for aep, gdf in atr_dxcol_raw.groupby(level=0, axis=1)}
 
             if event_rels == 'max':
                 """                
@@ -580,28 +603,21 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                 #===============================================================
                 # build multipler (boolean based on max)
                 #===============================================================
-                mbdxcol=None
-                for aep, gdf in atr_dxcol_raw.groupby(level=0, axis=1):
-                    #get events on this aep
-                    exn_l = gdf.columns.remove_unused_levels().levels[nameRank_d['rEventName']]
-                    
+                bdf_d = dict()
+                for aep, exn_l in exn_d.items():
                     #identify maximums
-                    booldf = evdf.loc[:, exn_l].isin(evdf.loc[:, exn_l].max(axis=1)).astype(int)
+                    booldf = evdf.loc[:, exn_l].isin(evdf.loc[:, exn_l].max(axis=1)).astype(float)
                     
                     #handle duplicates (assign equal portion)
                     if len(exn_l)>1:
                         boolidx =  booldf.eq(booldf.iloc[:,0], axis=0).all(axis=1)
                         booldf.loc[boolidx, :] = float(1/len(exn_l))
 
-                    #add in the dummy lvl0 aep
-                    bdxcol = pd.concat([booldf], keys=[aep], axis=1)
-
-                    if mbdxcol is None:
-                        mbdxcol = bdxcol
-                    else:
-                        mbdxcol = mbdxcol.merge(bdxcol, how='outer', left_index=True, right_index=True)
-                        
-                    log.debug('%.4f: got %s'%(aep, str(mbdxcol.shape)))
+                    bdf_d[aep] = booldf
+                    
+                #add in the dummy lvl0 aep (one concat rather than merging each aep)
+                mbdxcol = pd.concat(bdf_d, axis=1)
+                log.debug('got %s'%str(mbdxcol.shape))
                     
                 #check it
                 self.check_attrimat(atr_dxcol=mbdxcol, logger=log)
@@ -626,11 +642,16 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
             #===================================================================
             # common
             #===================================================================
-            #multiply thorugh to get all the expected value components 
-            i_dxcol = atr_dxcol_raw.multiply(evdf1, axis='columns', level=1)
-                
-            #divide by the event totals to get ratios back
-            atr_dxcol = i_dxcol.divide(res_df, axis='columns', level='aep')
+            if isinstance(atr_dxcol_raw, AttriMat):
+                #same steps in place on the copy
+                atr_dxcol = atr_dxcol_raw.multiply(evdf1, 'rEventName', inplace=True
+                                    ).divide(res_df, atr_dxcol_raw.names[0], inplace=True)
+            else:
+                #multiply thorugh to get all the expected value components 
+                i_dxcol = atr_dxcol_raw.multiply(evdf1, axis='columns', level=1)
+                    
+                #divide by the event totals to get ratios back
+                atr_dxcol = i_dxcol.divide(res_df, axis='columns', level='aep')
             
             #apportion null values
             atr_dxcol = self._attriM_nulls(res_df, atr_dxcol, logger=log)
@@ -653,6 +674,9 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                  rtail = None,
                  drop_tails = None, #whether to remove the dummy tail values from results
                  dx = None, #damage step for integration (default:None)
+                 engine = None, #how to apply the extrapolation and integration to each row
+                    #vect: on the whole impact matrix at once
+                    #loop: row-wise apply (legacy)
                  logger = None
                  ):      
         
@@ -681,6 +705,7 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         if ltail is None: ltail = self.ltail
         if rtail is None: rtail = self.rtail
         if drop_tails is None: drop_tails=self.drop_tails
+        if engine is None: engine=self.ead_engine
         assert isinstance(drop_tails, bool)
         
         #format tail values
@@ -699,6 +724,16 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         if not rtail in ['extrapolate', 'none']:
             rtail = float(rtail)
             
+        #row functions
+        if engine == 'vect':
+            extrap_f = self._extrap_rCurve_df
+            ev_f = self._get_ev_df
+        elif engine == 'loop':
+            extrap_f = lambda df, **kwargs: df.apply(self._extrap_rCurve, axis=1, **kwargs)
+            ev_f = lambda df, **kwargs: df.apply(self._get_ev, axis=1, **kwargs)
+        else:
+            raise Error('unrecognized ead_engine: \'%s\''%engine)
+            
         log.info('getting ead on %s w/ ltail=\'%s\' and rtail=\'%s\''%(
             str(df_raw.shape), ltail, rtail))
         
@@ -760,7 +795,7 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
                     self.extrap_vals_d[0] = df.loc[:,0].mean().round(self.prec) #store for later
                 
             elif ltail == 'extrapolate': #DEFAULT
-                df.loc[bx,0] = df.loc[bx, :].apply(self._extrap_rCurve, axis=1, left=True)
+                df.loc[bx,0] = extrap_f(df.loc[bx, :], left=True)
                 
                 #extrap vqalue will be different for each entry
                 if len(df)==1: 
@@ -784,8 +819,7 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
             if rtail == 'extrapolate':
                 """just using the average for now...
                 could extraploate for each asset but need an alternate method"""
-                aep_ser = df.loc[bx, :].apply(
-                    self._extrap_rCurve, axis=1, left=False)
+                aep_ser = extrap_f(df.loc[bx, :], left=False)
                 
                 aep_val = round(aep_ser.mean(), 5)
                 
@@ -844,8 +878,7 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
     
             
             #apply the ead func
-            df.loc[bx, 'ead'] = df.loc[bx, :].apply(
-                self._get_ev, axis=1, dx=dx)
+            df.loc[bx, 'ead'] = ev_f(df.loc[bx, :], dx=dx)
         
         
         df.loc[:, 'ead'] = df['ead'].fillna(0) #fill remander w/ zeros
@@ -879,6 +912,50 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
             
         return res_df
 
+    def _get_indeEV_ar(self, #get the expected value for a set of assets w/ independent failures
+                       pF_ar, #failure probabilities (asset, failure event)
+                       cF_ar, #failure consequences (asset, failure event)
+                       pNF_ar, #noFail probabilities (asset)
+                       cNF_ar, #noFail consequences (asset)
+                       ):
+        """
+        array equivalent of _get_indeEV()
+        
+        rather than enumerating the 2^n failure scenarios, 
+            sort the failure consequences (largest first) for each asset.
+            the largest consequence is realized when its failure occurs,
+            the second when it occurs and the first does not, etc:
+            
+            E[max] = sum_k( c_k * p_k * prod_j<k(1-p_j) )
+        """
+        #=======================================================================
+        # precheck
+        #=======================================================================
+        assert pF_ar.shape==cF_ar.shape
+        assert pF_ar.ndim==2
+        
+        #=======================================================================
+        # sort by consequence
+        #=======================================================================
+        sort_ar = np.argsort(-cF_ar, axis=1, kind='stable')
+        
+        c_ar = np.take_along_axis(cF_ar, sort_ar, axis=1)
+        p_ar = np.take_along_axis(pF_ar, sort_ar, axis=1)
+        
+        #=======================================================================
+        # probability that none of the larger consequences occur
+        #=======================================================================
+        pNone_ar = np.cumprod(
+            np.hstack((np.ones((len(p_ar), 1)), 1-p_ar[:, :-1])), 
+            axis=1)
+        
+        #=======================================================================
+        # expected values
+        #=======================================================================
+        evFail_ar = (c_ar*p_ar*pNone_ar).sum(axis=1)
+        
+        return evFail_ar + pNF_ar*cNF_ar
+        
     def _get_indeEV(self,
                     inde_df #prob, consq, mutual exclusivity flag for each exposure event 
                     ):
@@ -1021,6 +1098,71 @@ class RiskModel(Plotr, Model): #common methods for risk1 and risk2
         return result 
     
 
+    def _extrap_rCurve_df(self, #extrapolate EAD curve data for all rows at once
+                          df, #damages (asset, aep)
+                          left=True, #whether to extraploate left or right
+                          ):
+        """
+        array equivalent of _extrap_rCurve()
+            evaluating at x=0 means interp1d always extends the line through the 
+            two smallest x values. we do the same with the same arithmetic
+        """
+        ar = df.values.astype(float)
+        aep_ar = df.columns.values.astype(float)
+        
+        #=======================================================================
+        # get the two points to extend from
+        #=======================================================================
+        if left:
+            #xvals=aep (shared by all rows)
+            ind = np.argsort(aep_ar, kind='mergesort')[:2]
+            x_lo, x_hi = aep_ar[ind[0]], aep_ar[ind[1]]
+            y_lo, y_hi = ar[:, ind[0]], ar[:, ind[1]]
+            
+        else:
+            #xvals=damages (sorted on each row)
+            ind = np.argsort(ar, axis=1, kind='mergesort')[:, :2]
+            x_ar = np.take_along_axis(ar, ind, axis=1)
+            y_ar = aep_ar[ind]
+            x_lo, x_hi = x_ar[:,0], x_ar[:,1]
+            y_lo, y_hi = y_ar[:,0], y_ar[:,1]
+            
+        #=======================================================================
+        # extend
+        #=======================================================================
+        with np.errstate(divide='ignore', invalid='ignore'):
+            res_ar = (y_hi - y_lo)/(x_hi - x_lo)*(0 - x_lo) + y_lo
+        
+        bx = ~(res_ar>=0)
+        if bx.any():
+            raise Error('got %i negative extrapolations on %s'%(
+                bx.sum(), df.index[bx].tolist()))
+        
+        return pd.Series(res_ar, index=df.index)
+    
+    def _get_ev_df(self, #integrate all rows at once
+                   df, #damages (asset, aep)
+                   dx=0.1,
+                   ):
+        """
+        array equivalent of _get_ev()
+        """
+        x = df.values.astype(float) #impacts
+        y = np.tile(df.columns.values.astype(float).round(self.prec+2), (len(x), 1)) #AEPs
+        
+        if self.integrate == 'trapz':
+            ead_ar = integrate.trapz(y, x=x, dx=dx, axis=1)
+            
+        elif self.integrate == 'simps':
+            self.logger.warning('integration method not tested')
+            
+            ead_ar = integrate.simps(y, x=x, dx=dx, axis=1)
+            
+        else:
+            raise Error('integration method \'%s\' not recognized'%self.integrate)
+        
+        return pd.Series(np.round(ead_ar, self.prec), index=df.index)
+    
     def _get_ev(self, #integration caller
                ser, #row from damage results
                dx = 0.1,
@@ -35,6 +35,7 @@ from hlpr.exceptions import QError as Error
 #===============================================================================
 
 from results.riskPlot import RiskPlotr
+from model.modcom import AttriMat
 from hlpr.basic import view
 
 #==============================================================================
@@ -99,41 +100,38 @@ class Attr(RiskPlotr):
         forcing the project precision aon all hte aep values...
             not the greatest.. but only decent way to ensure they are treated as members
         """
-        #reformat aep values
-        atr_dxcol = self.data_d.pop(self.attrdtag_in)
-        
-        mdex = atr_dxcol.columns
+        #convert to compact storage (see modcom.AttriMat)
+        atr_am = AttriMat.from_dxcol(self.data_d.pop(self.attrdtag_in))
+        lvl0, lvl1 = atr_am.names[:2]
         
-        atr_dxcol.columns = mdex.set_levels(
-            np.around(mdex.levels[0].astype(float), decimals=self.prec), 
-            level=0)
+        #reformat aep values
+        atr_am.set_lvals(lvl0, lambda ar: np.around(ar.astype(float), decimals=self.prec))
         
         #sort them
         """this flips the usual atr_dxcol order.. but matches the EAD calc expectation"""
-        atr_dxcol = atr_dxcol.sort_index(axis=1, level=0, ascending=False)
+        atr_am.sort(ascending=False)
 
 
         #=======================================================================
         # check
         #=======================================================================
-        mdex = atr_dxcol.columns
         #check aep values
-        miss_l = set(mdex.levels[0]).symmetric_difference(
+        miss_l = set(atr_am.get_lvals(lvl0)).symmetric_difference(
             self.aep_df.loc[~self.aep_df['extrap'], 'aep'])
  
         assert len(miss_l)==0, 'aep mismatch: %s'%miss_l
         
         #check rEventNames
-        miss_l = set(mdex.levels[1]).symmetric_difference(
+        miss_l = set(atr_am.get_lvals(lvl1)).symmetric_difference(
             self.data_d['eventypes']['rEventName'])
         assert len(miss_l)==0, 'rEventName mismatch: %s'%miss_l
         
         #store
-        self.data_d[self.attrdtag_in] = atr_dxcol
+        self.data_d[self.attrdtag_in] = atr_am
         #=======================================================================
         # get TOTAL multiplied values---
         #=======================================================================
-        self.mula_dxcol = self.get_mult(atr_dxcol.copy(), logger=log)
+        self.mula_am = self.get_mult(atr_am, logger=log)
         
         #=======================================================================
         # wrap
@@ -254,7 +252,7 @@ class Attr(RiskPlotr):
         
     def get_slice_noFail(self, #slice of noFail and fail
                          
-                         atr_dxcol=None,
+                         atr_am=None,
                          et_df = None,
                          logger=None,
                          ): 
@@ -262,7 +260,7 @@ class Attr(RiskPlotr):
         # defaults
         #=======================================================================
         if logger is  None: logger=self.logger
-        if atr_dxcol is None: atr_dxcol=self.data_d[self.attrdtag_in].copy()
+        if atr_am is None: atr_am=self.data_d[self.attrdtag_in]
         if et_df is  None: et_df=self.data_d['eventypes']
         log=logger.getChild('get_slice_noFail')
         
@@ -277,23 +275,22 @@ class Attr(RiskPlotr):
         renf_ar = et_df.loc[et_df['noFail'], 'rEventName'].values
         
         #get slice of this        
-        s1_dxcol = self.get_slice({'rEventName':renf_ar.tolist()}, logger=log,
+        s1_am = self.get_slice({'rEventName':renf_ar.tolist()}, atr_am=atr_am, logger=log,
                                   sliceName='noFail',
                                   slice_impStyle_d={
                                       'color':'red'
                                       }) 
         """
-        view(atr_dxcol)
-        view(s1_dxcol)
+        view(s1_am.to_dxcol())
         view(s1i_ttl)
 
         view(self.data_d['r_passet'])
         """
         #multiply by impacts
-        s1i_dxcol = self.get_mult(s1_dxcol, logger=log)
+        s1i_am = self.get_mult(s1_am, logger=log)
         
         #compress to event totals
-        s1i_df =  s1i_dxcol.sum(axis=1, level='aep').sum(axis=0).rename('impacts'
+        s1i_df =  s1i_am.sum_cols(['aep']).rename('impacts'
                      ).reset_index(drop=False)
         
         s1i_ttl, ead = self.get_ttl(s1i_df, logger=log) #sum to aeps
@@ -302,7 +299,7 @@ class Attr(RiskPlotr):
             
     def get_slice(self,
                   lvals_d, #mdex lvl values {lvlName:(lvlval1, lvlval2...)}
-                  atr_dxcol=None,
+                  atr_am=None,
                   logger=None,
                   sliceName='slice', #plot identifying?
                   slice_impStyle_d=dict(),
@@ -312,64 +309,42 @@ class Attr(RiskPlotr):
         # defaults
         #=======================================================================
         if logger is  None: logger=self.logger
-        if atr_dxcol is None: atr_dxcol=self.data_d[self.attrdtag_in].copy()
+        if atr_am is None: atr_am=self.data_d[self.attrdtag_in]
         log=logger.getChild('get_slice')
         
         self.sliceName=sliceName #setting for plot
         self.slice_impStyle_d=slice_impStyle_d
         
-        mdex = atr_dxcol.columns
-        """
-        view(mdex.to_frame())
-        """
-        nameRank_d= {lvlName:i for i, lvlName in enumerate(mdex.names)}
-        #rankName_d= {i:lvlName for i, lvlName in enumerate(mdex.names)}
+        names = atr_am.names
         #=======================================================================
         # precheck
         #=======================================================================
         #quick check on the names
-        miss_l = set(lvals_d.keys()).difference(mdex.names)
+        miss_l = set(lvals_d.keys()).difference(names)
         assert len(miss_l)==0, '%i requested lvlNames not on mdex: %s'%(len(miss_l), miss_l)
         
         #chekc values
         for lvlName, lvals in lvals_d.items():
             
             #chekc all these are in there
-            miss_l = set(lvals).difference(mdex.levels[nameRank_d[lvlName]])
+            miss_l = set(lvals).difference(atr_am.get_lvals(lvlName))
             assert len(miss_l)==0, '%i requsted lvals on \"%s\' not in mdex: %s'%(len(miss_l), lvlName, miss_l)
             
 
         #=======================================================================
         # get slice            
         #=======================================================================
-        log.info('from %i levels on %s'%(len(lvals_d), str(atr_dxcol.shape)))
-        """
-        s_dxcol = atr_dxcol.loc[:, idx[:, lvals_d['rEventName'], :]].columns.to_frame())
-        """
+        log.info('from %i levels on %s'%(len(lvals_d), str(atr_am.shape)))
         
-        
-        """seems like there should be a better way to do this...
-        could force the user to pass request with all levels complete"""
-        s_dxcol = atr_dxcol.copy()
-        #populate missing elements
-        for lvlName, lRank  in nameRank_d.items():
-            if not lvlName in lvals_d: continue 
-            
-            if lRank == 0: continue #always keeping this
-            elif lRank == 1:
-                s_dxcol = s_dxcol.loc[:, idx[:, lvals_d[lvlName]]]
-            elif lRank == 2:
-                s_dxcol = s_dxcol.loc[:, idx[:, :, lvals_d[lvlName]]]
-            else:
-                raise Error
-                
+        #top level is always kept
+        s_am = atr_am.slice({k:v for k,v in lvals_d.items() if not k==names[0]})
  
-        log.info('sliced  to %s'%str(s_dxcol.shape))
+        log.info('sliced  to %s'%str(s_am.shape))
         
-        return s_dxcol
+        return s_am
 
-    def get_mult(self, #multiply dxcol by the asset event totals
-                atr_dxcol,
+    def get_mult(self, #multiply attribution by the asset event totals
+                atr_am,
                 logger=None,
  
                 ): 
@@ -384,15 +359,16 @@ class Attr(RiskPlotr):
         # precheck
         #=======================================================================
         #aep set
-        miss_l = set(atr_dxcol.columns.levels[0]).difference(rp_df.columns)
+        miss_l = set(atr_am.get_lvals('aep')).difference(rp_df.columns)
         assert len(miss_l)==0, 'event mismatch'
         
         #attribute matrix logic
         """note we accept slices... so sum=1 wont always hold"""
-        assert atr_dxcol.notna().all().all()
-        assert (atr_dxcol.max()<=1.0).all().all()
-        assert (atr_dxcol.max()>=0.0).all().all()
-        for e in atr_dxcol.dtypes.values: assert e==np.dtype(float)
+        ar = atr_am.ar
+        assert not np.isnan(ar).any()
+        assert ar.max()<=1.0
+        assert ar.min()>=0.0
+        assert np.issubdtype(ar.dtype, np.floating)
         
         #=======================================================================
         # prep
@@ -403,17 +379,17 @@ class Attr(RiskPlotr):
         rp_df.sum(axis=0)
         view(mdxcol)
         
-        view(atr_dxcol.sum(axis=1, level=0))
+        view(atr_am.sum_level('aep'))
         """
         #=======================================================================
         # multiply
         #=======================================================================
-        mdxcol = atr_dxcol.multiply(rp_df, level='aep')
+        m_am = atr_am.multiply(rp_df, 'aep')
         
         #=======================================================================
         # check it
         #=======================================================================
-        if not self.check_eDmg(mdxcol.sum(axis=1, level=0), logger=log):
+        if not self.check_eDmg(m_am.sum_level('aep'), logger=log):
             """allowing this as we still want to give the user the plot
             can happen if a slice/component reduces with aep
             likely something with bad failure data"""
@@ -421,13 +397,13 @@ class Attr(RiskPlotr):
         
             #raise Error('failed damage monotonciy check')
         
-        return mdxcol
+        return m_am
     
 
     def get_stack(self, #get a set of stacked data for a stack plot
                   lvlName='nestID', #level from which to build stacked data from
                     #eventually we could support different unstacking dimensions.. but nestID is the only obviuos one now
-                  atr_dxcol=None,
+                  atr_am=None,
                   logger=None,
                   
                   ):
@@ -435,28 +411,27 @@ class Attr(RiskPlotr):
         # defaults
         #=======================================================================
         if logger is  None: logger=self.logger
-        if atr_dxcol is None: atr_dxcol=self.data_d[self.attrdtag_in].copy()
+        if atr_am is None: atr_am=self.data_d[self.attrdtag_in]
         log=logger.getChild('get_slice')
         
         #=======================================================================
         # precheck
         #=======================================================================
-        assert lvlName in atr_dxcol.columns.names
+        assert lvlName in atr_am.names
         
         #=======================================================================
         # get impact values
         #=======================================================================
-        i_dxcol = self.get_mult(atr_dxcol, logger=log)
+        i_am = self.get_mult(atr_am, logger=log)
 
         #=======================================================================
         # get stack
         #=======================================================================
         """
-        view(i_dxcol.columns.to_frame())
         view(sdf)
         """
-        #compres rows to totals. pivot out new columns. compress all remaining mindex rows to sums
-        sdf = i_dxcol.sum(axis=0).unstack(level=lvlName).sum(axis=0, level='aep')
+        #compres rows to totals. pivot out new columns. compress all remaining levels to sums
+        sdf = i_am.sum_cols(['aep', lvlName]).unstack(level=lvlName).fillna(0.0)
         
         #=======================================================================
         # add in tails
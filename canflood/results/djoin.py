@@ -21,7 +21,8 @@ import pandas as pd
 
 #Qgis imports
 
-from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsProject
+from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsProject, \
+    QgsVectorLayerJoinInfo, QgsVirtualLayerDefinition
 
 
 
@@ -32,7 +33,8 @@ from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsProj
 from hlpr.exceptions import QError as Error
     
 
-from hlpr.Q import Qcoms, vlay_get_fdf, vlay_get_fdata, view
+from hlpr.Q import Qcoms, vlay_get_fdf, vlay_get_fdata, view, vlay_write
+from hlpr.cache import file_sig
 #from hlpr.basic import *
 from model.modcom import Model
 
@@ -70,6 +72,7 @@ class Djoiner(Qcoms, Model):
     
     def __init__(self,
                  fp_attn = 'r_passet', #default attribute name to pull tabulat data from
+                 join_mode = 'copy', #how to build the result layer. see run()
                  **kwargs
                  ):
 
@@ -77,6 +80,8 @@ class Djoiner(Qcoms, Model):
         
         assert hasattr(self, fp_attn), 'bad dfp_attn: %s'%fp_attn
         self.fp_attn=fp_attn
+        self.join_mode=join_mode
+        self.cindex_d = dict() #{(finv layer key, cid): cid-fid index}. see get_cindex()
         
         self.dtag_d={fp_attn:{'index_col':0},
                      'r_ttl':{'index_col':None}}
@@ -109,6 +114,11 @@ class Djoiner(Qcoms, Model):
               keep_fnl = 'all', #list of field names to keep from the vlay (or 'all' to keep all)
 
               layname = None,
+              
+              join_mode=None, #how to build the result layer
+                #copy: new memory layer w/ the finv data, results, and a copy of each geometry
+                #view: finv source w/ the results joined on as a table (no geometry copies). see run_view()
+              tbl_fp=None, #for join_mode=view, optional GeoPackage to write the results table to
 
               ): 
         """
@@ -125,11 +135,22 @@ class Djoiner(Qcoms, Model):
         if layname is None: layname = 'djoin_%s_%s'%(self.tag, vlay_raw.name())
         assert isinstance(layname, str), 'got bad type on layname: %s'%type(layname)
         if df_raw is None: df_raw=self.data_d[self.fp_attn]
+        if join_mode is None: join_mode=self.join_mode
+        
+        if join_mode=='view' and (not keep_fnl=='all'):
+            log.warning('join_mode=\'view\' keeps all the finv fields... using \'copy\'')
+            join_mode='copy'
 
         #=======================================================================
         # get data
         #=======================================================================
         lkp_df = self._prep_table(df_raw, relabel, log=log)
+        
+        if join_mode=='view':
+            return self.run_view(vlay_raw, lkp_df, cid=cid, layname=layname, tbl_fp=tbl_fp, logger=log)
+        
+        assert join_mode=='copy', 'unrecognized join_mode: \'%s\''%join_mode
+        
         vlay_df = self._prep_vlay(vlay_raw, keep_fnl, log=log)
 
         
@@ -159,6 +180,136 @@ class Djoiner(Qcoms, Model):
         log.info('finished on \'%s\''%res_vlay.name())
         
         return res_vlay
+    
+    def run_view(self, #join the results onto the finv source as a table
+                 vlay_raw, #finv vlay (to join results to)
+                 lkp_df, #results table (see _prep_table())
+                 cid=None,
+                 layname=None,
+                 tbl_fp=None, #optional GeoPackage to write the results table to
+                 logger=None,
+                 ):
+        """
+        same features and fields as run() w/ keep_fnl='all'
+            but the finv attributes and geometry are read from the finv source
+            
+        repeated joins onto the same finv re-use the cid-fid index (see get_cindex())
+        
+        the results table is added to the project (un-listed) so the join survives
+            finvs w/ assets missing from the results get a virtual layer view (see below)
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log=logger.getChild('run_view')
+        if cid is None: cid = self.cid
+        if layname is None: layname=self.resname
+        
+        assert vlay_raw.crs()==self.qproj.crs(), 'crs mismatch: \n    %s\n    %s'%(
+            vlay_raw.crs(), self.qproj.crs())
+        
+        #=======================================================================
+        # check keys
+        #=======================================================================
+        cindex = self.get_cindex(vlay_raw, cid=cid, logger=log)
+        
+        l = set(lkp_df[cid]).difference(cindex.index)
+        if not len(l)==0:
+            raise Error('%i (of %i) \'%s\' entries in the results not found in the finv_vlay: \n    %s'%(
+            len(l), len(lkp_df), cid, l))
+
+        if not lkp_df[cid].is_unique: #join would duplicate features
+            boolidx = lkp_df[cid].duplicated(keep=False)
+            raise Error('%i (of %i) \'%s\' entries in the results are not unique: \n    %s'%(
+            boolidx.sum(), len(lkp_df), cid, lkp_df.loc[boolidx, cid].unique().tolist()))
+
+        #overlapping columns
+        df = lkp_df.copy()
+        df.columns = df.columns.astype(str)
+        
+        icols = set(df.columns).intersection([f.name() for f in vlay_raw.fields()]).difference([cid])
+        if len(icols)>0:
+            log.warning('got %i overlapping columns...taking data from vlay \n    %s'%(len(icols), icols))
+            df = df.drop(list(icols), axis=1)
+        
+        #=======================================================================
+        # build the table
+        #=======================================================================
+        tbl_vlay = self.vlay_new_df2(df.reset_index(drop=True), layname='%s_tbl'%layname, logger=log)
+        
+        if not tbl_fp is None:
+            vlay_write(tbl_vlay, tbl_fp, overwrite=True, logger=log)
+            tbl_vlay = QgsVectorLayer(tbl_fp, '%s_tbl'%layname, 'ogr')
+            assert tbl_vlay.isValid(), 'failed to load %s'%tbl_fp
+            
+        self.qproj.addMapLayer(tbl_vlay, False)
+        
+        #=======================================================================
+        # build the view
+        #=======================================================================
+        if len(df)<len(cindex):
+            """only those w/ results (like the inner join)
+                filtered by a subquery on the results table (rather than a literal list of keys)"""
+            vdef = QgsVirtualLayerDefinition()
+            if vlay_raw.providerType()=='memory':
+                if self.qproj.mapLayer(vlay_raw.id()) is None:
+                    self.qproj.addMapLayer(vlay_raw, False)
+                vdef.addSource('finv', vlay_raw.id()) #memory layers can only be referenced
+            else:
+                vdef.addSource('finv', vlay_raw.source(), vlay_raw.providerType())
+                
+            vdef.addSource('tbl', tbl_vlay.id())
+            vdef.setQuery('SELECT * FROM finv WHERE "%s" IN (SELECT "%s" FROM tbl)'%(cid, cid))
+            
+            res_vlay = QgsVectorLayer(vdef.toString(), layname, 'virtual')
+            assert res_vlay.isValid(), 'failed to build the view on \'%s\''%vlay_raw.name()
+            
+        elif vlay_raw.providerType()=='memory':
+            """memory layers cant share a source"""
+            res_vlay = vlay_raw.clone()
+        else:
+            res_vlay = QgsVectorLayer(vlay_raw.source(), layname, vlay_raw.providerType())
+            
+        res_vlay.setName(layname)
+        
+        jinfo = QgsVectorLayerJoinInfo()
+        jinfo.setJoinLayer(tbl_vlay)
+        jinfo.setJoinFieldName(cid)
+        jinfo.setTargetFieldName(cid)
+        jinfo.setJoinFieldNamesSubset([coln for coln in df.columns if not coln==cid])
+        jinfo.setUsingMemoryCache(True)
+        jinfo.setPrefix('')
+        
+        if not res_vlay.addJoin(jinfo):
+            raise Error('failed to join \'%s\' onto \'%s\''%(tbl_vlay.name(), res_vlay.name()))
+            
+        log.info('joined %s onto %i features of \'%s\''%(
+            str(df.shape), len(cindex), vlay_raw.name()))
+        
+        return res_vlay
+    
+    def get_cindex(self, #get the cid-fid index of a finv layer
+                   vlay,
+                   cid=None,
+                   logger=None,
+                   ):
+        """cached on the layer source (or id for memory layers)"""
+        if logger is None: logger=self.logger
+        if cid is None: cid = self.cid
+        
+        sig = file_sig(vlay.source())
+        key = (vlay.id() if sig is None else sig, cid)
+        
+        if not key in self.cindex_d:
+            fid_ser = vlay_get_fdata(vlay, fieldn=cid, fmt='ser', logger=logger)
+            
+            if not fid_ser.is_unique:
+                raise Error('non-unique vlay keys')
+            
+            self.cindex_d[key] = pd.Series(fid_ser.index, index=pd.Index(fid_ser.values, name=cid), name='fid')
+            
+        return self.cindex_d[key]
      
     def _prep_vlay(self, vlay_raw, keep_fnl, log=None):
         if log is None: log = self.logger.getChild('_prep_vlay') 
@@ -36,6 +36,7 @@ from qgis.core import *
 from hlpr.exceptions import QError as Error
     
 from hlpr.Q import Qcoms, view, vlay_get_fdf, vlay_rename_fields, vlay_get_fdata
+from hlpr.cache import file_sig
 
 import processing  
 
@@ -51,6 +52,9 @@ class Gwrkr(Qcoms):
 
     
     def __init__(self,
+                 gsamp_engine='array', #engine for downsampling asset results. see gsamp_df()
+                    #array: assign assets to cells once then sum w/ pandas
+                    #processing: joinbylocationsummary for each layer
                  **kwargs
                  ):
         
@@ -60,6 +64,9 @@ class Gwrkr(Qcoms):
         
         super().__init__(**kwargs) #initilzie teh baseclass
         
+        self.gsamp_engine=gsamp_engine
+        self.cindex_d = dict() #{(finv layer key, cid, grid layer key, gid): cell index}. see get_cindex()
+        
         self.logger.debug('init finished')
         
     def load_grid(self, #load a grid layer and do some checks
@@ -198,11 +205,210 @@ class Gwrkr(Qcoms):
  
         return gvlay1, nfn_l
     
+    def gsamp_df(self, #resample results to a grid (as a frame indexed by gid)
+              avlay, #asset results layer
+              gvlay=None, #new polygon grid to sample
+              gid=None,
+              res_fnl = ['ead'], #list of result fields to downsample
+              finv=None, #asset inventory w/ the geometry of avlay (defaults to avlay)
+              cid=None, #asset index field (on avlay and finv)
+              engine=None,
+              logger=None,
+              ):
+        """
+        same totals as gsamp() (sum on intersecting cells, nulls on empty cells)
+            w/o building the joined layer
+            
+        assets are assigned to cells on the finv then results joined on cid
+            so the results layers of each run on the same finv share one assignment
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log=logger.getChild('gsamp_df')
+        if gvlay is None: gvlay = self.gvlay
+        if gid is None: gid=self.gid
+        if engine is None: engine=self.gsamp_engine
+        if finv is None: finv=avlay
+        if cid is None: cid=self.cid
+        
+        #=======================================================================
+        # array engine
+        #=======================================================================
+        if engine=='array':
+            cindex = self.get_cindex(finv, gvlay=gvlay, gid=gid, cid=cid, logger=log)
+            
+            if cindex is None:
+                engine='processing'
+            else:
+                gid_ser = pd.Series(vlay_get_fdata(gvlay, fieldn=gid, logger=log), name=gid)
+                assert gid_ser.is_unique, '%s has bad gid=\'%s\''%(gvlay.name(), gid)
+                
+                #sum on each cell (assets outside the grid are dropped)
+                adf = vlay_get_fdf(avlay, fieldn_l=res_fnl+[cid], logger=log).set_index(cid)
+                assert adf.index.is_unique, '%s has bad cid=\'%s\''%(avlay.name(), cid)
+                
+                df = adf.groupby(cindex.reindex(adf.index)).sum(min_count=1
+                                            ).reindex(gid_ser.values)
+                df.index.name=gid
+                
+                return df
+            
+        #=======================================================================
+        # processing
+        #=======================================================================
+        assert engine=='processing', 'unrecognized engine: \'%s\''%engine
+        
+        rvlay, nfn_l = self.gsamp(avlay, res_fnl=res_fnl, gid=gid, gvlay=gvlay, logger=log)
+        
+        return vlay_get_fdf(rvlay, logger=log).drop(['fid'], axis=1, errors='ignore').set_index(gid)
+    
+    def get_cindex(self, #get the grid cell of each asset (or None)
+                   finv, #asset inventory layer (points)
+                   gvlay=None, #polygon grid
+                   gid=None,
+                   cid=None, #asset index field
+                   logger=None,
+                   ):
+        """
+        returns a series {cid: gid} (assets outside the grid are excluded)
+            or None for non-point assets (these could intersect multiple cells)
+            
+        regular (axis-aligned, equal sized) grids are resolved by arithmetic on the coordinates
+            otherwise candidates from a spatial index are tested
+            
+        cached on the finv and grid layers (so re-gridding the results of each risk run is cheap)
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log=logger.getChild('get_cindex')
+        if gvlay is None: gvlay = self.gvlay
+        if gid is None: gid=self.gid
+        if cid is None: cid=self.cid
+        
+        #=======================================================================
+        # check cache
+        #=======================================================================
+        def get_key(vlay):
+            sig = file_sig(vlay.source())
+            return vlay.id() if sig is None else sig
+        
+        key = (get_key(finv), cid, get_key(gvlay), gid)
+        if key in self.cindex_d:
+            return self.cindex_d[key]
+        
+        #=======================================================================
+        # precheck
+        #=======================================================================
+        if not (QgsWkbTypes.geometryType(finv.wkbType())==QgsWkbTypes.PointGeometry and 
+                QgsWkbTypes.isSingleType(finv.wkbType())):
+            log.warning('\'%s\' is not a (single) point layer.. using processing engine'%finv.name())
+            return None
+        
+        assert finv.crs().authid() == gvlay.crs().authid()
+        
+        #=======================================================================
+        # get coordinates
+        #=======================================================================
+        request = QgsFeatureRequest().setSubsetOfAttributes([cid], finv.fields())
+        
+        pt_l = [(feat[cid], feat.geometry().asPoint()) for feat in finv.getFeatures(request)
+             if not feat.geometry().isEmpty()]
+        
+        d = dict(pt_l)
+        if not len(d)==len(pt_l):
+            raise Error('%s has bad cid=\'%s\''%(finv.name(), cid))
+        
+        xy_ar = np.array([(pt.x(), pt.y()) for pt in d.values()]).reshape(-1,2)
+        acid_ix = pd.Index(list(d.keys()), name=cid)
+        
+        #grid cells
+        request = QgsFeatureRequest().setSubsetOfAttributes([gid], gvlay.fields())
+        gfeat_l = [feat for feat in gvlay.getFeatures(request)]
+        
+        gdf = pd.DataFrame([(feat[gid], feat.geometry().area()) + tuple(
+            getattr(feat.geometry().boundingBox(), attn)() for attn in ['xMinimum', 'yMinimum', 'xMaximum', 'yMaximum'])
+            for feat in gfeat_l], columns=[gid, 'area', 'xmin', 'ymin', 'xmax', 'ymax'])
+        
+        #=======================================================================
+        # regular grid
+        #=======================================================================
+        w_ar, h_ar = (gdf['xmax']-gdf['xmin']).values, (gdf['ymax']-gdf['ymin']).values
+        x0, y0 = gdf['xmin'].min(), gdf['ymin'].min()
+        
+        w, h = w_ar[0], h_ar[0]
+        
+        #tolerances relative to the cell size (rtol would scale w/ the projected coordinates)
+        xtol, ytol = 1e-6*w, 1e-6*h
+        
+        regular = (np.allclose(w_ar, w, rtol=0, atol=xtol) and np.allclose(h_ar, h, rtol=0, atol=ytol) and 
+                   np.allclose(gdf['area'], w_ar*h_ar, rtol=0, atol=1e-6*w*h))
+        if regular:
+            gdf['col'], gdf['row'] = np.round((gdf['xmin']-x0)/w), np.round((gdf['ymin']-y0)/h)
+            regular = (np.allclose(gdf['col']*w+x0, gdf['xmin'], rtol=0, atol=xtol) and 
+                       np.allclose(gdf['row']*h+y0, gdf['ymin'], rtol=0, atol=ytol))
+            
+        if regular:
+            adf = pd.DataFrame({'col':np.floor((xy_ar[:,0]-x0)/w), 'row':np.floor((xy_ar[:,1]-y0)/h)}, 
+                               index=acid_ix)
+            
+            #points on the max edge belong to the last column/row (like the intersects test)
+            for coln, ar, vmax, tol in [
+                ('col', xy_ar[:,0], gdf['xmax'].max(), xtol),
+                ('row', xy_ar[:,1], gdf['ymax'].max(), ytol)]:
+                
+                adf.loc[np.isclose(ar, vmax, rtol=0, atol=tol), coln] = gdf[coln].max()
+            
+            cindex = adf.reset_index().merge(gdf.loc[:, ['col', 'row', gid]], on=['col', 'row'], how='inner'
+                                     ).set_index(cid)[gid]
+            
+        #=======================================================================
+        # irregular
+        #=======================================================================
+        else:
+            sindex = QgsSpatialIndex()
+            geo_d = dict()
+            for feat in gfeat_l:
+                sindex.addFeature(feat)
+                
+                geo = feat.geometry() #keep a reference for the engine
+                geng = QgsGeometry.createGeometryEngine(geo.constGet())
+                geng.prepareGeometry()
+                geo_d[feat.id()] = (feat[gid], geo, geng)
+                
+            res_d = dict()
+            for acid, pt in d.items():
+                pgeo = QgsGeometry.fromPointXY(pt)
+                for gfid in sindex.intersects(pgeo.boundingBox()):
+                    gval, _, geng = geo_d[gfid]
+                    if geng.intersects(pgeo.constGet()):
+                        res_d[acid] = gval
+                        break
+                    
+            cindex = pd.Series(res_d, name=gid, dtype=gdf[gid].dtype)
+            
+        #=======================================================================
+        # wrap
+        #=======================================================================
+        cindex = cindex.rename(gid).sort_index()
+        cindex.index.name = cid
+        
+        log.info('assigned %i (of %i) assets to %i (of %i) cells (regular=%s)'%(
+            len(cindex), len(d), cindex.nunique(), len(gdf), regular))
+        
+        self.cindex_d[key] = cindex
+        return cindex
+    
     def downsamp_ares(self,#downsample a set of asset results to a grid layer
                       avlay_d, #{aresName:AssetResWorker
                       Gw, #grid worker
                       
                     res_fnl = ['ead'], #list of result fields to downsample
+                    
+                      finv=None, #asset inventory shared by the results layers (see gsamp_df())
 
                       rnm_d=dict(), #optional POST field name conversion. {old fieldName:new fieldName}
                       
@@ -219,7 +425,7 @@ class Gwrkr(Qcoms):
         gid=Gw.gid
  
         res_d = dict()
-        mdf = pd.DataFrame()
+        meta_d = dict()
         #=======================================================================
         # #loop and collect grid totals for each inventory
         #=======================================================================
@@ -234,12 +440,8 @@ class Gwrkr(Qcoms):
             """
             
             #sum on polys
-            rvlay, nfn_l = self.gsamp(avlay, res_fnl=res_fnl,
-                                      gid=gid, gvlay=gvlay, logger=log)
-            
-            #convert to frame
-            df = vlay_get_fdf(rvlay, logger=log).drop(['fid'], axis=1, errors='ignore').rename(
-                columns=rnm_d).set_index(gid).loc[:, res_fnl]
+            df = self.gsamp_df(avlay, res_fnl=res_fnl, gid=gid, gvlay=gvlay, finv=finv, logger=log
+                               ).rename(columns=rnm_d).loc[:, res_fnl]
                 
             #check it
             assert df.index.is_unique, aresName
@@ -250,13 +452,14 @@ class Gwrkr(Qcoms):
             res_d[aresName] = df.round(self.prec)
             
             #meta
-            mdf = mdf.append(df.sum().rename(aresName), verify_integrity=True)
+            meta_d[aresName] = df.sum()
 
         log.info('collected totals from %i layers'%len(res_d))
         
         #=======================================================================
         # #meta clean up
         #=======================================================================
+        mdf = pd.DataFrame.from_dict(meta_d, orient='index')
         mdf['gname'] = Gw.name
         mdf['gvlay_name'] = Gw.vlay.name()
         mdf.index.name='aresName'
@@ -289,34 +492,26 @@ class Gwrkr(Qcoms):
         # setup
         #======================================================================
         colns = aGres_df_d[list(aGres_df_d.keys())[0]].columns #just taking from first
-        #empty results container
-        rdf = pd.DataFrame(
-            index=vlay_get_fdf(gvlay, logger=log).set_index(gid, drop=True).index,
-            columns=colns).fillna(0)
-            
-
+        gindex = pd.Index(vlay_get_fdata(gvlay, fieldn=gid, fmt='ser', logger=log).values, name=gid)
+        
         #=======================================================================
-        # #loop each asset downsample and s um
+        # checks
         #=======================================================================
         for aresName, df in aGres_df_d.items():
             #check index compatability
-            s = set(df.index).difference(rdf.index)
+            s = set(df.index).difference(gindex)
             assert len(s)==0, aresName
             
-            #sum together
-            rdf1 = rdf.add(df, axis=0, fill_value=0)
-            
-            #check index again
-            assert np.array_equal(rdf1.index, rdf.index)
-            assert np.array_equal(rdf1.columns, rdf.columns)
+            assert np.array_equal(df.columns, colns), aresName
             
             #check summation logic
-            booldf = rdf1>=rdf
-            assert booldf.all().all()
-            
-            rdf = rdf1.round(self.prec) #clean and reset
+            assert not (df<0).any().any(), aresName
             
-            #add meta
+        #=======================================================================
+        # sum all the asset downsamples together
+        #=======================================================================
+        rdf = pd.concat(list(aGres_df_d.values()), axis=0).groupby(level=0).sum(
+            ).reindex(index=gindex, columns=colns).fillna(0).round(self.prec)
             
         #wrap
         log.info('totaled across %i asset layers on %i grids'%(
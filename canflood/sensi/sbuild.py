@@ -15,6 +15,7 @@ import numpy as np
  
 
 from hlpr.basic import view
+from hlpr.cache import file_hash
 
         
                      
@@ -64,9 +65,12 @@ class CandidateModel(SensiShared):
     def copy_datafiles(self, #copy over data files and update some parameters
                        cfPars_d=None, #{section:{valnm:value}}
                        out_dir=None, 
+                       store_dir=None, #directory of shared data files to link to (None=copy)
                        logger=None):
         """
-        
+        store_dir: each file is copied once to a content-addressed store
+            then linked into the candidate directory (see _link_datafile())
+            outputs replace (rather than write through) linked files (see ComWrkr.output_df())
         """
         #=======================================================================
         # defaults
@@ -109,18 +113,52 @@ class CandidateModel(SensiShared):
                         
                         #if os.path.sameopenfile(new_fp, fp):
                             pars_lib[section][valnm] = fp #this can happen on repeat clicks of compile
-                        else:
+                        elif store_dir is None:
+                            if os.path.islink(new_fp) or os.path.exists(new_fp): 
+                                os.remove(new_fp) #dont write through links from earlier builds
                             pars_lib[section][valnm] = shutil.copyfile(fp, new_fp)
+                        else:
+                            pars_lib[section][valnm] = self._link_datafile(fp, new_fp, store_dir)
                         
                         meta_d[valnm] = pars_lib[section][valnm] 
                     
         #=======================================================================
         # wrap
         #=======================================================================
-        log.info('copied %i data files to %s'%(
-            len(meta_d), out_dir))
+        log.info('%s %i data files to %s'%(
+            'copied' if store_dir is None else 'linked', len(meta_d), out_dir))
     
         return pars_lib
+    
+    def _link_datafile(self, #link a data file from the shared store
+                       fp, #source data file
+                       new_fp, #destination
+                       store_dir,
+                       ):
+        """
+        falls back to a symlink then a copy where hardlinks are not supported (e.g., across drives)
+        """
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        
+        #add to the store
+        store_fp = os.path.join(store_dir, file_hash(fp) + os.path.splitext(fp)[1])
+        if not os.path.exists(store_fp):
+            shutil.copyfile(fp, store_fp)
+            
+        #link it
+        if os.path.islink(new_fp) or os.path.exists(new_fp):
+            os.remove(new_fp)
+            
+        try:
+            os.link(store_fp, new_fp)
+        except OSError:
+            try:
+                os.symlink(os.path.abspath(store_fp), new_fp)
+            except OSError:
+                shutil.copyfile(store_fp, new_fp)
+                
+        return new_fp
                 
             
     
@@ -186,6 +224,7 @@ class SensiConstructor(SensiShared):
                          out_basedir = None, #directory where all the candidate models will be saved
  
                          copyDataFiles=True, #whether to copy over all datafiles
+                         linkDataFiles=False, #link the datafiles from a shared store (rather than copying)
                          absolute_fp=None, #status of the base control file (df_raw is always absolute)
                          ):
         
@@ -332,7 +371,8 @@ class SensiConstructor(SensiShared):
                 
                 #copy over all the data files
                 if copyDataFiles:
-                    pars_d3 = wrkr.copy_datafiles(cfPars_d=pars_d2)
+                    pars_d3 = wrkr.copy_datafiles(cfPars_d=pars_d2, 
+                        store_dir=os.path.join(out_basedir, '_store') if linkDataFiles else None)
                 else:
                     pars_d3 = pars_d2
                 
@@ -31,13 +31,14 @@ didn't make much use of other workers here
 #===============================================================================
 # imports----------
 #===============================================================================
-import os, datetime, pickle
+import os, datetime, pickle, configparser, traceback
 import pandas as pd
 import numpy as np
 
 from hlpr.logr import basic_logger
 
 from hlpr.basic import view, Error
+from hlpr.cache import file_hash
 import hlpr.plot
 
 
@@ -139,12 +140,16 @@ class CandidateModel(Shared):
                 inher_d = {},
                 cf_fp='',
                 logger=None,
+                memo_d=None, #{stage key: results} shared across candidates. see get_stage_key()
+                data_store=None, #{key: parsed inputs} shared across candidates. see Model.load_df_ctrl()
                  **kwargs):
         
         
         inher_d = {**inher_d, #add all thosefrom parents 
-                        **{'CandidateModel':['out_dir']}, 
+                        **{'CandidateModel':['out_dir', 'data_store']}, 
                         }
+        
+        self.data_store=data_store #passed to the model workers
 
         super().__init__(inher_d=inher_d,logger=logger,
                          **kwargs) #Qcoms -> ComWrkr
@@ -156,6 +161,7 @@ class CandidateModel(Shared):
         #=======================================================================
         assert os.path.exists(cf_fp)
         self.cf_fp=cf_fp
+        self.memo_d=memo_d
         
         self.logger.debug('CandidateModel.__init__ finished')
 
@@ -237,15 +243,37 @@ class CandidateModel(Shared):
         # run damage worker
         #=======================================================================
         initkwargs = self._get_inher_atts()
-        log.info('Dmg2')
-        with Dmg2(cf_fp=cf_fp, logger=log,  **initkwargs) as wrkr:
-            wrkr.setup()
-            
-            cres_df = wrkr.run(**rkwarks_d['Dmg2'])
+        
+        #check for an earlier candidate w/ the same damage inputs
+        if not self.memo_d is None:
+            dkey = get_stage_key(Dmg2, cf_fp, rkwargs=rkwarks_d['Dmg2'])
+            memo = self.memo_d.get(dkey, None)
+        else:
+            memo = None
+        
+        if memo is None:
+            log.info('Dmg2')
+            with Dmg2(cf_fp=cf_fp, logger=log,  **initkwargs) as wrkr:
+                wrkr.setup()
+                
+                cres_df = wrkr.run(**rkwarks_d['Dmg2'])
+                
+                if write:
+                    out_fp = wrkr.output_cdmg()
+                    wrkr.update_cf(out_fp=out_fp, cf_fp=cf_fp)
+                    
+                if not self.memo_d is None:
+                    self.memo_d[dkey] = {'dmgs':cres_df.copy(), 'impact_units':wrkr.impact_units}
+        else:
+            log.info('Dmg2 inputs unchanged... re-using damages')
+            cres_df = memo['dmgs'].copy()
             
             if write:
-                out_fp = wrkr.output_cdmg()
-                wrkr.update_cf(out_fp=out_fp, cf_fp=cf_fp)
+                """Risk2 reads the damages from the control file"""
+                with Dmg2(cf_fp=cf_fp, logger=log,  **initkwargs) as wrkr:
+                    wrkr.cres_df, wrkr.impact_units = cres_df, memo['impact_units']
+                    out_fp = wrkr.output_cdmg()
+                    wrkr.update_cf(out_fp=out_fp, cf_fp=cf_fp)
                 
         #=======================================================================
         # run risk worker
@@ -315,8 +343,106 @@ class SensiSessionComs(Shared):
         
         self.resname = '%s_%s_%s'%(self.name, self.tag,  datetime.datetime.now().strftime('%m%d'))
     
+def get_stage_key( #identify the control file inputs of one model stage
+        modelClass, #model worker (e.g., Dmg2)
+        cf_fp, #candidate control file
+        rkwargs={}, #kwargs passed to the worker's run()
+        skip_l = ['name'], #parameters which dont change the results
+        ):
+    """
+    only the parameters declared in the worker's expectation handles (exp_pars_md and exp_pars_op)
+        so candidates which only vary parameters of later stages (e.g., Risk2 'ltail')
+        share the same key
+        
+    filepaths are keyed by their contents (so copies match)
+    """
+    pars = configparser.ConfigParser(inline_comment_prefixes='#')
+    _ = pars.read(cf_fp)
+    
+    base_dir = os.path.dirname(cf_fp) #for relative filepaths
+    
+    d = dict()
+    for exp_d in [modelClass.exp_pars_md, modelClass.exp_pars_op]:
+        for sectName, vars_d in exp_d.items():
+            for varName in vars_d.keys():
+                if varName in skip_l: continue
+                
+                val = pars.get(sectName, varName, fallback=None)
+                
+                if sectName.endswith('_fps') and not val in [None, '']:
+                    fp = val if os.path.exists(val) else os.path.join(base_dir, val)
+                    val = file_hash(fp)
+                    
+                d['%s.%s'%(sectName, varName)] = val
+                
+    return '%s(%s; %s)'%(modelClass.__name__, sorted(d.items()), sorted(rkwargs.items()))
+    
+def _run_candidate( #execute a single candidate (for the process pool)
+        mtag, 
+        cf_fp,
+        modLevel,
+        rkwargs,
+        out_dir, #candidate output directory (also receives the log file)
+        initKwargs,
+        write,
+        ):
+    """
+    module level so it can be sent to the workers
+    
+    each candidate logs to its own file '<out_dir>/<mtag>.log'
+    
+    returns (res_d, error message)
+        failures are returned (not raised) so the batch can continue
+    """
+    import logging
+    
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    
+    #===========================================================================
+    # setup the logger
+    #===========================================================================
+    logger = logging.getLogger('sensi.%s'%mtag)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    
+    handler = logging.FileHandler(os.path.join(out_dir, '%s.log'%mtag), mode='w')
+    handler.setFormatter(logging.Formatter('%(asctime)s.%(levelname)s.%(name)s:  %(message)s'))
+    logger.addHandler(handler)
+    
+    #===========================================================================
+    # execute
+    #===========================================================================
+    try:
+        with CandidateModel(name=mtag, logger=logger, cf_fp=cf_fp, write=write,
+                            out_dir=out_dir, **initKwargs) as cmod:
+            
+            res_d = getattr(cmod, modLevel)(**rkwargs)
+            res_d['cf_fp']=cf_fp
+            
+        return res_d, None
+    
+    except Exception as e:
+        logger.error('failed w/ \n%s'%traceback.format_exc())
+        return None, '%s: %s'%(type(e).__name__, e)
+    
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    
 class SensiSessRunner(SensiSessionComs): #running a sensitivity session
     
+    def __init__(self,
+                 max_workers=1, #processes for running candidates. see run_batch()
+                 use_memo=True, #re-use stage results between candidates w/ the same inputs
+                 share_data=True, #load each input file once for all the candidates (serial runs only)
+                 **kwargs):
+        
+        super().__init__(**kwargs)
+        
+        self.max_workers=max_workers
+        self.memo_d = dict() if use_memo else None #{stage key: results}. see get_stage_key()
+        self.data_store = dict() if share_data else None #{key: parsed inputs}. see Model.load_df_ctrl()
  
     def run_batch(self, #run a batch of sensitivity 
                cf_d, #{mtag, controlfile}
@@ -324,12 +450,25 @@ class SensiSessRunner(SensiSessionComs): #running a sensitivity session
                rkwargs={}, #OPTIONAL model runner kwargs
                out_dir=None,
                baseName=None, #for checks and some reeporting
+               max_workers=None, #>1: run candidates on a process pool
             ):
         """
         only model rountes (e.g., dmg, risk)
             all build routines should be handled by the UI
             
         run a set of control files?
+        
+        max_workers>1 runs each candidate in its own process (see _run_batch_pool())
+            not for use within QGIS (the plugin runs the serial loop)
+            
+        on either path, failed candidates are logged, stored in self.fail_d, and left out of res_lib
+            (the batch fails if the baseName candidate fails)
+            
+        the serial loop shares memo_d between the candidates
+            so those w/ the same damage inputs as an earlier candidate skip Dmg2 (see CandidateModel.L2)
+            
+        and data_store, so each input file is only parsed once
+            the pool path shares neither (each process parses its own inputs)
         """
  
         #======================================================================
@@ -338,6 +477,7 @@ class SensiSessRunner(SensiSessionComs): #running a sensitivity session
         if out_dir is None: out_dir=self.out_dir
         if baseName is None: baseName=self.baseName
         if modLevel is None: modLevel=self.modLevel
+        if max_workers is None: max_workers=self.max_workers
         log = self.logger.getChild('r')
         log.info('on %i: %s'%(len(cf_d), list(cf_d.keys())))
         start =  datetime.datetime.now()
@@ -349,27 +489,52 @@ class SensiSessRunner(SensiSessionComs): #running a sensitivity session
         #=======================================================================
         initKwargs = self._get_inher_atts()
         res_lib = dict()
+        self.fail_d = dict() #{mtag: error message}
         self.feedback.upd_prog(10)
-        for i, (mtag, cf_fp) in enumerate(cf_d.items()):
-            log.info('%i/%i on %s from %s'%(i+1, len(cf_d), mtag, os.path.basename(cf_fp)))
-            
+        
+        if max_workers>1:
+            res_lib = self._run_batch_pool(cf_d, modLevel=modLevel, rkwargs=rkwargs,
+                                           out_dir=out_dir, initKwargs=initKwargs,
+                                           max_workers=max_workers, logger=log)
             
-            with CandidateModel(name=mtag, logger=log.getChild(str(i)), cf_fp=cf_fp,
-                                write=self.write, #sometimes we pass this to children.. sometimes no
-                                out_dir = os.path.join(out_dir, mtag), 
-                                **initKwargs) as cmod:
+        else:
+            for i, (mtag, cf_fp) in enumerate(cf_d.items()):
+                log.info('%i/%i on %s from %s'%(i+1, len(cf_d), mtag, os.path.basename(cf_fp)))
                 
-                f = getattr(cmod, modLevel)
-                log.info('running \'%s.%s\' \n\n'%(mtag, modLevel))
-                res_lib[mtag] = f(**rkwargs)
-                res_lib[mtag]['cf_fp']=cf_fp
-                
-            #wrap
-            log.debug('finished %s'%mtag)
-            self.feedback.upd_prog(10+80*(i/len(cf_d)))
+                try:
+                    with CandidateModel(name=mtag, logger=log.getChild(str(i)), cf_fp=cf_fp,
+                                        write=self.write, #sometimes we pass this to children.. sometimes no
+                                        out_dir = os.path.join(out_dir, mtag), 
+                                        memo_d=self.memo_d, data_store=self.data_store,
+                                        **initKwargs) as cmod:
+                        
+                        f = getattr(cmod, modLevel)
+                        log.info('running \'%s.%s\' \n\n'%(mtag, modLevel))
+                        res_d = f(**rkwargs)
+                        res_d['cf_fp']=cf_fp
+                        
+                except Exception as e: #same isolation as _run_candidate()
+                    log.error('%i/%i \'%s\' failed w/ \n%s'%(
+                        i+1, len(cf_d), mtag, traceback.format_exc()))
+                    self.fail_d[mtag] = '%s: %s'%(type(e).__name__, e)
+                    
+                else:
+                    res_lib[mtag] = res_d
+                    
+                #wrap
+                log.debug('finished %s'%mtag)
+                self.feedback.upd_prog(10+80*(i/len(cf_d)))
             
+        #=======================================================================
+        # failures
+        #=======================================================================
+        if len(self.fail_d)>0:
+            log.warning('%i (of %i) candidates failed: %s'%(
+                len(self.fail_d), len(cf_d), list(self.fail_d.keys())))
+            
+        if baseName in self.fail_d:
+            raise Error('base candidate \'%s\' failed w/ %s'%(baseName, self.fail_d[baseName]))
 
-        
         #=======================================================================
         # get basic stats
         #=======================================================================
@@ -398,6 +563,64 @@ class SensiSessRunner(SensiSessionComs): #running a sensitivity session
         
         return res_lib, meta_d
     
+    def _run_batch_pool(self, #run the candidates on a process pool
+                        cf_d, #{mtag, controlfile}
+                        modLevel='L1',
+                        rkwargs={},
+                        out_dir=None,
+                        initKwargs={},
+                        max_workers=2,
+                        logger=None,
+                        ):
+        """
+        each candidate is independent (own control file and out_dir)
+        
+        failed candidates are logged, stored in self.fail_d, and left out of res_lib
+            see '<out_dir>/<mtag>/<mtag>.log' for the details
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('pool')
+        
+        #matplotlib modules cant be sent to the workers... let each candidate init its own
+        initKwargs = {k:v for k,v in initKwargs.items() if not k=='init_plt_d'}
+        
+        log.info('on %i candidates w/ %i workers'%(len(cf_d), max_workers))
+        
+        #=======================================================================
+        # execute
+        #=======================================================================
+        res_d = dict()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fut_d = {executor.submit(_run_candidate, mtag, cf_fp, modLevel, rkwargs,
+                                     os.path.join(out_dir, mtag), initKwargs, self.write):mtag
+                     for mtag, cf_fp in cf_d.items()}
+            
+            for i, fut in enumerate(as_completed(fut_d)):
+                mtag = fut_d[fut]
+                try:
+                    res_d[mtag], err = fut.result()
+                except Exception as e: #e.g., worker died
+                    res_d[mtag], err = None, '%s: %s'%(type(e).__name__, e)
+                
+                if err is None:
+                    log.info('%i/%i finished %s'%(i+1, len(cf_d), mtag))
+                else:
+                    log.error('%i/%i \'%s\' failed w/ %s'%(i+1, len(cf_d), mtag, err))
+                    self.fail_d[mtag] = err
+                    
+                self.feedback.upd_prog(10+80*((i+1)/len(cf_d)))
+                
+        #=======================================================================
+        # wrap
+        #=======================================================================
+        #keep the order of the suite
+        return {mtag:res_d[mtag] for mtag in cf_d.keys() if not res_d[mtag] is None}
+    
     def write_pick(self, #write the results to a pickel for later
                    res_lib=None,
                    meta_d=None,
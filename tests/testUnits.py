@@ -0,0 +1,359 @@
+'''
+unit tests for the array/vectorized engines
+    each compares the fast path against the legacy path it replaced
+    on small random data (no workflows or test pickles)
+
+run from the plugin directory (like testAll.py):
+    python -m unittest tests.testUnits
+'''
+
+#===============================================================================
+# imports----------
+#===============================================================================
+import unittest, tempfile, os, shutil
+
+import pandas as pd
+import numpy as np
+
+
+#===============================================================================
+# helpers
+#===============================================================================
+def get_rng(seed=17):
+    return np.random.default_rng(seed)
+
+def has_qgis(): #tests needing a QgsApplication and processing
+    try:
+        import qgis.core
+    except ImportError:
+        return False
+    return True
+
+#===============================================================================
+# UNIT TESTS--------
+#===============================================================================
+class Test_indeEV(unittest.TestCase): #model.riskcom.RiskModel.ev_multis(event_rels='indep')
+
+    def setUp(self):
+        from model.riskcom import RiskModel
+
+        class RMwrkr(RiskModel):
+            def __init__(self):pass
+
+        self.wrkr = RMwrkr()
+        self.wrkr.prec=6
+
+    def test_closed_form(self):
+        """_get_indeEV_ar() vs scenario enumeration of _get_indeEV()"""
+        rng = get_rng()
+
+        for n in [2,3,5]: #failure events
+            pF_ar = rng.uniform(0.0, 0.9, size=(20, n))
+            cF_ar = rng.uniform(0.0, 100, size=(20, n))
+            cF_ar[:, 0] = cF_ar[:, 1] #ties
+            pNF_ar = rng.uniform(0.0, 1.0, size=20)
+            cNF_ar = rng.uniform(0.0, 50, size=20)
+
+            res_ar = self.wrkr._get_indeEV_ar(pF_ar, cF_ar, pNF_ar, cNF_ar)
+
+            for i in range(len(res_ar)):
+                inde_df = pd.DataFrame({
+                    'prob':np.append(pF_ar[i], pNF_ar[i]),
+                    'consq':np.append(cF_ar[i], cNF_ar[i]),
+                    'mutEx':[False]*n + [True]})
+
+                self.assertAlmostEqual(res_ar[i], self.wrkr._get_indeEV(inde_df), places=8)
+
+class Test_resolve_samps(unittest.TestCase): #build.lisamp.LikeSampler.resolve_samps()
+
+    def setUp(self):
+        from build.lisamp import LikeSampler
+
+        class LSwrkr(LikeSampler):
+            def __init__(self):pass
+
+        self.wrkr = LSwrkr()
+        self.wrkr.cid='xid'
+        
+        import logging
+        self.wrkr.logger = logging.getLogger('test')
+
+        #1 row per asset-polygon intersect (some assets w/ multiple samples)
+        rng = get_rng()
+        self.sdf = pd.DataFrame({
+            'xid':rng.integers(0, 30, size=100),
+            'p_fail':rng.choice([0.0, 0.1, 0.25, 0.5, 0.9, 1.0], size=100)})
+
+    def test_indep(self):
+        """grouped complement product vs union_probabilities() on each asset"""
+        res_ser = self.wrkr.resolve_samps(self.sdf, lfield='p_fail', event_rels='indep')
+
+        chk_ser = self.sdf.groupby('xid')['p_fail'].apply(
+            lambda s: self.wrkr.union_probabilities(s.tolist()))
+
+        self.assertTrue(np.allclose(res_ser.sort_index(), chk_ser.sort_index()))
+
+    def test_mutEx(self):
+        res_ser = self.wrkr.resolve_samps(self.sdf, lfield='p_fail', event_rels='mutEx')
+
+        chk_ser = self.sdf.groupby('xid')['p_fail'].sum()
+
+        self.assertTrue(np.allclose(res_ser.sort_index(), chk_ser.sort_index()))
+class Test_AttriMat(unittest.TestCase): #model.modcom.AttriMat vs the dense attribution frame
+    
+    def setUp(self):
+        from model.modcom import AttriMat
+        
+        rng = get_rng()
+        mdex = pd.MultiIndex.from_product([['e3', 'e1', 'e2'], ['MS', 'CS', 'BS']], 
+                                          names=['rEventName', 'nestID'])
+        
+        ar = rng.uniform(size=(8, len(mdex)))
+        ar[1, 2] = np.nan
+        self.dxcol = pd.DataFrame(ar, index=pd.Index(np.arange(8), name='xid'), columns=mdex)
+        
+        self.am = AttriMat.from_dxcol(self.dxcol)
+        
+        #impacts per event
+        self.idf = pd.DataFrame(rng.uniform(1, 100, size=(8, 3)), index=self.dxcol.index, 
+                                columns=pd.Index(['e1', 'e2', 'e3'], name='rEventName'))
+        
+    def assertFrameClose(self, df, chk_df):
+        self.assertEqual(df.columns.tolist(), chk_df.columns.tolist())
+        self.assertEqual(df.columns.names, chk_df.columns.names)
+        self.assertTrue(df.index.equals(chk_df.index))
+        self.assertTrue(np.allclose(df.values, chk_df.values, rtol=1e-6, equal_nan=True)) #float32
+        
+    def test_roundtrip(self):
+        self.assertEqual(self.am.ar.dtype, np.float32)
+        self.assertFrameClose(self.am.to_dxcol(), self.dxcol)
+        
+    def test_sort(self):
+        self.assertFrameClose(self.am.copy().sort().to_dxcol(), self.dxcol.sort_index(axis=1))
+        
+    def test_slice(self):
+        lvals_d = {'rEventName':['e1', 'e3'], 'nestID':['CS', 'BS']}
+        
+        bx = np.logical_and.reduce([self.dxcol.columns.get_level_values(k).isin(v) for k,v in lvals_d.items()])
+        
+        self.assertFrameClose(self.am.slice(lvals_d).to_dxcol(), self.dxcol.loc[:, bx])
+        
+    def test_multiply(self):
+        self.assertFrameClose(self.am.multiply(self.idf, 'rEventName').to_dxcol(), 
+                              self.dxcol.multiply(self.idf, level='rEventName'))
+        
+    def test_divide(self):
+        self.assertFrameClose(self.am.divide(self.idf, 'rEventName').to_dxcol(), 
+                              self.dxcol.divide(self.idf, level='rEventName'))
+        
+    def test_sum_cols(self):
+        am = self.am.copy()
+        am.ar[np.isnan(am.ar)] = 0.0
+        dxcol = self.dxcol.fillna(0.0)
+        
+        for lvlNames in [['rEventName'], ['rEventName', 'nestID']]:
+            res_ser = am.sum_cols(lvlNames)
+            chk_ser = dxcol.sum(axis=0).groupby(level=lvlNames).sum()
+            
+            self.assertTrue(np.allclose(res_ser.values, chk_ser.values, rtol=1e-6))
+            self.assertEqual(res_ser.index.tolist(), chk_ser.index.tolist())
+            
+    def test_sum_level(self):
+        chk_df = self.dxcol.T.groupby(level='rEventName').sum(min_count=3).T #nulls propagate
+        chk_df.columns.name='rEventName'
+        
+        self.assertFrameClose(self.am.sum_level('rEventName'), chk_df)
+
+class Test_densify_lines(unittest.TestCase): #build.rsamp.Rsamp._densify_lines()
+    
+    def setUp(self):
+        from build.rsamp import Rsamp
+        self.Rsamp = Rsamp
+        
+    def get_pts(self, #reference points by walking each line (like native:pointsalonglines)
+                line_l, #[[(x, y), ...] per line]
+                dist):
+        lbl_l, xy_l = list(), list()
+        for i, line in enumerate(line_l):
+            ar = np.array(line, dtype=float)
+            slen_ar = np.hypot(*np.diff(ar, axis=0).T)
+            
+            d = 0.0
+            while d <= slen_ar.sum() + 1e-9:
+                #find the segment
+                k, d0 = 0, 0.0
+                while k < len(slen_ar)-1 and d0 + slen_ar[k] < d:
+                    d0 += slen_ar[k]
+                    k += 1
+                    
+                t = 0.0 if slen_ar[k]==0 else min((d-d0)/slen_ar[k], 1.0)
+                xy_l.append(ar[k] + t*(ar[k+1]-ar[k]))
+                lbl_l.append(i)
+                d += dist
+                
+        return np.array(lbl_l, dtype=int), np.array(xy_l).reshape(-1, 2)
+    
+    def get_segs(self, line_l):
+        lbl_l, p0_l, p1_l = list(), list(), list()
+        for i, line in enumerate(line_l):
+            for p0, p1 in zip(line[:-1], line[1:]):
+                lbl_l.append(i)
+                p0_l.append(p0)
+                p1_l.append(p1)
+                
+        return np.array(lbl_l, dtype=int), np.array(p0_l, dtype=float), np.array(p1_l, dtype=float)
+        
+    def test_lines(self):
+        rng = get_rng()
+        line_l = [
+            [(0, 0), (10, 0)], #exact multiple
+            [(0, 0), (3, 4), (3, 9.5)], #bends
+            [(5, 5), (5.2, 5)], #shorter than the spacing
+            [(1, 1), (1, 1), (4, 1)], #zero length segment
+            rng.uniform(0, 50, size=(6, 2)).tolist(),
+            ]
+        
+        for dist in [1.0, 0.7, 2.5]:
+            lbl_v, xy_ar = self.Rsamp._densify_lines(self.get_segs(line_l), dist, len(line_l))
+            chk_lbl, chk_xy = self.get_pts(line_l, dist)
+            
+            self.assertEqual(lbl_v.tolist(), chk_lbl.tolist(), msg='dist=%.2f'%dist)
+            self.assertTrue(np.allclose(xy_ar, chk_xy), msg='dist=%.2f'%dist)
+            
+    def test_empty(self):
+        seg_t = (np.array([], dtype=int), np.empty((0, 2)), np.empty((0, 2)))
+        
+        lbl_v, xy_ar = self.Rsamp._densify_lines(seg_t, 1.0, 3)
+        self.assertEqual(len(lbl_v), 0)
+        self.assertEqual(xy_ar.shape, (0, 2))
+
+class Test_SampCache(unittest.TestCase): #hlpr.cache.SampCache
+    
+    def setUp(self):
+        from hlpr.cache import SampCache
+        
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = SampCache(os.path.join(self.temp_dir, 'cache'))
+        
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        
+    def test_roundtrip(self):
+        rng = get_rng()
+        for ser in [
+            pd.Series(rng.uniform(size=10), index=pd.Index(np.arange(10), name='xid'), name='wsl_0100'),
+            pd.Series(rng.uniform(size=3), index=pd.Index(['a', 'b', 'c'], name='xid'), name='wsl_0200'),
+            pd.Series([0.1, np.nan], index=[3, 7], name='e1'), #nulls and unnamed index
+            ]:
+            key = self.cache.get_key(name=ser.name, finv='abc')
+            self.assertTrue(self.cache.put(key, ser))
+            
+            res_ser = self.cache.get(key)
+            self.assertEqual(res_ser.name, ser.name)
+            self.assertEqual(res_ser.index.name, ser.index.name)
+            self.assertEqual(res_ser.index.tolist(), ser.index.tolist())
+            self.assertTrue(np.allclose(res_ser, ser, equal_nan=True))
+            
+    def test_keys(self):
+        key = self.cache.get_key(rlay=('fp', 1, 2), cid='xid')
+        self.assertEqual(key, self.cache.get_key(cid='xid', rlay=('fp', 1, 2))) #order independent
+        self.assertNotEqual(key, self.cache.get_key(rlay=('fp', 1, 3), cid='xid'))
+        
+        self.assertIsNone(self.cache.get(key)) #miss
+        
+    def test_corrupt(self):
+        key = self.cache.get_key(name='bad')
+        with open(self.cache._get_fp(key), 'wb') as f:
+            f.write(b'not an npz')
+            
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache._get_fp(key))) #removed
+        
+    def test_evict(self):
+        ser = pd.Series(np.arange(100, dtype=float), name='wsl')
+        key_l = [self.cache.get_key(i=i) for i in range(5)]
+        for i, key in enumerate(key_l):
+            self.cache.put(key, ser)
+            fp = self.cache._get_fp(key)
+            os.utime(fp, (i, i)) #oldest first
+        
+        size = os.path.getsize(fp)
+        self.assertEqual(self.cache.evict(max_size=size*2), 3)
+        
+        self.assertEqual([self.cache.get(key) is None for key in key_l], [True]*3+[False]*2)
+        
+        self.cache.clear()
+        self.assertEqual(len(os.listdir(self.cache.cache_dir)), 0)
+
+@unittest.skipUnless(has_qgis(), 'needs qgis')
+class Test_samp_zonal(unittest.TestCase): #build.rsamp.Rsamp._samp_zonal_ar()
+    
+    stats_l = ['Count', 'Sum', 'Mean', 'Min', 'Max']
+    
+    @classmethod
+    def setUpClass(cls): #only init qgis once
+        from osgeo import gdal
+        from build.rsamp import Rsamp
+        
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.wrkr = Rsamp(out_dir=cls.temp_dir, crsid='EPSG:3857')
+        
+        #10 x 10 raster w/ 1m pixels and some nodata
+        ar = get_rng().uniform(0, 5, size=(10, 10))
+        ar[2, 3] = -9999
+        
+        cls.rfp = os.path.join(cls.temp_dir, 'wsl.tif')
+        ds = gdal.GetDriverByName('GTiff').Create(cls.rfp, 10, 10, 1, gdal.GDT_Float32)
+        ds.SetGeoTransform((0.0, 1.0, 0, 10.0, 0, -1.0))
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(-9999)
+        band.WriteArray(ar)
+        ds = None
+        
+    @classmethod
+    def tearDownClass(cls):
+        cls.wrkr.mstore.removeAllMapLayers()
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        
+    def test_subpixel(self):
+        """sub-pixel and straddling polygons vs 'native:zonalstatisticsfb'"""
+        import processing
+        from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeature, QgsGeometry
+        
+        rlay = QgsRasterLayer(self.rfp, 'wsl')
+        
+        vlay = QgsVectorLayer('Polygon?crs=EPSG:3857', 'finv', 'memory')
+        feats_l = list()
+        for wkt in [
+            'POLYGON((1.2 1.2, 1.6 1.2, 1.6 1.6, 1.2 1.6, 1.2 1.2))', #inside 1 pixel (no centers)
+            'POLYGON((2.7 2.7, 3.4 2.7, 3.4 3.3, 2.7 3.3, 2.7 2.7))', #straddles 4 pixels
+            'POLYGON((3.2 7.2, 3.8 7.2, 3.8 7.8, 3.2 7.8, 3.2 7.2))', #on the nodata pixel
+            'POLYGON((5.1 5.1, 6.9 5.1, 6.9 5.9, 5.1 5.9, 5.1 5.1))', #1 pixel center
+            'POLYGON((6.1 0.1, 9.9 0.1, 9.9 3.9, 6.1 3.9, 6.1 0.1))', #many centers
+            ]:
+            feat = QgsFeature()
+            feat.setGeometry(QgsGeometry.fromWkt(wkt))
+            feats_l.append(feat)
+            
+        vlay.dataProvider().addFeatures(feats_l)
+        
+        #array engine
+        fid_l, res_d = self.wrkr._samp_zonal_ar(vlay, [rlay], stats_l=self.stats_l)
+        
+        #processing
+        ofl = processing.run('native:zonalstatisticsfb', {
+            'INPUT':vlay, 'INPUT_RASTER':rlay, 'RASTER_BAND':1, 'COLUMN_PREFIX':'s_',
+            'STATISTICS':[self.wrkr.psmp_codes[k] for k in self.stats_l],
+            'OUTPUT':'TEMPORARY_OUTPUT'})['OUTPUT']
+        
+        chk_l = [feat.attributes() for feat in ofl.getFeatures()]
+        
+        for j, stat in enumerate(self.stats_l):
+            chk_ar = np.array([np.nan if e[j] is None else e[j] for e in chk_l], dtype=float)
+            
+            self.assertTrue(np.allclose(res_d[stat][:, 0], chk_ar, equal_nan=True),
+                            msg='%s mismatch\n    %s\n    %s'%(stat, res_d[stat][:, 0], chk_ar))
+        
+        
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -132,6 +132,9 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
         'compare':'results',
         }
     
+    #toolboxes across all the assetModels.. run after the chains (see Runner._run_all_pool())
+    post_tools = ('compare',)
+    
     
 
 
@@ -1019,6 +1022,16 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
             #execute setup
             wrkr._setup()
 
+            if not wrkr.chunk_size is None: #stream blocks to file (see Dmg2.run_chunks())
+                assert not self.attriMode, 'attribution not supported on chunked runs'
+                ttl_ser = wrkr.run_chunks(write_bdmg=output_bdmg, write_smry=output_bdmg,
+                                    set_impactUnits=set_impactUnits)
+                if upd_cf: 
+                    wrkr.update_cf()
+                    
+                meta_d[atag] = {'dmg_ttl':ttl_ser.sum(), 'mem_peak':wrkr.mem_peak}
+                continue
+
             res_df = wrkr.run(set_impactUnits=set_impactUnits)
             
 
@@ -1320,6 +1333,7 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
             writePars = True, #whether to save the control parameters to file
             
             bool_coln=None, #control column name for asset flow (see get_pars())
+            atag_l=None, #optional assetModels to limit the run to (see Runner._run_all_pool())
             
             logger=None,
             **kwargs, #passed to 'tools_xxx()' function
@@ -1355,6 +1369,9 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
         
             #extract pars
             tag_d = self.get_pars_build(rel_d = pars_d.pop('rel_d'), logger=log)
+            
+            if not atag_l is None:
+                tag_d = {k:v for k,v in tag_d.items() if k in atag_l}
 
             # construct models
             tool_od, meta_d = self.tools_build(tag_d, pars_d=pars_d, **kwargs)
@@ -1368,6 +1385,9 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
                 control_df = self.load_control()
 
             runPars_d = self.get_pars(control_df=control_df, bool_coln=bool_coln)
+            
+            if not atag_l is None:
+                runPars_d = {k:v for k,v in runPars_d.items() if k in atag_l}
         
             #execute run
             if len(runPars_d)==0:
@@ -1376,7 +1396,8 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
                 meta_d = dict()
             else:
                 #get the runner
-                f = getattr(self, fName)            
+                f = getattr(self, fName)
+                
                 tool_od, meta_d = f(runPars_d, logger=log, **kwargs)
     
         #===========================================================================
@@ -1402,6 +1423,25 @@ class CFbatch(Runner): #handerl of batch CanFlood runs (build, model, results)
         return tool_od, pars_df
     
     
+    def get_atags(self, #assetModel tags for the chains of run_all() (see Runner._run_all_pool())
+                  toolNames,
+                  logger=None):
+        if logger is None: logger=self.logger
+        log = logger.getChild('get_atags')
+        
+        #from the build control
+        if 'build' in toolNames:
+            self.toolName='build'
+            _ = self.load_buildControl(self.pars_d['buildControl_fp'])
+            atag_l = list(self.get_pars_build(rel_d = self.pars_d['rel_d'], logger=log).keys())
+            
+        #from the batch control (of a previous build)
+        else:
+            atag_l = self.load_control().index.tolist()
+            
+        log.info('got %i assetModels'%len(atag_l))
+        return atag_l
+    
     #===========================================================================
     # LINKED TOOL HANDLER-------
     #===========================================================================
@@ -10,6 +10,9 @@ common methods for runner scripts
 import os, datetime
 from qgis.core import QgsCoordinateReferenceSystem
 import pandas as pd
+import numpy as np
+
+from hlpr.exceptions import Error
 
 from hlpr.logr import basic_logger
 mod_logger = basic_logger() 
@@ -51,6 +54,8 @@ class Runner(object): #base worker for runner scripts
     
     smry_d = None #default risk model results summary parameters 
         #{coln: dataFrame method to summarize with}
+        
+    post_tools = () #toolNames that work across all the assetModels. see _run_all_pool()
 
     def __init__(self,
              #project tool parameters
@@ -61,6 +66,7 @@ class Runner(object): #base worker for runner scripts
              #run controls
 
              plot = True, #whether to execute plot tools
+             max_workers = 1, #>1: run the tool chain of each assetModel on a process pool
              write_vlay = True, #whether to write vlays to file
              
              
@@ -99,6 +105,7 @@ class Runner(object): #base worker for runner scripts
         self.today_str = datetime.datetime.now().strftime('%Y-%m-%d %H.%M.%S')
         self.write_vlay=write_vlay
         self.scenarioName=scenarioName
+        self.max_workers=max_workers
         
         for k,v in kwargs.items():
             setattr(self, k, v)
@@ -167,6 +174,12 @@ class Runner(object): #base worker for runner scripts
         return child
 
     
+    def __getstate__(self): #for sending to pool workers
+        """qgis handles stay with the parent... workers init their own (if needed)"""
+        d = self.__dict__.copy()
+        d['qinit'] = False
+        return d
+    
     #===========================================================================
     # RUNNERS-------
     #===========================================================================
@@ -175,6 +188,7 @@ class Runner(object): #base worker for runner scripts
 
             logger=None,
             tool_kwargs = {}, #oprtional kwargs to pass onto each tool
+            max_workers=None, #>1: run the tools of each assetModel in its own process (see _run_all_pool())
 
                   ):
         
@@ -184,22 +198,65 @@ class Runner(object): #base worker for runner scripts
 
         if logger is None: logger=self.logger
         log = logger.getChild('all')
+        if max_workers is None: max_workers=self.max_workers
     
         if toolNames is None:
             toolNames = self.hndl_lib.keys()
+        toolNames = list(toolNames)
         #=======================================================================
         # loop and run each toolbox
         #=======================================================================
-        log.info('running %i toolboxes'%len(self.hndl_lib))
-        pars_df = None #ignored by build
+        log.info('running %i toolboxes'%len(toolNames))
+        
+        if max_workers>1:
+            pars_df, meta_d = self._run_all_pool(toolNames, tool_kwargs=tool_kwargs, 
+                                                 max_workers=max_workers, logger=log)
+        else:
+            pars_df, meta_d = self._run_tools(toolNames, tool_kwargs=tool_kwargs, logger=log)
+
+        #=======================================================================
+        # write the run summary
+        #=======================================================================
+        if not pars_df is None:
+            self.write_pars(df=pars_df)
+            
+        self.write_parsd()
+        
+        #=======================================================================
+        # wrap
+        #=======================================================================
+        for toolName, msg in meta_d.items():
+            log.info('%s:    %s'%(toolName, msg))
+        
+        return self.out_dir, pars_df
+    
+    def _run_tools(self, #run a sequence of toolboxes (each on all its assetModels)
+                   toolNames,
+                   tool_kwargs={},
+                   control_df=None, #batch control from a previous toolbox (ignored by build)
+                   atag_l=None, #optional assetModels to limit the run to (see _run_all_pool())
+                   logger=None,
+                   ):
+        """
+        a failed toolbox is reported and the next one is run
+        
+        returns (pars_df, {toolName: summary message})
+        """
+        if logger is None: logger=self.logger
+        log = logger
+        
+        pars_df = control_df
         meta_d = dict()
         for toolName in toolNames:
             try:
                 #get kwargs
                 if toolName in tool_kwargs:
-                    kwargs = tool_kwargs[toolName]
+                    kwargs = tool_kwargs[toolName].copy()
                 else:
                     kwargs={}
+                    
+                if not atag_l is None:
+                    kwargs['atag_l'] = atag_l
                 
                 tool_od, pars_df = self.run_toolbox(toolName, 
                                             control_df=pars_df, writePars=False, logger = log,
@@ -210,22 +267,95 @@ class Runner(object): #base worker for runner scripts
                 msg = 'failed on \'%s\' w/ \n    %s'%(toolName, e)
                 meta_d[toolName] = 'FAIL=%s'%e
                 log.error(msg)
-
+                
+        return pars_df, meta_d
+    
+    def _run_all_pool(self, #run the tool chain of each assetModel on a process pool
+                      toolNames,
+                      tool_kwargs={},
+                      max_workers=2,
+                      logger=None,
+                      ):
+        """
+        the assetModels are independent of each other (own control file and out_dir)
+            but the tools of an assetModel depend on the previous (build > dmg2 > risk2 > djoin)
+            
+        so each assetModel's chain of tools is one job (in toolNames order) on its own process
+            build/djoin tools init their own QGIS in the worker (see __getstate__())
+            each worker logs to '<out_dir>/<assetModel>.log'
+            
+        post_tools (e.g., compare) need all the assetModels... these run here once the chains finish
+        
+        returns (pars_df, meta_d) like _run_tools()
+        """
         #=======================================================================
-        # write the run summary
+        # defaults
         #=======================================================================
-        if not pars_df is None:
-            self.write_pars(df=pars_df)
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('pool')
+        
+        chain_l = [t for t in toolNames if not t in self.post_tools]
+        post_l = [t for t in toolNames if t in self.post_tools]
+        
+        atag_l = self.get_atags(chain_l, logger=log)
+        
+        log.info('on %i assetModels w/ %i workers and chain %s'%(len(atag_l), max_workers, chain_l))
+        
+        #=======================================================================
+        # execute chains
+        #=======================================================================
+        df_d, meta_d = dict(), dict()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fut_d = {executor.submit(_run_chain, self, atag, chain_l, tool_kwargs):atag
+                     for atag in atag_l}
             
-        self.write_parsd()
+            for i, fut in enumerate(as_completed(fut_d)):
+                atag = fut_d[fut]
+                try:
+                    df_d[atag], cmeta_d = fut.result()
+                except Exception as e: #e.g., worker died
+                    meta_d[atag] = 'FAIL=%s: %s'%(type(e).__name__, e)
+                    log.error('%i/%i \'%s\' failed w/ \n    %s'%(i+1, len(atag_l), atag, e))
+                    continue
+                
+                for toolName, msg in cmeta_d.items():
+                    meta_d['%s.%s'%(atag, toolName)] = msg
+                    
+                log.info('%i/%i finished \'%s\''%(i+1, len(atag_l), atag))
         
         #=======================================================================
-        # wrap
+        # assemble the batch control
         #=======================================================================
-        for toolName, msg in meta_d.items():
-            log.info('%s:    %s'%(toolName, msg))
+        df_l = [df_d[atag] for atag in atag_l if not df_d.get(atag) is None]
+        if len(df_l)==0:
+            log.warning('no assetModel chains returned any parameters')
+            return None, meta_d
         
-        return self.out_dir, pars_df
+        pars_df = pd.concat(df_l, axis=0)
+        
+        #flag columns missing on some chains (e.g., 'risk1' vs 'risk2')
+        for coln, col in pars_df.items():
+            if col.isna().any() and col.dropna().map(lambda v: isinstance(v, (bool, np.bool_))).all():
+                pars_df[coln] = col.fillna(False).astype(bool)
+        
+        self.pars_df = pars_df
+        
+        #=======================================================================
+        # post tools
+        #=======================================================================
+        if len(post_l)>0:
+            pars_df, post_d = self._run_tools(post_l, tool_kwargs=tool_kwargs, control_df=pars_df, 
+                                              logger=log)
+            meta_d.update(post_d)
+            
+        return pars_df, meta_d
+    
+    def get_atags(self, #assetModel tags for the chains of _run_all_pool()
+                  toolNames,
+                  logger=None):
+        raise Error('%s has no assetModels to run on a pool'%self.__class__.__name__)
         
     def _get_smry(self,  #retrieve some extra summary info from teh data
                   df, smry_d=None,
@@ -290,4 +420,48 @@ class Runner(object): #base worker for runner scripts
         
         
         
-        
\ No newline at end of file
+        
+        
+        
+def _run_chain( #run the tool chain of one assetModel (for the process pool)
+        runr, #Runner (w/o the parents QGIS handles. see Runner.__getstate__())
+        atag, #assetModel
+        toolNames,
+        tool_kwargs,
+        ):
+    """
+    module level so it can be sent to the workers
+    
+    the parent's log handlers don't survive the trip... log to '<out_dir>/<atag>.log'
+    
+    returns (pars_df for this assetModel, {toolName: summary message})
+    """
+    import logging
+    
+    #===========================================================================
+    # setup the logger
+    #===========================================================================
+    logger = logging.getLogger('batch.%s'%atag)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    
+    handler = logging.FileHandler(os.path.join(runr.out_dir, '%s.log'%atag), mode='w')
+    handler.setFormatter(logging.Formatter('%(asctime)s.%(levelname)s.%(name)s:  %(message)s'))
+    logger.addHandler(handler)
+    
+    runr.logger = logger
+    
+    #===========================================================================
+    # execute
+    #===========================================================================
+    try:
+        pars_df, meta_d = runr._run_tools(toolNames, tool_kwargs=tool_kwargs, atag_l=[atag], 
+                                          logger=logger)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        
+    if not pars_df is None:
+        pars_df = pars_df.loc[pars_df.index.isin([atag]), :]
+        
+    return pars_df, meta_d
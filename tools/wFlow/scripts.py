@@ -1034,6 +1034,8 @@ class WorkFlow(Session): #worker with methods to build a CF workflow from
               #extra outputs
               bdmg_smry=False,
               dmgs_expnd =False,
+              
+              chunk_size=None, #assets per block (see Dmg2.run_chunks())
               ): #run risk1
         #=======================================================================
         # defaults
@@ -1046,12 +1048,30 @@ class WorkFlow(Session): #worker with methods to build a CF workflow from
         #=======================================================================
         # setup
         #=======================================================================
-        wrkr = self._get_wrkr(Dmg2)
+        wrkr = self._get_wrkr(Dmg2, chunk_size=chunk_size)
         
         #get control keys for this tool
         if rkwargs is None: rkwargs = self._get_kwargs(wrkr.__class__.__name__)
         wrkr.setup_fromData(self.data_d) #setup w/ the pre-loaded data
         
+        #=======================================================================
+        # execute in blocks
+        #=======================================================================
+        if not wrkr.chunk_size is None:
+            """results are streamed to file (no depths, attribution, or plots)"""
+            assert not self.attriMode, 'attribution not supported on chunked runs'
+            assert self.write, 'chunked runs write their results'
+            
+            wrkr.run_chunks(write_bdmg=dmgs_expnd, write_smry=bdmg_smry, **rkwargs)
+            if self.upd_cf: 
+                wrkr.update_cf()
+            
+            res_d['dmgs'] = pd.read_csv(wrkr.out_fp, index_col=0) #total damages by cid
+            self.data_d['dmgs'] = res_d['dmgs'].copy() #set for risk2
+            
+            log.info('finished chunked w/ %s'%list(res_d.keys()))
+            return res_d
+        
         #=======================================================================
         # execute
         #=======================================================================